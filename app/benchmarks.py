@@ -0,0 +1,905 @@
+# benchmarks.py
+"""
+`flask bench ...` commands. Each benchmark runs against a throwaway SQLite
+database seeded with synthetic data, never against DATABASE_URL.
+"""
+import json
+import logging
+import math
+import random
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime, time as dtime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event
+
+from .config import Config
+from .extensions import db
+
+bench_cli = AppGroup('bench', help="Synthetic benchmarks for hot paths.")
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    RATELIMIT_ENABLED = False
+    MAIL_SUPPRESS_SEND = True
+    MAIL_DEFAULT_SENDER = 'bench@example.com'
+    # Benches measure the live routes; the snapshot bench fills snapshots in the foreground
+    CATALOG_SNAPSHOT_ENABLED = False
+    AUTOCOMPLETE_BACKGROUND_BUILD = False
+    RECOMMENDER_REFRESH_SECONDS = 0
+
+
+@contextmanager
+def scratch_app(database_uri='sqlite://'):
+    """Yield a fresh app bound to an empty scratch database, inside its app context."""
+    from .main import create_app
+
+    class _Config(BenchConfig):
+        SQLALCHEMY_DATABASE_URI = database_uri
+
+    logging.getLogger().setLevel(logging.WARNING)
+    app = create_app(_Config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+class QueryCounter:
+    """Counts SQL statements sent to the engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+class QueryRecorder:
+    """Records every (statement, parameters) pair sent to the engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def bench_day():
+    """Midnight UTC tomorrow: the occupancy index only keeps days from today on."""
+    return (datetime.utcnow() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def seed_restaurant(num_tables, bookings_per_table=3, day=None, rng=None):
+    """Create a restaurant with `num_tables` tables and a few bookings on each."""
+    from .models import Booking, Layout, Restaurant, User
+
+    rng = rng or random.Random(0)
+    day = day or bench_day()
+    user = User.query.first()
+    if user is None:
+        user = User(name="Bench User", email="bench@example.com", password="x")
+        db.session.add(user)
+    restaurant = Restaurant(
+        name=f"Bench {num_tables}", location="Bench Street", cuisine="Test",
+        booking_duration=120, opening_time=dtime(10, 0), closing_time=dtime(23, 0)
+    )
+    db.session.add(restaurant)
+    db.session.flush()
+
+    tables = [
+        Layout(restaurant_id=restaurant.id, type='table', table_number=i + 1,
+               x_coordinate=(i % 10) * 10, y_coordinate=(i // 10) * 10,
+               capacity=rng.choice([2, 2, 4, 4, 4, 6, 8]))
+        for i in range(num_tables)
+    ]
+    db.session.add_all(tables)
+    db.session.flush()
+
+    bookings = []
+    for table in tables:
+        for slot in rng.sample(range(10, 22), bookings_per_table):
+            bookings.append(Booking(
+                user_id=user.id, restaurant_id=restaurant.id, layout_id=table.id,
+                date=day.replace(hour=slot), num_guests=2
+            ))
+    db.session.add_all(bookings)
+    db.session.commit()
+    return restaurant
+
+
+@bench_cli.command('availability')
+@click.option('--tables', default='10,30,60,120,240', help="Comma separated floor sizes.")
+@click.option('--repeat', default=20, help="Requests per floor size.")
+def bench_availability(tables, repeat):
+    """
+    Query count and latency of GET /api/bookings/availability by floor size:
+    the set-based engine alone (occupancy index off, cache missed on every
+    request) and the route as served with the index and cache in front.
+    """
+    from .utils.availability_cache import availability_cache
+
+    sizes = [int(n) for n in tables.split(',')]
+    with scratch_app() as app:
+        client = app.test_client()
+        click.echo(f"{'tables':>8} {'engine q':>9} {'engine ms':>10} {'served q':>9} {'served ms':>10}")
+        for size in sizes:
+            restaurant = seed_restaurant(size)
+            url = f"/api/bookings/availability?restaurant_id={restaurant.id}&date={bench_day():%Y-%m-%d}T19:00"
+            results = []
+            for engine_only in (True, False):
+                app.config['OCCUPANCY_INDEX_ENABLED'] = not engine_only
+                with QueryCounter(db.engine) as counter:
+                    started = time.perf_counter()
+                    for _ in range(repeat):
+                        db.session.expunge_all()
+                        if engine_only:
+                            availability_cache.bump_restaurant(restaurant.id)
+                        response = client.get(url)
+                        assert response.status_code == 200, response.get_data(as_text=True)
+                    elapsed = time.perf_counter() - started
+                results.append((counter.count / repeat, elapsed / repeat * 1000))
+            (engine_queries, engine_ms), (served_queries, served_ms) = results
+            click.echo(f"{size:>8} {engine_queries:>9.1f} {engine_ms:>10.2f} {served_queries:>9.1f} {served_ms:>10.2f}")
+
+
+@bench_cli.command('occupancy')
+@click.option('--tables', default=120, help="Tables on the synthetic floor.")
+@click.option('--lookups', default=2000, help="Availability lookups to time.")
+@click.option('--changes', default=300, help="Random book/move/cancel operations to apply.")
+def bench_occupancy(tables, lookups, changes):
+    """Latency of in-memory availability lookups and index consistency after churn."""
+    from .models import Booking
+    from .utils.availability import available_table_ids
+    from .utils.occupancy import occupancy_index
+
+    rng = random.Random(1)
+    with scratch_app():
+        restaurant = seed_restaurant(tables)
+        day = bench_day()
+        starts = [day.replace(hour=rng.randrange(10, 23), minute=rng.choice([0, 15, 30, 45]))
+                  for _ in range(lookups)]
+
+        started = time.perf_counter()
+        for start in starts[:200]:
+            available_table_ids(restaurant, start)
+        db_us = (time.perf_counter() - started) / 200 * 1e6
+
+        occupancy_index.available_table_ids(restaurant.id, day)  # warm the day bucket
+        started = time.perf_counter()
+        for start in starts:
+            occupancy_index.available_table_ids(restaurant.id, start)
+        index_us = (time.perf_counter() - started) / lookups * 1e6
+
+        bookings = Booking.query.filter_by(restaurant_id=restaurant.id).all()
+        table_ids = sorted({b.layout_id for b in bookings})
+        for _ in range(changes):
+            op = rng.random()
+            if op < 0.4:
+                booking = Booking(user_id=bookings[0].user_id, restaurant_id=restaurant.id,
+                                  layout_id=rng.choice(table_ids), num_guests=2,
+                                  date=day.replace(hour=rng.randrange(10, 23)))
+                db.session.add(booking)
+                db.session.commit()
+                occupancy_index.add(booking, restaurant)
+                bookings.append(booking)
+            elif op < 0.7 and bookings:
+                booking = rng.choice(bookings)
+                booking.date = day.replace(hour=rng.randrange(0, 24), minute=rng.choice([0, 30]))
+                db.session.commit()
+                occupancy_index.remove(booking.id)
+                occupancy_index.add(booking, restaurant)
+            elif bookings:
+                booking = bookings.pop(rng.randrange(len(bookings)))
+                booking_id = booking.id
+                db.session.delete(booking)
+                db.session.commit()
+                occupancy_index.remove(booking_id)
+
+        mismatches = occupancy_index.verify(restaurant.id)
+        click.echo(f"database engine: {db_us:9.1f} us/lookup")
+        click.echo(f"occupancy index: {index_us:9.1f} us/lookup")
+        click.echo(f"consistency after {changes} changes: {'ok' if not mismatches else mismatches}")
+        if mismatches:
+            raise SystemExit(1)
+
+
+@bench_cli.command('booking-contention')
+@click.option('--threads', default=16, help="Concurrent booking workers.")
+@click.option('--attempts', default=50, help="Booking attempts per worker.")
+@click.option('--tables', default=8, help="Tables competed for; fewer means more contention.")
+@click.option('--database-uri', default=None, help="Database to run against (defaults to a temporary SQLite file).")
+def bench_booking_contention(threads, attempts, tables, database_uri):
+    """Hammer POST /api/bookings from many threads and check for double-bookings."""
+    import os
+    import tempfile
+    import threading
+    from sqlalchemy.orm import aliased
+    from .models import Booking, User
+
+    workdir = None
+    if database_uri is None:
+        workdir = tempfile.TemporaryDirectory()
+        database_uri = f"sqlite:///{os.path.join(workdir.name, 'contention.db')}"
+
+    with scratch_app(database_uri) as app:
+        restaurant = seed_restaurant(tables, bookings_per_table=0)
+        restaurant_id = restaurant.id
+        user_id = User.query.first().id
+        slots = [f"2025-06-06T{hour:02d}:{minute:02d}" for hour in range(17, 23) for minute in (0, 30)]
+        from .models import Layout
+        table_ids = [layout.id for layout in Layout.query.filter_by(restaurant_id=restaurant_id)]
+        db.session.remove()
+
+        outcomes = {201: 0, 409: 0}
+        outcomes_lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def worker(seed):
+            rng = random.Random(seed)
+            client = app.test_client()
+            with app.app_context():
+                barrier.wait()
+                for _ in range(attempts):
+                    response = client.post('/api/bookings', json={
+                        "user_id": user_id, "restaurant_id": restaurant_id,
+                        "layout_id": rng.choice(table_ids), "date": rng.choice(slots), "num_guests": 2
+                    })
+                    with outcomes_lock:
+                        outcomes[response.status_code] = outcomes.get(response.status_code, 0) + 1
+
+        workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        other = aliased(Booking)
+        duration = timedelta(minutes=restaurant.booking_duration or 120)
+        pairs = db.session.query(Booking.id, other.id, Booking.date, other.date).join(
+            other, (other.layout_id == Booking.layout_id) & (other.id > Booking.id)
+        ).filter(Booking.restaurant_id == restaurant_id).all()
+        double_booked = [(a, b) for a, b, start_a, start_b in pairs if abs(start_a - start_b) < duration]
+
+        total = threads * attempts
+        click.echo(f"attempts:        {total} from {threads} threads on {tables} tables")
+        click.echo(f"booked (201):    {outcomes.get(201, 0)}")
+        click.echo(f"conflicts (409): {outcomes.get(409, 0)}")
+        other_statuses = {status: n for status, n in outcomes.items() if status not in (201, 409) and n}
+        if other_statuses:
+            click.echo(f"other statuses:  {other_statuses}")
+        click.echo(f"throughput:      {total / elapsed:.1f} requests/s, {outcomes.get(201, 0) / elapsed:.1f} bookings/s")
+        click.echo(f"double-bookings: {len(double_booked)}")
+
+    if workdir is not None:
+        workdir.cleanup()
+    if double_booked or other_statuses:
+        raise SystemExit(1)
+
+
+@bench_cli.command('allocator')
+@click.option('--tables', default=300, help="Tables on the synthetic floor.")
+@click.option('--requests', 'num_requests', default=3000, help="Booking requests over the evening.")
+@click.option('--seed', default=7)
+def bench_allocator(tables, num_requests, seed):
+    """Parties and covers seated, utilisation and latency of the best-fit allocator against first-fit."""
+    from .utils.allocator import DEFAULT_MAX_JOINED, FloorTable, allocate
+
+    rng = random.Random(seed)
+    side = math.ceil(math.sqrt(tables))
+    floor = [FloorTable(i + 1, rng.choice([2, 2, 2, 4, 4, 4, 4, 6, 8]),
+                        (i % side) * 100.0 / side, (i // side) * 100.0 / side)
+             for i in range(tables)]
+    join_distance = 100.0 / side * 1.5
+    slot_minutes, duration_slots, num_slots = 15, 8, 24  # 17:00-23:00, two-hour bookings
+    parties = [(rng.randrange(num_slots - duration_slots + 1), rng.choice([1, 2, 2, 2, 3, 4, 4, 5, 6, 7, 8, 10, 12]))
+               for _ in range(num_requests)]
+    adjacent = {t.id: sorted((o for o in floor if o.id != t.id and math.hypot(t.x - o.x, t.y - o.y) <= join_distance),
+                             key=lambda o: o.id)
+                for t in floor}
+
+    def first_fit(free, party_size):
+        """Lowest-numbered table that fits; else join its lowest-numbered free neighbours, as best-fit may."""
+        free = sorted(free, key=lambda t: t.id)
+        for table in free:
+            if table.capacity >= party_size:
+                return (table.id,)
+        free_ids = {t.id for t in free}
+        for table in free:
+            group, seats = [table], table.capacity
+            while seats < party_size and len(group) < DEFAULT_MAX_JOINED:
+                joined = {t.id for t in group}
+                other = min((o for member in group for o in adjacent[member.id]
+                             if o.id in free_ids and o.id not in joined), key=lambda o: o.id, default=None)
+                if other is None:
+                    break
+                group.append(other)
+                seats += other.capacity
+            if seats >= party_size:
+                return tuple(sorted(t.id for t in group))
+        return None
+
+    def best_fit(free, party_size):
+        return allocate(free, party_size, join_distance=join_distance)
+
+    total_seat_slots = sum(t.capacity for t in floor) * num_slots
+    click.echo(f"{tables} tables, {sum(t.capacity for t in floor)} seats, {num_requests} requests")
+    click.echo(f"{'strategy':>10} {'seated':>8} {'covers':>8} {'refused':>8} {'seat util':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, strategy in (('first-fit', first_fit), ('best-fit', best_fit)):
+        busy_until = {t.id: [False] * num_slots for t in floor}
+        by_id = {t.id: t for t in floor}
+        seated_guest_slots, seated, covers, refused, latencies = 0, 0, 0, 0, []
+        for start, party_size in parties:
+            window = range(start, start + duration_slots)
+            free = [t for t in floor if not any(busy_until[t.id][s] for s in window)]
+            started = time.perf_counter()
+            chosen = strategy(free, party_size)
+            latencies.append(time.perf_counter() - started)
+            if not chosen:
+                refused += 1
+                continue
+            seated += 1
+            covers += party_size
+            seated_guest_slots += party_size * duration_slots
+            for table_id in chosen:
+                for s in window:
+                    busy_until[table_id][s] = True
+            assert sum(by_id[t].capacity for t in chosen) >= party_size
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        utilisation = seated_guest_slots / total_seat_slots
+        click.echo(f"{name:>10} {seated:>8} {covers:>8} {refused:>8} {utilisation:>9.1%} {p50:>8.3f} {p99:>8.3f}")
+    click.echo(f"(slot length {slot_minutes} min, bookings last {duration_slots * slot_minutes} min)")
+
+
+@bench_cli.command('listing')
+@click.option('--restaurants', default=20000, help="Restaurants in the synthetic catalogue.")
+@click.option('--page', default=50, help="Page size for the paginated listing.")
+def bench_listing(restaurants, page):
+    """Queries, latency and peak memory of GET /api/restaurants as a page and as a full export."""
+    import tracemalloc
+    from .models import Restaurant, RestaurantImage
+
+    with scratch_app() as app:
+        db.session.execute(Restaurant.__table__.insert(), [
+            {"name": f"Bench {i}", "location": "Bench Street", "cuisine": "Test",
+             "lat": 40 + i / 10000, "lon": -74 - i / 10000}
+            for i in range(restaurants)
+        ])
+        db.session.execute(RestaurantImage.__table__.insert(), [
+            {"restaurant_id": rid, "image_url": f"/static/{rid}-{n}.png"}
+            for rid in range(1, restaurants + 1, 2) for n in range(2)
+        ])
+        db.session.commit()
+        client = app.test_client()
+        click.echo(f"{'request':>24} {'queries':>8} {'ms':>9} {'peak KiB':>9}")
+        for label, url in (
+            (f"page of {page}", f"/api/restaurants?limit={page}"),
+            (f"page of {page}, 3 fields", f"/api/restaurants?limit={page}&fields=id,name,image_url"),
+            ("full export", "/api/restaurants"),
+        ):
+            db.session.expunge_all()
+            tracemalloc.start()
+            with QueryCounter(db.engine) as counter:
+                started = time.perf_counter()
+                response = client.get(url)
+                size = sum(len(chunk) for chunk in response.response)
+                elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            assert response.status_code == 200, response.get_data(as_text=True)
+            click.echo(f"{label:>24} {counter.count:>8} {elapsed * 1000:>9.1f} {peak / 1024:>9.0f}  ({size} bytes)")
+
+
+@bench_cli.command('catalog')
+@click.option('--restaurants', default=20000, help="Restaurants in the synthetic catalogue.")
+@click.option('--requests', 'requests_count', default=200, help="Snapshot requests to time.")
+def bench_catalog(restaurants, requests_count):
+    """Live full listing against the precompressed snapshot, per Accept-Encoding."""
+    from .models import Restaurant
+    from .utils.catalog_snapshot import RESTAURANTS, brotli, catalog_snapshot
+
+    with scratch_app() as app:
+        db.session.execute(Restaurant.__table__.insert(), [
+            {"name": f"Bench {i}", "location": "Bench Street", "cuisine": "Test",
+             "lat": 40 + i / 10000, "lon": -74 - i / 10000}
+            for i in range(restaurants)
+        ])
+        db.session.commit()
+        client = app.test_client()
+
+        started = time.perf_counter()
+        live = client.get("/api/restaurants").get_data()
+        live_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        catalog_snapshot.refresh(RESTAURANTS)
+        build_ms = (time.perf_counter() - started) * 1000
+        app.config['CATALOG_SNAPSHOT_ENABLED'] = True
+
+        click.echo(f"live: {live_ms:.1f} ms, {len(live)} bytes; snapshot build: {build_ms:.0f} ms"
+                   + ("" if brotli else " (brotli not installed)"))
+        click.echo(f"{'encoding':>9} {'bytes':>10} {'queries':>8} {'ms/request':>11}")
+        for encoding in ('identity', 'gzip', 'br'):
+            with QueryCounter(db.engine) as counter:
+                started = time.perf_counter()
+                for _ in range(requests_count):
+                    response = client.get("/api/restaurants", headers={"Accept-Encoding": encoding})
+                    body = response.get_data()
+                elapsed = time.perf_counter() - started
+            served = response.headers.get('Content-Encoding', 'identity')
+            assert response.status_code == 200 and response.headers.get('ETag'), response.status
+            if served != encoding:
+                continue
+            click.echo(f"{encoding:>9} {len(body):>10} {counter.count:>8} {elapsed * 1000 / requests_count:>11.3f}")
+
+
+@bench_cli.command('serialization')
+@click.option('--rows', default=50000, help="Items in each list payload.")
+def bench_serialization(rows):
+    """jsonify over hand-built dicts against msgspec over response schemas, for large lists."""
+    import tracemalloc
+    from .models import Booking, Layout
+    from .utils.response import json_response
+    from .utils.schemas import BookingSchema, LayoutSchema
+
+    layouts = [Layout(id=i, restaurant_id=1, type='table', table_number=i, table_type='standard',
+                      x_coordinate=i % 40 * 1.5, y_coordinate=i // 40 * 1.5, shape='rectangle', capacity=4)
+               for i in range(rows)]
+    bookings = [(Booking(id=i, restaurant_id=1, layout_id=i % 40, num_guests=2, status='CONFIRMED',
+                         date=datetime(2025, 6, 6, 19, 0) + timedelta(minutes=i)), "Bench Bistro", "/static/1.png")
+                for i in range(rows)]
+    payloads = {
+        'layouts': (
+            lambda: [{c.name: getattr(l, c.name) for c in l.__table__.columns} for l in layouts],
+            lambda: [LayoutSchema.from_row(l) for l in layouts],
+        ),
+        'bookings': (
+            lambda: [{
+                "id": b.id, "restaurant_id": b.restaurant_id, "restaurant_name": name, "restaurant_image": image,
+                "layout_id": b.layout_id, "num_guests": b.num_guests, "status": b.status,
+                "date": b.date.strftime("%Y-%m-%d %H:%M")
+            } for b, name, image in bookings],
+            lambda: [BookingSchema.from_row(b, name, image) for b, name, image in bookings],
+        ),
+    }
+
+    def encode(build):
+        response, _ = json_response(data=build(), status=200)
+        return response.get_data()
+
+    with scratch_app() as app, app.test_request_context():
+        click.echo(f"{'payload':>9} {'encoder':>8} {'ms':>9} {'peak KiB':>9} {'bytes':>10}")
+        for name, builders in payloads.items():
+            bodies = []
+            for encoder, build in zip(('jsonify', 'msgspec'), builders):
+                started = time.perf_counter()
+                body = encode(build)
+                elapsed = time.perf_counter() - started
+                # Peak traced memory, in a second run so tracing does not skew the timing
+                tracemalloc.start()
+                encode(build)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                bodies.append(json.loads(body))
+                click.echo(f"{name:>9} {encoder:>8} {elapsed * 1000:>9.1f} {peak / 1024:>9.0f} {len(body):>10}")
+            assert bodies[0] == bodies[1], f"{name}: the two encoders disagree"
+
+
+@bench_cli.command('layout-save')
+@click.option('--sizes', default="100,1000,5000", help="Comma separated floor sizes (tables).")
+@click.option('--moved', default=1, help="Tables moved by each save.")
+def bench_layout_save(sizes, moved):
+    """Saving a floor where only a few tables moved, as floors grow."""
+    from .models import Layout, Restaurant
+    from .utils.layouts import parse_layout_items, save_layout
+
+    click.echo(f"{'tables':>7} {'queries':>8} {'updated':>8} {'ms/save':>9}")
+    for size in (int(s) for s in sizes.split(',')):
+        with scratch_app():
+            restaurant = Restaurant(name="Bench Bistro", location="Bench Street", cuisine="Test")
+            db.session.add(restaurant)
+            db.session.commit()
+            floor = [{"type": "table", "table_number": i, "x_coordinate": i % 40 * 1.5,
+                      "y_coordinate": i // 40 * 1.5, "capacity": 4} for i in range(1, size + 1)]
+            save_layout(restaurant, parse_layout_items(floor))
+            db.session.commit()
+            ids = {l.table_number: l.id for l in Layout.query.filter_by(restaurant_id=restaurant.id)}
+
+            payload = [{"id": ids[item['table_number']], **item} for item in floor]
+            for item in payload[:moved]:
+                item['x_coordinate'] += 0.5
+            with QueryCounter(db.engine) as counter:
+                started = time.perf_counter()
+                counts = save_layout(restaurant, parse_layout_items(payload))
+                db.session.commit()
+                elapsed = time.perf_counter() - started
+            assert counts == {"inserted": 0, "updated": moved, "deleted": 0}, counts
+            click.echo(f"{size:>7} {counter.count:>8} {counts['updated']:>8} {elapsed * 1000:>9.2f}")
+
+
+@bench_cli.command('recommendations')
+@click.option('--sizes', default="1000,10000,100000", help="Comma separated catalogue sizes.")
+@click.option('--users', default=2000, help="Users with preferences and bookings.")
+@click.option('--requests', 'requests_count', default=200, help="Recommendation requests to time per size.")
+def bench_recommendations(sizes, users, requests_count):
+    """Refresh cost and endpoint latency of the recommender as the catalogue grows."""
+    from flask import g
+    from .models import Booking, Restaurant, User, UserPreference
+    from .utils.recommender import recommender
+
+    rng = random.Random(0)
+    cuisines = ["Japanese", "Italian", "Thai", "Indian", "Mexican", "French", "Greek", "Korean"]
+    features = ["terrace", "wifi", "live-music", "parking", "pets"]
+    click.echo(f"{'restaurants':>11} {'refresh s':>10} {'cached ms':>10} {'rescored ms':>12} {'queries':>8}")
+    for size in (int(value) for value in sizes.split(',')):
+        with scratch_app() as app:
+            db.session.execute(Restaurant.__table__.insert(), [
+                {"name": f"Bench {i}", "location": f"District {i % 50}", "cuisine": rng.choice(cuisines),
+                 "average_price": rng.uniform(8, 80), "features": rng.sample(features, rng.randint(0, 3)),
+                 "rating_sum": 0, "rating_count": 0}
+                for i in range(size)
+            ])
+            db.session.execute(User.__table__.insert(), [
+                {"name": f"User {i}", "email": f"user{i}@example.com", "password": "x"} for i in range(users)
+            ])
+            db.session.execute(UserPreference.__table__.insert(), [
+                {"user_id": uid, "preferred_cuisine": rng.choice(cuisines), "ambiance_preference": rng.choice(features)}
+                for uid in range(1, users + 1)
+            ])
+            db.session.execute(Booking.__table__.insert(), [
+                {"user_id": rng.randint(1, users), "restaurant_id": rng.randint(1, size), "layout_id": 1,
+                 "date": datetime(2025, 6, 6, 19, 0), "num_guests": 2}
+                for _ in range(users * 5)
+            ])
+            db.session.commit()
+
+            started = time.perf_counter()
+            recommender.refresh()
+            refresh_s = time.perf_counter() - started
+
+            client = app.test_client()
+            timings = {}
+            with QueryCounter(db.engine) as counter:
+                for label in ('cached', 'rescored'):
+                    started = time.perf_counter()
+                    for i in range(requests_count):
+                        user_id = 1 + i % users
+                        if label == 'rescored':
+                            recommender.user_changed(user_id)
+                        g.pop('_login_user', None)  # The bench app context outlives each request
+                        with client.session_transaction() as session:
+                            session['_user_id'] = str(user_id)
+                            session['_fresh'] = True
+                        response = client.get("/api/restaurants/recommendations?limit=10")
+                        assert response.status_code == 200 and response.get_json()['data']
+                    timings[label] = (time.perf_counter() - started) * 1000 / requests_count
+            click.echo(f"{size:>11} {refresh_s:>10.2f} {timings['cached']:>10.2f} {timings['rescored']:>12.2f}"
+                       f" {counter.count / (2 * requests_count):>8.1f}")
+
+
+@bench_cli.command('cf')
+@click.option('--interactions', default=1000000, help="Synthetic user-restaurant interactions.")
+@click.option('--users', default=100000, help="Synthetic users.")
+@click.option('--restaurants', default=5000, help="Synthetic restaurants.")
+@click.option('--workers', default=None, type=int, help="Training processes (defaults to CF_WORKERS).")
+def bench_cf(interactions, users, restaurants, workers):
+    """Train the item-item model on clustered synthetic history; report time, size, hit rate and latency."""
+    import os
+    import tempfile
+    import numpy as np
+    from .utils.collaborative import load_model, save_model, score_history, train
+
+    rng = np.random.default_rng(0)
+    clusters = 50
+    # Every user mostly visits their own taste cluster, with a popularity skew inside it
+    taste = rng.integers(0, clusters, users)
+    user_ids = rng.integers(0, users, interactions)
+    in_cluster = rng.random(interactions) < 0.8
+    rank = np.minimum(rng.zipf(1.5, interactions) - 1, restaurants // clusters - 1)
+    restaurant_ids = np.where(in_cluster, rank * clusters + taste[user_ids], rng.integers(0, restaurants, interactions))
+    weights = np.ones(interactions, np.float32)
+
+    # Hold out the last interaction of 2000 users with at least three
+    order = np.argsort(user_ids, kind='stable')
+    last = np.r_[np.nonzero(np.diff(user_ids[order]))[0], len(order) - 1]
+    counts = np.bincount(user_ids, minlength=users)
+    held = order[last][counts[user_ids[order[last]]] >= 3][:2000]
+    train_mask = np.ones(interactions, bool)
+    train_mask[held] = False
+
+    with scratch_app() as app:
+        workers = workers or app.config['CF_WORKERS']
+        for pool in sorted({1, workers}):
+            started = time.perf_counter()
+            model = train(user_ids[train_mask], restaurant_ids[train_mask], weights[train_mask],
+                          app.config['CF_NEIGHBOURS'], pool)
+            click.echo(f"trained {interactions} interactions with {pool} worker(s) in {time.perf_counter() - started:.1f}s")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cf_model.npz')
+            save_model(model, path)
+            size = os.path.getsize(path)
+            model = load_model(path)
+        click.echo(f"model file: {size / 1024:.0f} KiB for {len(model.restaurant_ids)} restaurants")
+
+        histories = {}
+        for user, restaurant in zip(user_ids[train_mask], restaurant_ids[train_mask]):
+            histories.setdefault(int(user), {})[int(restaurant)] = 1.0
+        popular = [int(r) for r in np.argsort(-np.bincount(restaurant_ids[train_mask], minlength=restaurants))]
+        hits = popular_hits = 0
+        started = time.perf_counter()
+        for index in held:
+            history = histories.get(int(user_ids[index]), {})
+            hits += int(restaurant_ids[index]) in score_history(model, history, 10)
+            popular_hits += int(restaurant_ids[index]) in [r for r in popular if r not in history][:10]
+        elapsed = time.perf_counter() - started
+        click.echo(f"hit rate@10 on {len(held)} held-out visits: {hits / len(held):.3f} "
+                   f"(most popular unvisited: {popular_hits / len(held):.3f})")
+        click.echo(f"scoring: {elapsed * 1e6 / len(held):.0f} us per user from memory")
+
+    _check_cf_dietary_restrictions()
+
+
+def _check_cf_dietary_restrictions():
+    """Users avoiding peanuts get no peanut restaurant from /recommendations, even as a close neighbour."""
+    import os
+    import tempfile
+    from flask import g
+    from .models import Booking, Restaurant, User, UserPreference
+    from .utils.collaborative import load_interactions, save_model, train
+
+    with scratch_app() as app, tempfile.TemporaryDirectory() as directory:
+        app.config.update(CF_MODEL_PATH=os.path.join(directory, 'cf_model.npz'), CF_RELOAD_SECONDS=0)
+        db.session.execute(Restaurant.__table__.insert(), [
+            {"name": f"Bench {i}", "location": "Bench Street", "rating_sum": 0, "rating_count": 0,
+             "cuisine": "Peanut Satay" if i % 2 else "Thai"}
+            for i in range(40)
+        ])
+        db.session.execute(User.__table__.insert(), [
+            {"name": f"User {i}", "email": f"user{i}@example.com", "password": "x"} for i in range(200)
+        ])
+        restricted = range(1, 21)
+        db.session.execute(UserPreference.__table__.insert(), [
+            {"user_id": uid, "preferred_cuisine": "Thai", "dietary_restrictions": "No peanuts"} for uid in restricted
+        ])
+        rng = random.Random(0)
+        db.session.execute(Booking.__table__.insert(), [
+            {"user_id": uid, "restaurant_id": rng.randint(1, 40), "layout_id": 1,
+             "date": datetime(2025, 6, 6, 19, 0), "num_guests": 2}
+            for uid in range(1, 201) for _ in range(5)
+        ])
+        db.session.commit()
+        save_model(train(*load_interactions(), app.config['CF_NEIGHBOURS']), app.config['CF_MODEL_PATH'])
+        peanut = {r.id for r in Restaurant.query.filter(Restaurant.cuisine == "Peanut Satay")}
+
+        client = app.test_client()
+        served = 0
+        for user_id in restricted:
+            g.pop('_login_user', None)  # The bench app context outlives each request
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+                session['_fresh'] = True
+            ids = {r['id'] for r in client.get("/api/restaurants/recommendations?limit=10").get_json()['data']}
+            assert not ids & peanut, f"user {user_id} was recommended peanut restaurants {sorted(ids & peanut)}"
+            served += len(ids)
+        click.echo(f"dietary check: {len(restricted)} users avoiding peanuts, {served} recommendations, none with peanuts")
+
+
+@bench_cli.command('autocomplete')
+@click.option('--restaurants', default=50000, help="Restaurants in the synthetic catalogue.")
+@click.option('--lookups', default=20000, help="Prefix lookups to time.")
+def bench_autocomplete(restaurants, lookups):
+    """Build time, lookup latency and patch latency of the autocomplete trie."""
+    from .models import MenuItem, Restaurant
+    from .utils.autocomplete import autocomplete_index
+
+    rng = random.Random(1)
+    syllables = ['ka', 'lo', 'mi', 'ra', 'su', 'to', 'ne', 'bi', 'za', 'po', 'chi', 'ver', 'del', 'an']
+    cuisines = ['Italian', 'Japanese', 'French', 'Indian', 'Mexican', 'Thai', 'Greek', 'Korean']
+    dishes = ['Margherita Pizza', 'Ramen', 'Pad Thai', 'Tacos', 'Moussaka', 'Bibimbap', 'Butter Chicken']
+
+    def word():
+        return ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).capitalize()
+
+    with scratch_app() as app:
+        db.session.execute(Restaurant.__table__.insert(), [
+            {"name": f"{word()} {word()}", "location": f"{word()} Street", "cuisine": rng.choice(cuisines),
+             "rating_count": rng.randint(0, 500)}
+            for _ in range(restaurants)
+        ])
+        db.session.execute(MenuItem.__table__.insert(), [
+            {"restaurant_id": rng.randint(1, restaurants), "category": "Main", "price": 10.0,
+             "name": rng.choice(dishes) if rng.random() < 0.5 else f"{word()} {rng.choice(dishes)}"}
+            for _ in range(restaurants)
+        ])
+        db.session.commit()
+
+        with app.test_request_context():
+            started = time.perf_counter()
+            autocomplete_index.build()
+            build_s = time.perf_counter() - started
+
+            prefixes = [word()[:rng.randint(1, 5)] for _ in range(lookups)]
+            with QueryCounter(db.engine) as counter:
+                timings = []
+                for prefix in prefixes:
+                    started = time.perf_counter()
+                    autocomplete_index.suggest(prefix)
+                    timings.append(time.perf_counter() - started)
+            timings.sort()
+
+            restaurant = db.session.get(Restaurant, 1)
+            started = time.perf_counter()
+            for i in range(200):
+                restaurant.name = f"{word()} {word()}"
+                autocomplete_index.restaurant_saved(restaurant)
+            patch_ms = (time.perf_counter() - started) / 200 * 1000
+            db.session.rollback()
+
+        click.echo(f"build: {build_s:.2f}s for {restaurants} restaurants")
+        click.echo(f"lookup: p50 {timings[len(timings) // 2] * 1e6:.1f}us  "
+                   f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f}us  queries {counter.count}")
+        click.echo(f"patch: {patch_ms:.2f}ms per edited restaurant")
+
+
+@bench_cli.command('geo')
+@click.option('--sizes', default='10000,100000', help="Comma separated catalogue sizes.")
+@click.option('--queries', default=500, help="Queries per size.")
+def bench_geo(sizes, queries):
+    """Radius and k-nearest latency of the grid index against a linear scan, by catalogue size."""
+    from .models import Restaurant
+    from .utils.geo import haversine_km
+    from .utils.geo_index import geo_index
+
+    click.echo(f"{'size':>8} {'radius us':>10} {'knn us':>10} {'scan us':>10} {'req queries':>12}")
+    for size in (int(n) for n in sizes.split(',')):
+        rng = random.Random(1)
+        with scratch_app() as app:
+            # Restaurants clustered around 50 "cities" across a region the size of Europe
+            cities = [(rng.uniform(36, 60), rng.uniform(-9, 30)) for _ in range(50)]
+            points = []
+            for _ in range(size):
+                city_lat, city_lon = rng.choice(cities)
+                points.append((city_lat + rng.gauss(0, 0.15), city_lon + rng.gauss(0, 0.2)))
+            db.session.execute(Restaurant.__table__.insert(), [
+                {"name": f"Bench {i}", "location": "Bench Street", "cuisine": "Test", "lat": lat, "lon": lon}
+                for i, (lat, lon) in enumerate(points)
+            ])
+            db.session.commit()
+            probes = [(lat + rng.gauss(0, 0.05), lon + rng.gauss(0, 0.05)) for lat, lon in rng.sample(points, queries)]
+
+            with app.test_request_context():
+                geo_index.nearest(0, 0, 1)  # load the grid
+                started = time.perf_counter()
+                for lat, lon in probes:
+                    geo_index.within(lat, lon, 2.0)
+                radius_us = (time.perf_counter() - started) / queries * 1e6
+                started = time.perf_counter()
+                for lat, lon in probes:
+                    geo_index.nearest(lat, lon, 10)
+                knn_us = (time.perf_counter() - started) / queries * 1e6
+                scans = probes[:20]
+                started = time.perf_counter()
+                for lat, lon in scans:
+                    sorted(haversine_km(lat, lon, p_lat, p_lon) for p_lat, p_lon in points)[:10]
+                scan_us = (time.perf_counter() - started) / len(scans) * 1e6
+
+            lat, lon = probes[0]
+            with QueryCounter(db.engine) as counter:
+                response = app.test_client().get(f"/api/restaurants/nearest?lat={lat}&lon={lon}&k=10")
+            assert response.status_code == 200, response.get_data(as_text=True)
+            click.echo(f"{size:>8} {radius_us:>10.1f} {knn_us:>10.1f} {scan_us:>10.0f} {counter.count:>12}")
+
+
+INDEXED_TABLES = ('booking', 'layout', 'menu_item', 'review', 'restaurant_image', 'payment', 'restaurant_feature')
+
+
+def _full_scans(connection, statement, parameters):
+    """Tables from INDEXED_TABLES that the plan for `statement` reads sequentially."""
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql("SET enable_seqscan = off")
+        plan = [row[0] for row in connection.exec_driver_sql("EXPLAIN " + statement, parameters)]
+        scanned = {match for line in plan for match in re.findall(r"Seq Scan on (\w+)", line)}
+    else:
+        plan = [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+        scanned = {match for line in plan for match in re.findall(r"^SCAN (\w+)", line)}
+    return sorted(scanned & set(INDEXED_TABLES)), plan
+
+
+@bench_cli.command('query-plans')
+@click.option('--database-uri', default=None, help="Scratch database to plan against (defaults to in-memory SQLite).")
+def bench_query_plans(database_uri):
+    """EXPLAIN every query issued by the hot booking, restaurant and payment routes; fail on sequential scans."""
+    from .models import MenuItem, Payment, RestaurantImage, Review, User
+
+    with scratch_app(database_uri or 'sqlite://') as app:
+        app.config['OCCUPANCY_INDEX_ENABLED'] = False
+        restaurants = [seed_restaurant(40), seed_restaurant(25)]
+        user = User.query.first()
+        user.is_admin = True
+        for restaurant in restaurants:
+            db.session.add(RestaurantImage(restaurant_id=restaurant.id, image_url="/static/placeholder.png"))
+            db.session.add_all(MenuItem(restaurant_id=restaurant.id, category="Main", name=f"Dish {i}", price=10.0)
+                               for i in range(20))
+            db.session.add_all(Review(user_id=user.id, restaurant_id=restaurant.id, rating=4, comment="Good")
+                               for _ in range(15))
+        db.session.commit()
+        rid, uid = restaurants[0].id, user.id
+        item_id = MenuItem.query.filter_by(restaurant_id=rid).first().id
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(uid)
+            session['_fresh'] = True
+
+        with QueryRecorder(db.engine) as recorder:
+            client.get(f"/api/bookings/availability?restaurant_id={rid}&date=2025-06-06T19:00")
+            client.get(f"/api/bookings/availability/grid?restaurant_id={rid}&date=2025-06-06")
+            client.get(f"/api/bookings/allocate?restaurant_id={rid}&date=2025-06-06T19:00&party_size=9")
+            client.get("/api/restaurants/find-table?party_size=4&date=2025-06-06T19:30")
+            booked = client.post('/api/bookings', json={
+                "user_id": uid, "restaurant_id": rid, "date": "2025-06-06T08:00", "num_guests": 2,
+                "menu_orders": [{"item_id": item_id, "quantity": 2}]
+            }).get_json()['data']
+            client.post('/api/payments', json={"booking_id": booked["booking_id"], "amount": 20.0})
+            for scope in ('all', 'upcoming', 'past'):
+                client.get(f"/api/bookings/user?scope={scope}&limit=10")
+            client.get("/api/bookings/analytics")
+            client.get("/api/bookings/count/this-week")
+            layout = client.get(f"/api/restaurants/{rid}/layout").get_json()['data']
+            layout[0]['x_coordinate'] += 1
+            client.put(f"/api/restaurants/{rid}/layout", json={"layout": layout[:-1]})
+            client.get(f"/api/restaurants/{rid}/menu")
+            client.get(f"/api/restaurants/{rid}/reviews")
+            client.get(f"/api/restaurants/{rid}")
+            client.get("/api/restaurants?limit=20")
+            client.get("/api/restaurants?limit=20&features=terrace,wifi")
+            client.get("/api/restaurants/search?features=terrace,wifi&facets=1")
+            client.get("/api/restaurants/recommendations")
+            client.get("/api/restaurants").get_data()
+            app.config['OCCUPANCY_INDEX_ENABLED'] = True
+            client.get(f"/api/bookings/availability?restaurant_id={rid}&date=2025-06-07T19:00")
+
+        seen, failures = set(), 0
+        with db.engine.connect() as connection:
+            for statement, parameters in recorder.statements:
+                if not statement.lstrip().upper().startswith('SELECT') or statement in seen:
+                    continue
+                seen.add(statement)
+                scanned, plan = _full_scans(connection, statement, parameters)
+                if scanned:
+                    failures += 1
+                    click.echo(f"SEQUENTIAL SCAN on {', '.join(scanned)}:\n  {' '.join(statement.split())}")
+                    for line in plan:
+                        click.echo(f"    {line}")
+        click.echo(f"Checked {len(seen)} distinct queries, {failures} with sequential scans")
+    if failures:
+        raise SystemExit(1)
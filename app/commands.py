@@ -0,0 +1,97 @@
+# commands.py
+import click
+from flask.cli import AppGroup
+from .benchmarks import bench_cli
+
+outbox_cli = AppGroup('outbox', help="Inspect, drain and purge the email outbox.")
+
+
+@outbox_cli.command('drain')
+def outbox_drain():
+    """Send every due email now, in this process."""
+    from .utils.outbox import email_outbox
+    processed = email_outbox.drain()
+    click.echo(f"Processed {processed} outbox emails")
+
+
+@outbox_cli.command('status')
+def outbox_status():
+    """Show outbox row counts by status."""
+    from .extensions import db
+    from .models import EmailOutbox
+    counts = db.session.query(EmailOutbox.status, db.func.count(EmailOutbox.id)) \
+                .group_by(EmailOutbox.status).all()
+    for status, count in sorted(counts):
+        click.echo(f"{status:<10} {count}")
+
+
+@outbox_cli.command('purge')
+@click.option('--days', type=int, default=None, help="Keep SENT emails this many days (default MAIL_OUTBOX_RETENTION_DAYS).")
+def outbox_purge(days):
+    """Delete sent emails past their retention period."""
+    from .utils.outbox import email_outbox
+    deleted = email_outbox.purge_sent(days)
+    click.echo(f"Deleted {deleted} sent outbox emails")
+
+
+rollup_cli = AppGroup('rollup', help="Maintain the daily booking rollup.")
+
+
+@rollup_cli.command('backfill')
+def rollup_backfill():
+    """Rebuild booking_daily_rollup from the Booking table."""
+    from .utils.rollup import backfill
+    rows = backfill()
+    click.echo(f"Rebuilt {rows} restaurant-day rollup rows")
+
+
+search_cli = AppGroup('search', help="Maintain the restaurant search index.")
+
+
+@search_cli.command('reindex')
+def search_reindex():
+    """Rebuild the search document of every restaurant."""
+    from .extensions import db
+    from .utils.search import reindex
+    indexed = reindex()
+    db.session.commit()
+    click.echo(f"Indexed {indexed} restaurants")
+
+
+@search_cli.command('facets')
+def search_facets():
+    """Rebuild the restaurant_feature facet index from Restaurant.features."""
+    from .extensions import db
+    from .utils.facets import rebuild
+    restaurants = rebuild()
+    db.session.commit()
+    click.echo(f"Rebuilt facets for {restaurants} restaurants")
+
+
+recommendations_cli = AppGroup('recommendations', help="Train the collaborative-filtering recommender.")
+
+
+@recommendations_cli.command('train')
+@click.option('--workers', type=int, default=None, help="Training processes (defaults to CF_WORKERS).")
+@click.option('--neighbours', type=int, default=None, help="Neighbours kept per restaurant (defaults to CF_NEIGHBOURS).")
+@click.option('--output', default=None, help="Model file (defaults to CF_MODEL_PATH).")
+def recommendations_train(workers, neighbours, output):
+    """Build the item-item model from bookings and reviews and save it for the web processes."""
+    import time
+    from flask import current_app
+    from .utils.collaborative import load_interactions, save_model, train
+    config = current_app.config
+    started = time.perf_counter()
+    users, restaurants, weights = load_interactions()
+    model = train(users, restaurants, weights, neighbours or config['CF_NEIGHBOURS'], workers or config['CF_WORKERS'])
+    save_model(model, output or config['CF_MODEL_PATH'])
+    click.echo(f"Trained on {len(weights)} interactions for {len(model.restaurant_ids)} restaurants "
+               f"in {time.perf_counter() - started:.1f}s -> {output or config['CF_MODEL_PATH']}")
+
+
+def register_commands(main):
+    main.cli.add_command(bench_cli)
+    main.cli.add_command(outbox_cli)
+    main.cli.add_command(rollup_cli)
+    main.cli.add_command(search_cli)
+    main.cli.add_command(recommendations_cli)
@@ -18,6 +18,12 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
 
+    # Booking Configuration
+    AVAILABILITY_SLOT_MINUTES = int(os.environ.get('AVAILABILITY_SLOT_MINUTES') or 30)
+    TABLE_JOIN_DISTANCE = float(os.environ.get('TABLE_JOIN_DISTANCE') or 20)  # floor-plan units
+    MAX_JOINED_TABLES = int(os.environ.get('MAX_JOINED_TABLES') or 3)
+    RESTAURANT_TIMEZONE = os.environ.get('RESTAURANT_TIMEZONE') or 'UTC'  # opening hours are local to this zone
+
     # Session Configuration
     SESSION_COOKIE_SECURE = False  # For development
     SESSION_COOKIE_SAMESITE = 'Lax'  # Allow cross-origin cookies
@@ -52,6 +52,42 @@ def create_app(config_class=Config):
     login_manager.login_view = 'auth.login'
     Migrate(app, db)
     limiter.init_app(app)  # Add this line
+
+    from .utils.occupancy import occupancy_index
+    occupancy_index.init_app(app)
+
+    from .utils.availability_cache import availability_cache
+    availability_cache.init_app(app)
+
+    from .utils.autocomplete import autocomplete_index
+    autocomplete_index.init_app(app)
+
+    from .utils.geo_index import geo_index
+    geo_index.init_app(app)
+
+    from .utils.map_clusters import map_clusters
+    map_clusters.init_app(app)
+
+    from .utils.catalog_snapshot import catalog_snapshot
+    catalog_snapshot.init_app(app)
+
+    from .utils.recommender import recommender
+    recommender.init_app(app)
+
+    from .utils.collaborative import collaborative
+    collaborative.init_app(app)
+
+    from .utils.outbox import email_outbox
+    email_outbox.init_app(app)
+
+    from .utils.rollup import register_rollup_listener
+    register_rollup_listener()
+
+    from .utils.search import register_search_listener
+    register_search_listener()
+
+    from .utils.facets import register_facet_listener
+    register_facet_listener()
     
     # Register user loader
     from .models import User
@@ -63,6 +99,10 @@ def create_app(config_class=Config):
     from .routes import register_routes
     register_routes(app)
 
+    # Register CLI commands (flask bench ...)
+    from .commands import register_commands
+    register_commands(app)
+
     # Catch-all route to serve the React app for any non-API route
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
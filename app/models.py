@@ -1,4 +1,5 @@
-from sqlalchemy import JSON
+from sqlalchemy import JSON, Float, case, cast, literal_column
+from sqlalchemy.ext.hybrid import hybrid_property
 from app.extensions import db
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -33,6 +34,17 @@ class UserPreference(db.Model):
     dietary_restrictions = db.Column(db.String(200), nullable=True)
     ambiance_preference = db.Column(db.String(100), nullable=True)
     
+DEFAULT_RATING = 4.0  # Shown for restaurants without reviews
+
+
+def _average_rating(rating_sum, rating_count):
+    # Unrounded average. Literals and the plain division operator keep the SQL
+    # identical between queries and ix_restaurant_rating, so the index is used.
+    return case(
+        (rating_count > literal_column('0'), cast(rating_sum, Float).op('/')(rating_count)),
+        else_=literal_column(str(DEFAULT_RATING))
+    )
+
 class Restaurant(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -52,21 +64,60 @@ class Restaurant(db.Model):
 
     promo = db.Column(db.String(200), nullable=True)
 
+    # Name, location, cuisine, features and menu item names; maintained by utils/search.py
+    search_document = db.Column(db.Text, nullable=True)
+
     layouts = db.relationship('Layout', backref='restaurant', cascade="all, delete-orphan", lazy=True)
 
-    @property
+    # Review aggregates, kept in step with the review table by add_review
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    stars_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    stars_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    stars_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    stars_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    stars_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        db.Index('ix_restaurant_rating', _average_rating(rating_sum, rating_count)),
+        db.Index('ix_restaurant_opening_hours', 'opening_time', 'closing_time'),
+    )
+
+    @hybrid_property
     def rating(self):
-        if not self.reviews:
-            return 4.0  # Default rating
-        total = sum(review.rating for review in self.reviews)
-        return round(total / len(self.reviews), 1)
+        if not self.rating_count:
+            return DEFAULT_RATING
+        return round(self.rating_sum / self.rating_count, 1)
+
+    @rating.expression
+    def rating(cls):
+        return _average_rating(cls.rating_sum, cls.rating_count)
+
+    @property
+    def rating_histogram(self):
+        return {stars: getattr(self, f"stars_{stars}") for stars in range(1, 6)}
+
+class RestaurantFeature(db.Model):
+    """Inverted index over Restaurant.features, maintained by utils/facets.py."""
+    __tablename__ = 'restaurant_feature'
+    __table_args__ = (
+        db.Index('ix_restaurant_feature_restaurant_id', 'restaurant_id'),
+    )
+    feature = db.Column(db.String(100), primary_key=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id', ondelete='CASCADE'), primary_key=True)
 
 class RestaurantImage(db.Model):
+    __table_args__ = (
+        db.Index('ix_restaurant_image_restaurant_id', 'restaurant_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
     image_url = db.Column(db.String(300), nullable=False)
 
 class MenuItem(db.Model):
+    __table_args__ = (
+        db.Index('ix_menu_item_restaurant_id', 'restaurant_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'))
     category = db.Column(db.String(50))
@@ -76,6 +127,9 @@ class MenuItem(db.Model):
     image_url = db.Column(db.String(255), nullable=True)
 
 class Layout(db.Model):
+    __table_args__ = (
+        db.Index('ix_layout_restaurant_id_type', 'restaurant_id', 'type'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
     type = db.Column(db.String(50), nullable=False, default='table')  # 'table' or 'furniture'
@@ -101,6 +155,11 @@ class LayoutVersion(db.Model):
     is_suggestion = db.Column(db.Boolean, default=False)
 
 class Booking(db.Model):
+    __table_args__ = (
+        db.Index('ix_booking_restaurant_id_layout_id_date', 'restaurant_id', 'layout_id', 'date'),
+        db.Index('ix_booking_restaurant_id_date', 'restaurant_id', 'date'),
+        db.Index('ix_booking_user_id_date', 'user_id', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
@@ -115,12 +174,18 @@ class Booking(db.Model):
 
     date = db.Column(db.DateTime, nullable=False)
     layout_id = db.Column(db.Integer, db.ForeignKey('layout.id'), nullable=False)
+    # A party seated at joined tables has one row per table, all sharing the first row's id here
+    party_id = db.Column(db.Integer, nullable=True, index=True)
 
     # relationships
     restaurant = db.relationship('Restaurant', backref='bookings', lazy=True)
     menu_orders = db.Column(JSON, nullable=True)  # list of {item_id, quantity}
 
 class Review(db.Model):
+    __table_args__ = (
+        db.Index('ix_review_restaurant_id_date_created', 'restaurant_id', 'date_created'),
+        db.Index('ix_review_user_id', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
@@ -129,6 +194,9 @@ class Review(db.Model):
     date_created = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Payment(db.Model):
+    __table_args__ = (
+        db.Index('ix_payment_booking_id', 'booking_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False)
     amount = db.Column(db.Float, nullable=False)
@@ -136,4 +204,38 @@ class Payment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # This relationship connects a payment to its booking
-    booking = db.relationship('Booking', backref='payment', lazy=True)
\ No newline at end of file
+    booking = db.relationship('Booking', backref='payment', lazy=True)
+
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    recipients = db.Column(db.JSON, nullable=False)  # list of email addresses
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+
+    # PENDING until delivered (SENT) or out of retries (FAILED)
+    status = db.Column(db.String(20), nullable=False, default='PENDING')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+class BookingDailyRollup(db.Model):
+    __tablename__ = 'booking_daily_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('restaurant_id', 'day', name='uq_booking_daily_rollup_restaurant_day'),
+        db.Index('ix_booking_daily_rollup_day', 'day'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+
+    # Maintained incrementally from Booking changes; rebuilt by `flask rollup backfill`
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    guests = db.Column(db.Integer, nullable=False, default=0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
@@ -1,16 +1,17 @@
 # auth_routes.py
 import logging
 from flask import Blueprint, request, jsonify, session
-from app.extensions import db, mail
+from app.extensions import db
 from app.models import User, UserPreference, Review, Restaurant, Booking
 from datetime import datetime, timedelta
 import random
 from flask_login import login_user, current_user, logout_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_mail import Message
 from app.extensions import csrf
 from app.utils.response import json_response
 from app.utils.auth import api_login_required
+from app.utils.outbox import email_outbox, queue_email
+from app.utils.recommender import recommender
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -34,16 +35,17 @@ def login():
         logger.debug(f"Login - Stored OTP for user {user.id}: {otp_code}")
         
         try:
-            msg = Message('Your OTP Code', recipients=[user.email])
-            msg.body = f"Verification code: {otp_code}"
-            mail.send(msg)
+            queue_email([user.email], 'Your OTP Code', f"Verification code: {otp_code}")
+            db.session.commit()
+            email_outbox.notify()
             return json_response(data={
                 "message": "OTP sent",
                 "otp_required": True,
                 "temp_user_id": user.id
             }, status=200)
         except Exception as e:
-            logger.error(f"Failed to send OTP: {str(e)}")
+            db.session.rollback()
+            logger.error(f"Failed to queue OTP: {str(e)}")
             return json_response(error=f"Failed to send OTP: {str(e)}", status=500)
     else:
         logger.warning(f"Login failed for email {email}")
@@ -188,6 +190,7 @@ def update_preferences():
     pref.ambiance_preference = data.get('ambiance_preference') or pref.ambiance_preference
     try:
         db.session.commit()
+        recommender.user_changed(current_user.id)
         return json_response(data={"message": "Preferences updated."}, status=200)
     except Exception as e:
         db.session.rollback()
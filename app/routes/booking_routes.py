@@ -1,14 +1,24 @@
 # booking_routes.py
 from pytz import UTC
-from flask import Blueprint, request, jsonify
-from app.extensions import db, mail
-from app.models import Booking, Restaurant, User, Layout
+from flask import Blueprint, Response, request, jsonify, current_app
+from app.extensions import db
+from app.models import Booking, BookingDailyRollup, Restaurant, RestaurantImage, User
 from datetime import datetime, timedelta
 from flask_login import login_required, current_user
-from flask_mail import Message
-from sqlalchemy import func, cast, literal, Interval, text
+from sqlalchemy import func, text, tuple_
 from app.extensions import csrf
 from app.utils.response import json_response
+from app.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, page_size, with_next_cursor
+from app.utils.availability import available_table_ids, day_slot_grid
+from app.utils.reservations import (
+    BookingConflict, InvalidTable, JoinedTables, TableTooSmall, move_booking, party_bookings, reserve_tables
+)
+from app.utils.allocator import choose_tables
+from app.utils.occupancy import occupancy_index
+from app.utils.availability_cache import availability_cache
+from app.utils.booking_events import booking_removed, booking_saved
+from app.utils.outbox import email_outbox, queue_email
+from app.utils.schemas import BookingSchema
 import logging
 from sqlalchemy.sql import text  # Import for raw SQL expressions
 
@@ -18,38 +28,17 @@ logger = logging.getLogger(__name__)
 
 booking_bp = Blueprint('booking', __name__, url_prefix='/api/bookings')
 
-def is_table_available(restaurant_id, layout_id, date):
-    """
-    Check if a table is available for the given time slot.
-    Performs overlap check in Python for reliability.
-    """
-    restaurant = Restaurant.query.get(restaurant_id)
-    if not restaurant:
-        logger.warning(f"Restaurant not found: ID={restaurant_id}")
-        return False
-
-    duration = restaurant.booking_duration or 120  # Default to 120 minutes if not set
-    end = date + timedelta(minutes=duration)
-
-    # Fetch all bookings for the table that could overlap
-    bookings = Booking.query.filter(
-        Booking.layout_id == layout_id,
-        Booking.restaurant_id == restaurant_id,
-        Booking.date < end,  # Booking starts before the requested end
-        Booking.date >= date - timedelta(minutes=duration)  # Booking ends after the requested start
-    ).all()
+def _with_etag(result, etag):
+    response, status = result
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response, status
 
-    logger.debug(f"Checking table {layout_id}: Found {len(bookings)} potential overlapping bookings")
-
-    # Check for actual overlaps in Python
-    for booking in bookings:
-        booking_end = booking.date + timedelta(minutes=duration)
-        if booking.date < end and booking_end > date:
-            logger.debug(f"Table {layout_id} unavailable due to booking from {booking.date} to {booking_end}")
-            return False
-
-    logger.debug(f"Table {layout_id} is available")
-    return True
+def _not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @csrf.exempt
 @booking_bp.route('', methods=['POST'])
@@ -65,40 +54,61 @@ def book_table():
         booking_date = datetime.strptime(data.get('date'), "%Y-%m-%dT%H:%M").replace(tzinfo=UTC)
     except (ValueError, TypeError):
         return json_response(error="Invalid date format. Use YYYY-MM-DDTHH:MM", status=400)
-    layout_id = data.get('layout_id')
-    if not layout_id:
-        return json_response(error="Invalid layout ID", status=400)
-    if not is_table_available(restaurant.id, layout_id, booking_date):
-        return json_response(error="Table not available at the requested time", status=409)
-    num_guests = data.get('num_guests', 1)
+    try:
+        num_guests = int(data.get('num_guests', 1))
+    except (ValueError, TypeError):
+        return json_response(error="Invalid number of guests", status=400)
+    if num_guests < 1:
+        return json_response(error="Invalid number of guests", status=400)
     special_requests = data.get('special_requests')
     menu_orders = data.get('menu_orders', [])  # Expecting list of {item_id, quantity}
 
-    new_booking = Booking(
-        user_id=data.get('user_id'),
-        restaurant_id=data.get('restaurant_id'),
-        date=booking_date,
-        layout_id=layout_id,
-        num_guests=num_guests,
-        special_requests=special_requests,
-        menu_orders=menu_orders,
-    )
-    db.session.add(new_booking)
-    db.session.commit()
-    
-    msg = Message('Booking Confirmation', recipients=[user.email])
-    msg.body = f"""
+    # Without a layout_id the allocator picks the best-fit table (or adjacent tables) for the party
+    if data.get('layout_id') is None:
+        layout_ids = choose_tables(restaurant, booking_date, num_guests)
+        if not layout_ids:
+            return json_response(error="No table available for this party size at the requested time", status=409)
+    else:
+        try:
+            layout_ids = [int(data.get('layout_id'))]
+        except (ValueError, TypeError):
+            return json_response(error="Invalid layout ID", status=400)
+
+    # The confirmation email is written to the outbox in the same transaction as the booking
+    queue_email([user.email], 'Booking Confirmation', f"""
     Dear {user.name},
     Your booking at {restaurant.name} is confirmed!
     Date: {booking_date.strftime("%Y-%m-%d %H:%M")} UTC
-    Table Number: {layout_id}
+    Table Number: {", ".join(str(layout_id) for layout_id in layout_ids)}
     Number of Guests: {num_guests}
-    """
-    mail.send(msg)
-    
+    """)
+
+    # Locks only the chosen tables while checking for overlaps and inserting
+    try:
+        new_bookings = reserve_tables(
+            restaurant,
+            layout_ids,
+            booking_date,
+            num_guests=num_guests,
+            user_id=user.id,
+            special_requests=special_requests,
+            menu_orders=menu_orders,
+        )
+    except InvalidTable:
+        return json_response(error="Invalid layout ID", status=400)
+    except TableTooSmall as e:
+        return json_response(error=f"Table seats only {e.args[0]} guests", status=400)
+    except BookingConflict:
+        return json_response(error="Table not available at the requested time", status=409)
+    for new_booking in new_bookings:
+        booking_saved(new_booking, restaurant)
+    email_outbox.notify()
+
     return json_response(data={
-        "message": "Booking successful, email sent!",
-        "booking_id": new_booking.id
+        "message": "Booking successful, confirmation email queued!",
+        "booking_id": new_bookings[0].id,
+        "booking_ids": [b.id for b in new_bookings],
+        "layout_ids": [b.layout_id for b in new_bookings]
     }, status=201)
 
 @booking_bp.route('/<int:booking_id>', methods=['PUT'])
@@ -109,6 +119,9 @@ def update_booking(booking_id):
     if booking.user_id != current_user.id:
         return json_response(error="Unauthorized", status=403)
     data = request.json
+    previous_date = booking.date
+    booking_date = booking.date
+    layout_id = booking.layout_id
     if 'date' in data:
         try:
             date_str = data.get('date')
@@ -116,19 +129,41 @@ def update_booking(booking_id):
                 booking_date = datetime.strptime(date_str, "%Y-%m-%dT%H:%M")
             else:
                 booking_date = datetime.strptime(date_str, "%Y-%m-%d")
-            booking.date = booking_date
         except (ValueError, TypeError):
             return json_response(error="Invalid date format. Use YYYY-MM-DD or YYYY-MM-DDTHH:MM", status=400)
     if 'layout_id' in data:
         try:
-            booking.layout_id = int(data.get('layout_id'))
+            layout_id = int(data.get('layout_id'))
         except (ValueError, TypeError):
             return json_response(error="Invalid layout ID", status=400)
+    # num_guests is the whole party's size, even when it is spread over joined tables
+    rows = party_bookings(booking)
+    party_size = sum(row.num_guests or 0 for row in rows) if len(rows) > 1 else booking.num_guests
+    num_guests = None
     if 'num_guests' in data:
-        booking.num_guests = data.get('num_guests')
+        try:
+            num_guests = int(data.get('num_guests'))
+        except (ValueError, TypeError):
+            return json_response(error="Invalid number of guests", status=400)
+        if num_guests < 1:
+            return json_response(error="Invalid number of guests", status=400)
+    if booking_date != booking.date or layout_id != booking.layout_id or num_guests not in (None, party_size):
+        try:
+            rows = move_booking(booking, layout_id, booking_date, num_guests)
+        except InvalidTable:
+            return json_response(error="Invalid layout ID", status=400)
+        except JoinedTables:
+            return json_response(error="A party at joined tables cannot change tables; cancel and rebook instead",
+                                 status=400)
+        except TableTooSmall as e:
+            return json_response(error=f"Table seats only {e.args[0]} guests", status=400)
+        except BookingConflict:
+            return json_response(error="Table not available at the requested time", status=409)
     if 'special_requests' in data:
-        booking.special_requests = data.get('special_requests')
+        rows[0].special_requests = data.get('special_requests')
     db.session.commit()
+    for row in rows:
+        booking_saved(row, booking.restaurant, previous_date=previous_date)
     return json_response(data={"message": "Booking updated successfully"}, status=200)
 
 @booking_bp.route('/<int:booking_id>', methods=['DELETE'])
@@ -138,30 +173,84 @@ def cancel_booking(booking_id):
     booking = Booking.query.get_or_404(booking_id)
     if booking.user_id != current_user.id and not current_user.is_admin:
         return json_response(error="Unauthorized", status=403)
-    db.session.delete(booking)
+    # Cancelling any table of a joined party cancels the whole party
+    rows = party_bookings(booking)
+    restaurant, booking_date = booking.restaurant, booking.date
+    booking_ids = [row.id for row in rows]
+    for row in rows:
+        db.session.delete(row)
     db.session.commit()
+    for row_id in booking_ids:
+        booking_removed(row_id, restaurant, booking_date)
     return json_response(data={"message": "Booking canceled successfully"}, status=200)
 
 @booking_bp.route('/user', methods=['GET'])
 @login_required
 def get_user_bookings():
-    bookings = Booking.query.filter_by(user_id=current_user.id).all()
-    booking_list = [{
-        "id": booking.id,
-        "restaurant_id": booking.restaurant_id,
-        "layout_id": booking.layout_id,  # Changed from table_number
-        "date": booking.date.strftime("%Y-%m-%d %H:%M")
-    } for booking in bookings]
-    return json_response(data=booking_list, status=200)
+    scope = request.args.get('scope', 'all')
+    if scope not in ('all', 'upcoming', 'past'):
+        return json_response(error="scope must be one of all, upcoming, past", status=400)
+    limit = page_size(request.args.get('limit', type=int))
+
+    first_image = db.session.query(RestaurantImage.image_url).filter(
+        RestaurantImage.restaurant_id == Restaurant.id
+    ).order_by(RestaurantImage.id).limit(1).scalar_subquery()
+    query = db.session.query(Booking, Restaurant.name, first_image).join(
+        Restaurant, Restaurant.id == Booking.restaurant_id
+    ).filter(Booking.user_id == current_user.id)
+
+    # Keyset pagination on (date, id): upcoming runs forward in time, past and all run backwards
+    ascending = scope == 'upcoming'
+    now = datetime.utcnow()
+    if scope == 'upcoming':
+        query = query.filter(Booking.date >= now)
+    elif scope == 'past':
+        query = query.filter(Booking.date < now)
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            after = tuple_(*decode_cursor(cursor, datetime, int))
+        except InvalidCursor:
+            return json_response(error="Invalid cursor", status=400)
+        key = tuple_(Booking.date, Booking.id)
+        query = query.filter(key > after if ascending else key < after)
+    if ascending:
+        query = query.order_by(Booking.date.asc(), Booking.id.asc())
+    else:
+        query = query.order_by(Booking.date.desc(), Booking.id.desc())
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.date, last.id)
+
+    booking_list = [BookingSchema.from_row(booking, restaurant_name, image_url)
+                    for booking, restaurant_name, image_url in rows]
+    return with_next_cursor(json_response(data=booking_list, status=200), next_cursor)
 
 @booking_bp.route('/analytics', methods=['GET'])
 @login_required
 def bookings_analytics():
     if not current_user.is_admin:
         return json_response(error="Admin privileges required", status=403)
-    analytics = db.session.query(func.date(Booking.date), func.count(Booking.id)) \
-                  .group_by(func.date(Booking.date)).all()
-    result = [{"date": str(date), "bookings": count} for date, count in analytics]
+    query = db.session.query(
+        BookingDailyRollup.day,
+        func.sum(BookingDailyRollup.bookings),
+        func.sum(BookingDailyRollup.guests),
+        func.sum(BookingDailyRollup.cancellations)
+    )
+    restaurant_id = request.args.get('restaurant_id', type=int)
+    if restaurant_id:
+        query = query.filter(BookingDailyRollup.restaurant_id == restaurant_id)
+    analytics = query.group_by(BookingDailyRollup.day).order_by(BookingDailyRollup.day).all()
+    result = [{
+        "date": str(day),
+        "bookings": int(bookings or 0),
+        "guests": int(guests or 0),
+        "cancellations": int(cancellations or 0)
+    } for day, bookings, guests, cancellations in analytics]
     return json_response(data=result, status=200)
 
 @booking_bp.route('/availability', methods=['GET'])
@@ -187,6 +276,27 @@ def get_available_tables():
         logger.error(f"Restaurant ID parsing error: {str(e)}")
         return json_response(error="Invalid restaurant ID", status=400)
 
+    # Polling clients that already hold the current version get a 304 without any query
+    day = booking_date.date()
+    etag = availability_cache.etag(restaurant_id, day)
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+    variant = booking_date.strftime("%H:%M")
+    cached = availability_cache.get(restaurant_id, day, variant)
+    if cached is not None:
+        return _with_etag(json_response(data=cached, status=200), etag)
+    version = availability_cache.version(restaurant_id, day)
+
+    # Serve from the in-memory occupancy index when it is enabled
+    if occupancy_index.enabled:
+        available_tables = occupancy_index.available_table_ids(restaurant_id, booking_date)
+        if available_tables is None:
+            logger.warning(f"Restaurant not found: ID={restaurant_id}")
+            return json_response(error="Restaurant not found", status=404)
+        payload = {"available_tables": available_tables}
+        availability_cache.put(restaurant_id, day, variant, version, payload)
+        return _with_etag(json_response(data=payload, status=200), etag)
+
     # Check if restaurant exists
     try:
         restaurant = Restaurant.query.get(restaurant_id)
@@ -199,23 +309,9 @@ def get_available_tables():
         logger.error(f"Error fetching restaurant: {str(e)}", exc_info=True)
         return json_response(error="Error accessing restaurant data", status=500)
 
-    # Query available tables
+    # Query available tables: one query for the tables and their overlapping bookings
     try:
-        # Get all tables for the restaurant
-        all_tables = Layout.query.filter(
-            Layout.restaurant_id == restaurant_id,
-            Layout.type == 'table'
-        ).all()
-        logger.debug(f"Found {len(all_tables)} tables for restaurant {restaurant_id}")
-
-        if not all_tables:
-            logger.warning(f"No tables found for restaurant {restaurant_id}")
-            return json_response(data={"available_tables": []}, status=200)
-
-        available_tables = []
-        for table in all_tables:
-            if is_table_available(restaurant_id, table.id, booking_date):
-                available_tables.append(table.id)
+        available_tables = available_table_ids(restaurant, booking_date)
         logger.debug(f"Found {len(available_tables)} available tables")
     except Exception as e:
         logger.error(f"Error querying available tables: {str(e)}", exc_info=True)
@@ -223,15 +319,91 @@ def get_available_tables():
 
     # Return available table IDs
     logger.debug(f"Returning layout_ids: {available_tables}")
-    return json_response(data={"available_tables": available_tables}, status=200)
+    payload = {"available_tables": available_tables}
+    availability_cache.put(restaurant_id, day, variant, version, payload)
+    return _with_etag(json_response(data=payload, status=200), etag)
+
+@booking_bp.route('/availability/grid', methods=['GET'])
+def get_availability_grid():
+    restaurant_id = request.args.get('restaurant_id', type=int)
+    date_str = request.args.get('date')
+    step = request.args.get('step', current_app.config['AVAILABILITY_SLOT_MINUTES'], type=int)
+
+    try:
+        day = datetime.strptime(date_str, "%Y-%m-%d").date()
+    except (ValueError, TypeError):
+        return json_response(error="Invalid date format. Use YYYY-MM-DD", status=400)
+    if not restaurant_id:
+        return json_response(error="Invalid restaurant ID", status=400)
+    if not 5 <= step <= 240:
+        return json_response(error="Step must be between 5 and 240 minutes", status=400)
+
+    etag = availability_cache.etag(restaurant_id, day)
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+    variant = f"grid/{step}"
+    cached = availability_cache.get(restaurant_id, day, variant)
+    if cached is not None:
+        return _with_etag(json_response(data=cached, status=200), etag)
+    version = availability_cache.version(restaurant_id, day)
+
+    restaurant = Restaurant.query.get(restaurant_id)
+    if not restaurant:
+        return json_response(error="Restaurant not found", status=404)
+
+    slots, tables = day_slot_grid(restaurant, day, step)
+    payload = {
+        "restaurant_id": restaurant.id,
+        "date": day.isoformat(),
+        "step": step,
+        "booking_duration": restaurant.booking_duration or 120,
+        "slots": [slot.strftime("%Y-%m-%dT%H:%M") for slot in slots],
+        "tables": tables
+    }
+    availability_cache.put(restaurant_id, day, variant, version, payload)
+    return _with_etag(json_response(data=payload, status=200), etag)
+
+@booking_bp.route('/availability/cache-stats', methods=['GET'])
+@login_required
+def availability_cache_stats():
+    if not current_user.is_admin:
+        return json_response(error="Admin privileges required", status=403)
+    return json_response(data=availability_cache.stats(), status=200)
+
+@booking_bp.route('/allocate', methods=['GET'])
+def suggest_tables():
+    restaurant_id = request.args.get('restaurant_id', type=int)
+    party_size = request.args.get('party_size', type=int)
+    try:
+        booking_date = datetime.strptime(request.args.get('date'), "%Y-%m-%dT%H:%M")
+    except (ValueError, TypeError):
+        return json_response(error="Invalid date format. Use YYYY-MM-DDTHH:MM", status=400)
+    if not party_size or party_size < 1:
+        return json_response(error="party_size must be a positive integer", status=400)
+    restaurant = Restaurant.query.get(restaurant_id)
+    if not restaurant:
+        return json_response(error="Restaurant not found", status=404)
+    layout_ids = choose_tables(restaurant, booking_date, party_size)
+    return json_response(data={"layout_ids": list(layout_ids or [])}, status=200)
+
+@booking_bp.route('/occupancy/verify', methods=['POST'])
+@login_required
+@csrf.exempt
+def verify_occupancy_index():
+    if not current_user.is_admin:
+        return json_response(error="Admin privileges required", status=403)
+    mismatches = occupancy_index.verify(request.args.get('restaurant_id', type=int))
+    for restaurant_id in {mismatch["restaurant_id"] for mismatch in mismatches}:
+        availability_cache.bump_restaurant(restaurant_id)
+    return json_response(data={"consistent": not mismatches, "mismatches": mismatches}, status=200)
 
 @booking_bp.route('/count/this-week', methods=['GET'])
 def get_bookings_this_week():
-    today = datetime.utcnow()
+    today = datetime.utcnow().date()
     start_of_week = today - timedelta(days=today.weekday())  # Monday of this week
     end_of_week = start_of_week + timedelta(days=7)  # End of week
-    count = Booking.query.filter(
-        Booking.date >= start_of_week,
-        Booking.date < end_of_week
-    ).count()
-    return json_response(data={"count": count}, status=200)
\ No newline at end of file
+    count = db.session.query(func.sum(BookingDailyRollup.bookings)).filter(
+        BookingDailyRollup.day >= start_of_week,
+        BookingDailyRollup.day < end_of_week
+    ).scalar()
+    return json_response(data={"count": int(count or 0)}, status=200)
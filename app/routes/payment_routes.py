@@ -3,6 +3,7 @@ from flask import Blueprint, request
 from flask_login import login_required, current_user
 from app.extensions import db
 from app.models import Payment, Booking, MenuItem
+from app.utils.reservations import party_bookings
 from app.utils.response import json_response
 
 payment_bp = Blueprint('payment', __name__, url_prefix='/api/payments')
@@ -25,6 +26,11 @@ def create_payment():
     if booking.user_id != current_user.id and not current_user.is_admin:
         return json_response(error="Unauthorized", status=403)
 
+    # A party at joined tables pays once, against its first row, which holds the order
+    booking = party_bookings(booking)[0]
+    if Payment.query.filter_by(booking_id=booking.id, status='PAID').first():
+        return json_response(error="Booking already paid", status=409)
+
     # Calculate total amount from menu_orders
     menu_orders = booking.menu_orders or []
     calculated_amount = 0
@@ -39,7 +45,7 @@ def create_payment():
         return json_response(error="Amount mismatch", status=400)
 
     # Create payment
-    payment = Payment(booking_id=booking_id, amount=amount)
+    payment = Payment(booking_id=booking.id, amount=amount)
     db.session.add(payment)
     db.session.commit()
 
@@ -1,14 +1,38 @@
 # restaurant_routes.py
-from flask import Blueprint, request
+from flask import Blueprint, Response, current_app, request, stream_with_context
 from app.extensions import db
 import logging
-from app.models import Restaurant, MenuItem, RestaurantImage, Layout, Review
+from sqlalchemy.exc import IntegrityError
+from app.models import Restaurant, RestaurantImage, Layout, Review
 from flask_login import login_required, current_user
 # Removed unused import
 import random
 import math
+from datetime import datetime, timedelta
 from app.extensions import csrf
 from app.utils.response import json_response
+from app.utils.autocomplete import autocomplete_index
+from app.utils.availability import DEFAULT_BOOKING_DURATION, find_available_tables
+from app.utils.geo import bounding_box, haversine_km
+from app.utils.booking_events import floor_changed
+from app.utils.collaborative import collaborative
+from app.utils.catalog_snapshot import RESTAURANTS, catalog_snapshot, menu_key, snapshot_response
+from app.utils.facets import facet_counts, parse_features, with_all_features
+from app.utils.geo_index import geo_index
+from app.utils.layouts import InvalidLayoutItem, LayoutConflict, parse_layout_items, save_layout
+from app.utils.listing import first_image_url, listing_query, parse_fields, serialize_row, stream_listing
+from app.utils.map_clusters import map_clusters, tiles_in_view
+from app.utils.menus import (
+    InvalidMenuItem, dish_names, grouped_menu_payload, menu_payload, parse_menu_items, upsert_menu
+)
+from app.utils.opening_hours import open_filter
+from app.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, page_size, with_next_cursor
+from app.utils.recommender import recommender
+from app.utils.restaurant_events import menu_changed, restaurant_removed, restaurant_saved
+from app.utils.schemas import (
+    LayoutSchema, RestaurantDetailsSchema, RestaurantSchema, ReviewPageSchema, ReviewSchema, SearchPageSchema
+)
+from app.utils.search import reindex, text_search
 
 restaurant_bp = Blueprint('restaurant', __name__, url_prefix='/api/restaurants')
 
@@ -223,29 +247,50 @@ def get_restaurant_layout(restaurant_id):
             db.session.add(layout_item)
         
         db.session.commit()
+        floor_changed(restaurant_id)
         existing_layout = Layout.query.filter_by(restaurant_id=restaurant_id).all()
     
-    return json_response(data=[
-        {c.name: getattr(l, c.name) for c in l.__table__.columns}
-        for l in existing_layout
-    ], status=200)
+    return json_response(data=[LayoutSchema.from_row(l) for l in existing_layout], status=200)
 
 @restaurant_bp.route('', methods=['GET'])
 def get_restaurants():
-    restaurants = Restaurant.query.all()
-    restaurants_list = [{
-        "id": r.id,
-        "name": r.name,
-        "location": r.location,
-        "cuisine": r.cuisine,
-        "promo": r.promo,
-        "lat": r.lat,
-        "lon": r.lon,
-        "opening_time": r.opening_time.strftime("%H:%M") if r.opening_time else None,
-        "closing_time": r.closing_time.strftime("%H:%M") if r.closing_time else None,
-        "image_url": r.images[0].image_url if r.images else "/static/placeholder.png"
-    } for r in restaurants]
-    return json_response(data=restaurants_list, status=200)
+    if not request.args:
+        snapshot = catalog_snapshot.get(RESTAURANTS)
+        if snapshot is not None:
+            return snapshot_response(snapshot)
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        is_open = open_filter(request.args)
+    except ValueError as e:
+        return json_response(error=str(e), status=400)
+    criteria = [is_open] if is_open is not None else []
+    features = parse_features(request.args.get('features'))
+    if features:
+        criteria.append(with_all_features(features))
+
+    requested_limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    if requested_limit is None and not cursor:
+        # No paging asked for: stream the whole catalogue without holding it in memory
+        return Response(
+            stream_with_context(stream_listing(fields, current_app.json.dumps, criteria)),
+            status=200, mimetype='application/json'
+        )
+
+    after_id = None
+    if cursor:
+        try:
+            after_id, = decode_cursor(cursor, int)
+        except InvalidCursor:
+            return json_response(error="Invalid cursor", status=400)
+    limit = page_size(requested_limit)
+    rows = listing_query(fields, after_id, criteria).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]._key)
+    restaurants_list = [serialize_row(row, fields) for row in rows]
+    return with_next_cursor(json_response(data=restaurants_list, status=200), next_cursor)
 
 @restaurant_bp.route('', methods=['POST'])
 @login_required
@@ -273,10 +318,12 @@ def add_restaurant():
             opening_time=data.get('opening_time'),
             closing_time=data.get('closing_time'),
             capacity=data.get('capacity', 50),
-            average_price=data.get('average_price')
+            average_price=data.get('average_price'),
+            features=data.get('features')
         )
         db.session.add(new_restaurant)
         db.session.commit()
+        restaurant_saved(new_restaurant)
         return json_response(data={"message": "Restaurant added successfully"}, status=201)
     except Exception as e:
         db.session.rollback()
@@ -286,22 +333,7 @@ def add_restaurant():
 @restaurant_bp.route('/<int:restaurant_id>', methods=['GET'])
 def restaurant_details(restaurant_id):
     restaurant = Restaurant.query.get_or_404(restaurant_id)
-    data = {
-        "id": restaurant.id,
-        "name": restaurant.name,
-        "location": restaurant.location,
-        "cuisine": restaurant.cuisine,
-        "promo": restaurant.promo,
-        "lat": restaurant.lat,
-        "lon": restaurant.lon,
-        "opening_time": restaurant.opening_time.strftime("%H:%M") if restaurant.opening_time else None,
-        "closing_time": restaurant.closing_time.strftime("%H:%M") if restaurant.closing_time else None,
-        "images": [img.image_url for img in restaurant.images],
-        "capacity": restaurant.capacity,
-        "average_price": restaurant.average_price,
-        "features": restaurant.features
-    }
-    return json_response(data=data, status=200)
+    return json_response(data=RestaurantDetailsSchema.from_row(restaurant), status=200)
 
 @restaurant_bp.route('/<int:restaurant_id>', methods=['PUT'])
 @login_required
@@ -319,6 +351,7 @@ def edit_restaurant(restaurant_id):
     restaurant.lon = data.get('lon', restaurant.lon)
     restaurant.opening_time = data.get('opening_time', restaurant.opening_time)
     restaurant.closing_time = data.get('closing_time', restaurant.closing_time)
+    restaurant.features = data.get('features', restaurant.features)
 
     RestaurantImage.query.filter_by(restaurant_id=restaurant.id).delete()
     image_urls = data.get('image_urls', [])
@@ -329,6 +362,7 @@ def edit_restaurant(restaurant_id):
             db.session.add(new_image)
 
     db.session.commit()
+    restaurant_saved(restaurant)
     return json_response(data={"message": "Restaurant updated successfully"}, status=200)
 
 @restaurant_bp.route('/<int:restaurant_id>', methods=['DELETE'])
@@ -341,6 +375,8 @@ def delete_restaurant(restaurant_id):
     Layout.query.filter_by(restaurant_id=restaurant.id).delete()
     db.session.delete(restaurant)
     db.session.commit()
+    floor_changed(restaurant_id)
+    restaurant_removed(restaurant_id)
     return json_response(data={"message": "Restaurant deleted successfully"}, status=200)
 
 @restaurant_bp.route('/search', methods=['GET'])
@@ -348,84 +384,270 @@ def search_restaurants():
     search_query = request.args.get('q', '')
     cuisine_filter = request.args.get('cuisine', '')
     min_rating = request.args.get('min_rating', 0, type=float)
-
-    query = Restaurant.query
-
-    if search_query:
-        query = query.filter(
-            (Restaurant.name.ilike(f'%{search_query}%')) | 
-            (Restaurant.location.ilike(f'%{search_query}%'))
-        )
+    try:
+        is_open = open_filter(request.args)
+    except ValueError as e:
+        return json_response(error=str(e), status=400)
+    sort = request.args.get('sort', '')
+    if sort not in ('', 'relevance', 'rating'):
+        return json_response(error="sort must be 'relevance' or 'rating'", status=400)
+    features = parse_features(request.args.get('features'))
+    with_facets = request.args.get('facets', '').lower() in ('1', 'true')
+    limit = page_size(request.args.get('limit', type=int), default=20)
+    offset = 0
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            offset, = decode_cursor(cursor, int)
+        except InvalidCursor:
+            return json_response(error="Invalid cursor", status=400)
+
+    columns = [
+        Restaurant.id, Restaurant.name, Restaurant.cuisine, Restaurant.rating, Restaurant.lat,
+        Restaurant.lon, Restaurant.features, Restaurant.promo, first_image_url().label('image_url')
+    ]
+    matches = text_search(search_query)
+    if matches is not None:
+        query = db.session.query(*columns).join(matches, matches.c.id == Restaurant.id)
+    elif search_query.strip():
+        return json_response(data={"results": [], "facet_counts": {}} if with_facets else [], status=200)
+    else:
+        query = db.session.query(*columns)
 
     if cuisine_filter:
-        query = query.filter_by(cuisine=cuisine_filter)
+        query = query.filter(Restaurant.cuisine == cuisine_filter)
 
     if min_rating > 0:
         query = query.filter(Restaurant.rating >= min_rating)
 
-    results = query.all()
+    if is_open is not None:
+        query = query.filter(is_open)
+
+    if features:
+        query = query.filter(with_all_features(features))
+
+    if sort == 'rating' or matches is None:
+        query = query.order_by(Restaurant.rating.desc(), Restaurant.id)
+    else:
+        query = query.order_by(matches.c.score.desc(), Restaurant.id)
+
+    results = query.offset(offset).limit(limit + 1).all()
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_cursor(offset + limit)
+
+    restaurants_list = [RestaurantSchema.from_row(r) for r in results]
+    if with_facets:
+        # Counts cover every match, not just this page: one grouped query over the filtered ids
+        matching_ids = query.with_entities(Restaurant.id).order_by(None)
+        data = SearchPageSchema(results=restaurants_list, facet_counts=facet_counts(matching_ids))
+    else:
+        data = restaurants_list
+    return with_next_cursor(json_response(data=data, status=200), next_cursor)
+
+@restaurant_bp.route('/autocomplete', methods=['GET'])
+def autocomplete():
+    prefix = request.args.get('q', '')
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        return json_response(error="limit must be a positive integer", status=400)
+    return json_response(data=[{
+        "text": suggestion.text,
+        "kind": suggestion.kind,
+        "restaurant_id": suggestion.restaurant_id
+    } for suggestion in autocomplete_index.suggest(prefix, limit)], status=200)
+
+def _restaurants_by_distance(hits, fields, criteria=()):
+    """Listing rows for [(distance_km, restaurant id)] hits, in hit order, with distance_km added."""
+    rows = {
+        row._key: row for row in
+        listing_query(fields, criteria=criteria).filter(
+            Restaurant.id.in_([restaurant_id for _, restaurant_id in hits]))
+    }
+    return [
+        dict(serialize_row(rows[restaurant_id], fields), distance_km=round(distance, 3))
+        for distance, restaurant_id in hits if restaurant_id in rows
+    ]
+
+def _coordinates():
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat and lon are required and must be valid coordinates")
+    return lat, lon
+
+@restaurant_bp.route('/nearby', methods=['GET'])
+def nearby_restaurants():
+    try:
+        lat, lon = _coordinates()
+        fields = parse_fields(request.args.get('fields'))
+        is_open = open_filter(request.args)
+    except ValueError as e:
+        return json_response(error=str(e), status=400)
+    radius_km = request.args.get('radius_km', 5, type=float)
+    if not 0 < radius_km <= 500:
+        return json_response(error="radius_km must be between 0 and 500", status=400)
+    limit = page_size(request.args.get('limit', type=int))
+    hits = geo_index.within(lat, lon, radius_km)
+    if is_open is None:
+        return json_response(data=_restaurants_by_distance(hits[:limit], fields), status=200)
+    # Closed restaurants are dropped in SQL, so look at every hit in the radius before cutting to the limit
+    nearby = []
+    for start in range(0, len(hits), 500):
+        nearby += _restaurants_by_distance(hits[start:start + 500], fields, [is_open])
+        if len(nearby) >= limit:
+            break
+    return json_response(data=nearby[:limit], status=200)
+
+@restaurant_bp.route('/nearest', methods=['GET'])
+def nearest_restaurants():
+    try:
+        lat, lon = _coordinates()
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return json_response(error=str(e), status=400)
+    k = page_size(request.args.get('k', type=int), default=10)
+    max_km = request.args.get('max_km', type=float)
+    hits = geo_index.nearest(lat, lon, k, max_km)
+    return json_response(data=_restaurants_by_distance(hits, fields), status=200)
+
+@restaurant_bp.route('/clusters', methods=['GET'])
+def map_marker_clusters():
+    bounds = [request.args.get(name, type=float) for name in ('min_lat', 'max_lat', 'min_lon', 'max_lon')]
+    zoom = request.args.get('zoom', type=int)
+    if None in bounds or zoom is None:
+        return json_response(error="min_lat, max_lat, min_lon, max_lon and zoom are required", status=400)
+    min_lat, max_lat, min_lon, max_lon = bounds
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+        return json_response(error="Invalid bounding box", status=400)
+    if not 0 <= zoom <= current_app.config['MAP_MAX_ZOOM']:
+        return json_response(error=f"zoom must be between 0 and {current_app.config['MAP_MAX_ZOOM']}", status=400)
+    tiles = tiles_in_view(min_lat, max_lat, min_lon, max_lon, zoom)
+    if len(tiles) > current_app.config['MAP_MAX_TILES']:
+        return json_response(error="Bounding box too large for this zoom level", status=400)
+    return json_response(data=[
+        cluster for x, y in tiles for cluster in map_clusters.tile(zoom, x, y)
+        if min_lat <= cluster["lat"] <= max_lat and min_lon <= cluster["lon"] <= max_lon
+    ], status=200)
+
+@restaurant_bp.route('/find-table', methods=['GET'])
+def find_table():
+    party_size = request.args.get('party_size', type=int)
+    date_str = request.args.get('date')
+    search_query = request.args.get('q', '')
+    cuisine_filter = request.args.get('cuisine', '')
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    radius_km = request.args.get('radius_km', 10, type=float)
+    limit = min(page_size(request.args.get('limit', type=int), default=20), 100)
 
+    if not party_size or party_size < 1:
+        return json_response(error="party_size must be a positive integer", status=400)
+    try:
+        start = datetime.strptime(date_str, "%Y-%m-%dT%H:%M")
+    except (ValueError, TypeError):
+        return json_response(error="Invalid date format. Use YYYY-MM-DDTHH:MM", status=400)
+    if (lat is None) != (lon is None):
+        return json_response(error="lat and lon must be given together", status=400)
+
+    query = db.session.query(
+        Restaurant.id, Restaurant.name, Restaurant.location, Restaurant.cuisine,
+        Restaurant.lat, Restaurant.lon, Restaurant.booking_duration
+    )
+    matches = text_search(search_query)
+    if matches is not None:
+        query = query.join(matches, matches.c.id == Restaurant.id)
+    if cuisine_filter:
+        query = query.filter(Restaurant.cuisine == cuisine_filter)
+    if lat is not None:
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+        query = query.filter(
+            Restaurant.lat.between(min_lat, max_lat),
+            Restaurant.lon.between(min_lon, max_lon)
+        )
+
+    candidates = {}
+    for r in query.all():
+        distance = haversine_km(lat, lon, r.lat, r.lon) if lat is not None else None
+        if distance is None or distance <= radius_km:
+            candidates[r.id] = (r, distance)
+
+    durations = {
+        rid: timedelta(minutes=r.booking_duration or DEFAULT_BOOKING_DURATION)
+        for rid, (r, _) in candidates.items()
+    }
+    available = find_available_tables(
+        query.with_entities(Restaurant.id).statement, durations, start, party_size
+    )
+
+    matches = [candidates[rid] for rid in available]
+    matches.sort(key=lambda match: (match[1] is None, match[1] or 0, match[0].name))
     return json_response(data=[{
         "id": r.id,
         "name": r.name,
+        "location": r.location,
         "cuisine": r.cuisine,
-        "rating": r.rating,
         "lat": r.lat,
         "lon": r.lon,
-        "features": r.features,
-        "promo": r.promo,
-        "image_url": r.images[0].image_url if r.images else ''
-    } for r in results], status=200)
+        "distance_km": round(distance, 2) if distance is not None else None,
+        "available_tables": [
+            {"layout_id": layout_id, "capacity": capacity}
+            for layout_id, capacity in available[r.id]
+        ]
+    } for r, distance in matches[:limit]], status=200)
 
 @restaurant_bp.route('/<int:restaurant_id>/menu', methods=['GET'])
 def get_menu(restaurant_id):
-    menu_items = MenuItem.query.filter_by(restaurant_id=restaurant_id).all()
-    return json_response(data=[{
-        "id": item.id,
-        "category": item.category,
-        "name": item.name,
-        "description": item.description,
-        "price": item.price,
-        "image_url": item.image_url
-    } for item in menu_items], status=200)
+    group = request.args.get('group', '')
+    if group not in ('', 'category'):
+        return json_response(error="group must be 'category'", status=400)
+    grouped = group == 'category'
+    snapshot = catalog_snapshot.get(menu_key(restaurant_id, grouped))
+    if snapshot is not None:
+        return snapshot_response(snapshot)
+    payload = grouped_menu_payload(restaurant_id) if grouped else menu_payload(restaurant_id)
+    return json_response(data=payload, status=200)
+
+@restaurant_bp.route('/<int:restaurant_id>/menu', methods=['PUT'])
+@login_required
+@csrf.exempt
+def upsert_restaurant_menu(restaurant_id):
+    if not current_user.is_admin:
+        return json_response(error="Admin privileges required", status=403)
+    Restaurant.query.get_or_404(restaurant_id)
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode', 'diff')
+    if mode not in ('diff', 'replace'):
+        return json_response(error="mode must be 'diff' or 'replace'", status=400)
+    try:
+        items = parse_menu_items(data.get('items'))
+        previous_dishes = dish_names(restaurant_id)
+        counts = upsert_menu(restaurant_id, items, replace=mode == 'replace')
+    except InvalidMenuItem as e:
+        db.session.rollback()
+        return json_response(error=str(e), status=400)
+    reindex([restaurant_id])
+    db.session.commit()
+    menu_changed(restaurant_id, previous_dishes, [item['name'] for item in items])
+    return json_response(data=counts, status=200)
 
 @restaurant_bp.route('/recommendations', methods=['GET'])
 @login_required
 def restaurant_recommendations():
-    user_pref = current_user.preferences[0] if current_user.preferences else None
-    restaurants = Restaurant.query.all()
-
-    if not user_pref:
-        return json_response(data=[
-            {
-                "id": r.id,
-                "name": r.name,
-                "location": r.location,
-                "cuisine": r.cuisine
-            } for r in restaurants
-        ], status=200)
-
-    pref_cuisine = user_pref.preferred_cuisine.lower() if user_pref.preferred_cuisine else None
-    dietary_res = user_pref.dietary_restrictions.lower() if user_pref.dietary_restrictions else ""
-    # Removed unused variable
-
-    scored_restaurants = []
-
-    for r in restaurants:
-        score = 0
-        if pref_cuisine and pref_cuisine in r.cuisine.lower():
-            score += 2
-        if "no peanuts" in dietary_res and "peanut" in r.cuisine.lower():
-            score -= 999
-        scored_restaurants.append((score, r))
-
-    scored_restaurants.sort(key=lambda x: x[0], reverse=True)
-    top_5 = scored_restaurants[:5]
-
-    result = [{"id": rest.id, "name": rest.name, "location": rest.location, "cuisine": rest.cuisine}
-              for (scr, rest) in top_5 if scr >= 0]
-
-    return json_response(data=result, status=200)
+    limit = max(1, min(request.args.get('limit', 5, type=int), current_app.config['RECOMMENDER_TOP_K']))
+    # Neighbours of the user's bookings and reviews first, topped up from their preference profile
+    ids = collaborative.recommend(current_user.id, limit)
+    if len(ids) < limit:
+        fallback = recommender.recommend(current_user.id, limit + len(ids))
+        ids += [rid for rid in fallback if rid not in ids][:limit - len(ids)]
+    restaurants = {r.id: r for r in db.session.query(
+        Restaurant.id, Restaurant.name, Restaurant.location, Restaurant.cuisine
+    ).filter(Restaurant.id.in_(ids))}
+    return json_response(data=[
+        {"id": r.id, "name": r.name, "location": r.location, "cuisine": r.cuisine}
+        for r in (restaurants.get(rid) for rid in ids) if r is not None
+    ], status=200)
 
 @restaurant_bp.route('/<int:restaurant_id>/layout', methods=['PUT'])
 @login_required
@@ -433,40 +655,25 @@ def restaurant_recommendations():
 def update_layout(restaurant_id):
     if not current_user.is_admin:
         return json_response(error="Admin privileges required", status=403)
+    restaurant = Restaurant.query.get_or_404(restaurant_id)
     try:
-        data = request.get_json()
-        new_layout = data.get('layout', [])
-        
-        if not new_layout:
-            return json_response(error="Layout data is empty", status=400)
-
-        Layout.query.filter_by(restaurant_id=restaurant_id).delete()
-        
-        for item in new_layout:
-            if not all(key in item for key in ['type', 'x_coordinate', 'y_coordinate']):
-                return json_response(error="Missing required fields in layout item", status=400)
-            
-            new_item = Layout(
-                restaurant_id=restaurant_id,
-                type=item['type'],
-                x_coordinate=float(item['x_coordinate']),
-                y_coordinate=float(item['y_coordinate']),
-                table_type=item.get('table_type'),
-                table_number=item.get('table_number'),
-                capacity=item.get('capacity', 4),
-                width=item.get('width'),
-                height=item.get('height'),
-                color=item.get('color', '#4a5568'),
-                name=item.get('name', 'New Item'),
-                shape=item.get('shape', 'rectangle')
-            )
-            db.session.add(new_item)
-
+        data = request.get_json(silent=True) or {}
+        counts = save_layout(restaurant, parse_layout_items(data.get('layout', [])))
         db.session.commit()
-        return json_response(data={"message": "Layout updated successfully"}, status=200)
+    except InvalidLayoutItem as e:
+        db.session.rollback()
+        return json_response(error=str(e), status=400)
+    except LayoutConflict as e:
+        db.session.rollback()
+        return json_response(error=str(e), status=409)
+    except IntegrityError:
+        db.session.rollback()  # A booking for a removed table landed after the check
+        return json_response(error="Tables referenced by bookings cannot be removed", status=409)
     except Exception as e:
         db.session.rollback()
         return json_response(error=f"Error saving layout: {str(e)}", status=500)
+    floor_changed(restaurant_id)
+    return json_response(data={"message": "Layout updated successfully", **counts}, status=200)
 
 @restaurant_bp.route('/<int:restaurant_id>/suggest-layout', methods=['POST'])
 @login_required
@@ -474,9 +681,7 @@ def update_layout(restaurant_id):
 def suggest_layout(restaurant_id):
     if not current_user.is_admin:
         return json_response(error="Admin privileges required", status=403)
-    
-    Layout.query.filter_by(restaurant_id=restaurant_id).delete()
-    db.session.commit()
+    restaurant = Restaurant.query.get_or_404(restaurant_id)
 
     total_tables = random.randint(8, 12)
     container_width = 800
@@ -528,17 +733,35 @@ def suggest_layout(restaurant_id):
             attempts += 1
 
         if not collision:
-            generated_tables.append({'x': x_percent, 'y': y_percent})
-            new_table = Layout(
-                restaurant_id=restaurant_id,
-                table_number=i + 1,
-                x_coordinate=x_percent,
-                y_coordinate=y_percent,
-                shape='circle' if random.random() < 0.5 else 'rectangle',
-                capacity=random.randint(2, 8)
-            )
-            db.session.add(new_table)
-    db.session.commit()
+            generated_tables.append({
+                'x': x_percent,
+                'y': y_percent,
+                'item': {
+                    "type": "table",
+                    "table_number": i + 1,
+                    "x_coordinate": x_percent,
+                    "y_coordinate": y_percent,
+                    "shape": 'circle' if random.random() < 0.5 else 'rectangle',
+                    "capacity": random.randint(2, 8),
+                    "name": None,
+                    "color": None
+                }
+            })
+
+    # Saved like an admin edit: tables keep their ids by number, booked tables are never dropped
+    try:
+        save_layout(restaurant, parse_layout_items([t['item'] for t in generated_tables]))
+        db.session.commit()
+    except InvalidLayoutItem as e:
+        db.session.rollback()
+        return json_response(error=str(e), status=400)
+    except LayoutConflict as e:
+        db.session.rollback()
+        return json_response(error=str(e), status=409)
+    except IntegrityError:
+        db.session.rollback()  # A booking for a removed table landed after the check
+        return json_response(error="Tables referenced by bookings cannot be removed", status=409)
+    floor_changed(restaurant_id)
 
     tables = Layout.query.filter_by(restaurant_id=restaurant_id).all()
     layout_data = [{
@@ -564,19 +787,10 @@ def list_reviews(restaurant_id):
 
     reviews = Review.query.filter_by(restaurant_id=restaurant_id).order_by(Review.date_created.desc()).paginate(page=page, per_page=per_page)
 
-    reviews_list = [{
-        "id": r.id,
-        "user_id": r.user_id,
-        "restaurant_id": r.restaurant_id,
-        "rating": r.rating,
-        "comment": r.comment,
-        "date_created": r.date_created
-    } for r in reviews.items]
-
-    return json_response(data={
-        "reviews": reviews_list,
-        "total_pages": reviews.pages
-    }, status=200)
+    return json_response(data=ReviewPageSchema(
+        reviews=[ReviewSchema.from_row(r) for r in reviews.items],
+        total_pages=reviews.pages
+    ), status=200)
 
 @csrf.exempt
 @restaurant_bp.route('/<int:restaurant_id>/reviews', methods=['POST'])
@@ -589,9 +803,18 @@ def add_review(restaurant_id):
     if not rating or not comment:
         return json_response(error="Rating and comment are required", status=400)
 
-    if not (1 <= rating <= 5):
+    if isinstance(rating, bool) or not isinstance(rating, int) or not (1 <= rating <= 5):
         return json_response(error="Rating must be 1-5", status=400)
-    
+
+    # Bump the aggregates in SQL so concurrent reviews cannot lose an update
+    updated = Restaurant.query.filter_by(id=restaurant_id).update({
+        Restaurant.rating_sum: Restaurant.rating_sum + rating,
+        Restaurant.rating_count: Restaurant.rating_count + 1,
+        getattr(Restaurant, f"stars_{rating}"): getattr(Restaurant, f"stars_{rating}") + 1
+    }, synchronize_session=False)
+    if not updated:
+        db.session.rollback()
+        return json_response(error="Restaurant not found", status=404)
     new_review = Review(
         user_id=current_user.id,
         restaurant_id=restaurant_id,
@@ -600,6 +823,7 @@ def add_review(restaurant_id):
     )
     db.session.add(new_review)
     db.session.commit()
+    catalog_snapshot.invalidate(RESTAURANTS)  # The listing carries the rating
 
     return json_response(data={"message": "Review added successfully", "review_id": new_review.id}, status=201)
 
@@ -0,0 +1,111 @@
+# utils/allocator.py
+"""
+Party-size-aware table allocation.
+
+A party gets the smallest free table that seats it. When no single table is
+big enough, the allocator looks for a small group of free tables standing next
+to each other on the floor plan (by x_coordinate/y_coordinate) and picks the
+group that wastes the fewest seats. Keeping big tables for big parties is what
+keeps seat utilisation high over an evening.
+"""
+import math
+from collections import namedtuple
+from flask import current_app
+from app.extensions import db
+from app.models import Layout
+from app.utils.availability import available_table_ids
+from app.utils.occupancy import occupancy_index
+
+FloorTable = namedtuple('FloorTable', ['id', 'capacity', 'x', 'y'])
+
+DEFAULT_JOIN_DISTANCE = 20.0  # floor-plan units (percent of the floor width)
+DEFAULT_MAX_JOINED = 3
+
+
+def _neighbours(tables, join_distance):
+    """Adjacency lists for tables within `join_distance`, found through grid buckets."""
+    cell = join_distance
+    buckets = {}
+    for table in tables:
+        buckets.setdefault((int(table.x // cell), int(table.y // cell)), []).append(table)
+    adjacent = {table.id: [] for table in tables}
+    for table in tables:
+        cx, cy = int(table.x // cell), int(table.y // cell)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other in buckets.get((cx + dx, cy + dy), ()):
+                    if other.id != table.id and math.hypot(table.x - other.x, table.y - other.y) <= join_distance:
+                        adjacent[table.id].append(other)
+    return adjacent
+
+
+def _group_cost(group, party_size):
+    capacity = sum(table.capacity for table in group)
+    spread = sum(math.hypot(a.x - b.x, a.y - b.y) for i, a in enumerate(group) for b in group[i + 1:])
+    return (capacity - party_size, spread)
+
+
+def allocate(tables, party_size, join_distance=DEFAULT_JOIN_DISTANCE, max_joined=DEFAULT_MAX_JOINED):
+    """
+    Choose tables for a party among `tables` (the free FloorTables).
+
+    Returns a tuple of layout ids, or None when the party cannot be seated.
+    """
+    tables = [table for table in tables if table.capacity]
+    fitting = [table for table in tables if table.capacity >= party_size]
+    if fitting:
+        best = min(fitting, key=lambda table: (table.capacity, table.id))
+        return (best.id,)
+    if max_joined < 2 or sum(table.capacity for table in tables) < party_size:
+        return None
+
+    adjacent = _neighbours(tables, join_distance)
+    best_group, best_cost = None, None
+    seen = set()
+    frontier = [(table,) for table in tables]
+    while frontier:
+        grown = []
+        for group in frontier:
+            members = {table.id for table in group}
+            capacity = sum(table.capacity for table in group)
+            for member in group:
+                for other in adjacent[member.id]:
+                    if other.id in members:
+                        continue
+                    key = frozenset(members | {other.id})
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    candidate = group + (other,)
+                    if capacity + other.capacity >= party_size:
+                        cost = _group_cost(candidate, party_size)
+                        if best_cost is None or cost < best_cost:
+                            best_group, best_cost = candidate, cost
+                    elif len(candidate) < max_joined:
+                        grown.append(candidate)
+        # Joining fewer tables beats saving a seat, so stop at the first group size that fits
+        if best_group is not None:
+            break
+        frontier = grown
+    if best_group is None:
+        return None
+    return tuple(sorted(table.id for table in best_group))
+
+
+def choose_tables(restaurant, start, party_size):
+    """Allocate free tables at `restaurant` for a party arriving at `start`."""
+    if occupancy_index.enabled:
+        free_ids = set(occupancy_index.available_table_ids(restaurant.id, start) or ())
+    else:
+        free_ids = set(available_table_ids(restaurant, start))
+    rows = db.session.query(Layout.id, Layout.capacity, Layout.x_coordinate, Layout.y_coordinate).filter(
+        Layout.restaurant_id == restaurant.id,
+        Layout.type == 'table'
+    ).all()
+    tables = [FloorTable(*row) for row in rows if row[0] in free_ids]
+    return allocate(
+        tables,
+        party_size,
+        join_distance=current_app.config['TABLE_JOIN_DISTANCE'],
+        max_joined=current_app.config['MAX_JOINED_TABLES']
+    )
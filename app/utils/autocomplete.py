@@ -0,0 +1,333 @@
+# utils/autocomplete.py
+"""
+In-process prefix index for the search box.
+
+Restaurant names, cuisines, locations and menu dishes are inserted into a
+character trie once for every word they contain, so "zen" finds "Sushi Zen".
+Every node keeps the top-k suggestions of its subtree by popularity, which
+makes a lookup a walk of len(prefix) nodes with no database access:
+
+- restaurant: 1 + bookings + reviews
+- cuisine / location: sum of the weights of the restaurants using it
+- dish: number of menu items with that name
+
+The trie is built from the database on a background thread started by the
+first request (lookups return no suggestions until it is ready) and patched in
+place when a restaurant is added, edited or deleted, and when a menu is
+rewritten (only the dish counts that changed). Edits committed while a build
+runs make it start over. `invalidate` drops the trie so the next request
+rebuilds it.
+"""
+import gc
+import logging
+import threading
+import unicodedata
+from collections import Counter, namedtuple
+from flask import current_app
+from sqlalchemy import func
+from app.extensions import db
+from app.models import Booking, MenuItem, Restaurant
+
+logger = logging.getLogger(__name__)
+
+Suggestion = namedtuple('Suggestion', ['text', 'kind', 'restaurant_id', 'weight'])
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).lower().split())
+
+
+def _word_suffixes(text):
+    words = text.split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class _Node:
+    __slots__ = ('children', 'terminal', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.terminal = set()  # keys with a word suffix ending at this node
+        self.top = []  # best keys of the whole subtree, best first
+
+
+class _Trie:
+    def __init__(self, top_k):
+        self.top_k = top_k
+        self.root = _Node()
+        self.suggestions = {}  # key -> Suggestion
+        self.restaurants = {}  # restaurant id -> (name, cuisine, location, weight)
+        self.shared = Counter()  # ('cuisine' | 'location' | 'dish', text) -> summed weight
+
+    def _rank(self, key):
+        suggestion = self.suggestions[key]
+        return (-suggestion.weight, suggestion.text)
+
+    def _paths(self, key, collect=True):
+        """Every node on the way to the word suffixes of `key`, each once."""
+        nodes = {}
+        for suffix in _word_suffixes(normalize(self.suggestions[key].text)):
+            node = self.root
+            for char in suffix:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node()
+                node = child
+                if collect:
+                    nodes[id(node)] = node
+            node.terminal.add(key)
+        return nodes.values()
+
+    def load(self, suggestions):
+        """Bulk-insert `suggestions` (key -> Suggestion) into an empty trie, computing every top-k in one pass."""
+        # Hundreds of thousands of small nodes would otherwise trigger repeated full GC passes
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.suggestions.update(suggestions)
+            for key in suggestions:
+                self._paths(key, collect=False)
+            # Children before parents: a node's top-k comes from its own keys and its children's top-k
+            order, stack = [], [self.root]
+            while stack:
+                node = stack.pop()
+                order.append(node)
+                stack.extend(node.children.values())
+            rank = {key: (-suggestion.weight, suggestion.text) for key, suggestion in suggestions.items()}.__getitem__
+            for node in reversed(order):
+                if not node.children:
+                    candidates = node.terminal
+                else:
+                    candidates = set(node.terminal)
+                    for child in node.children.values():
+                        candidates.update(child.top)
+                node.top = sorted(candidates, key=rank)[:self.top_k] if len(candidates) > 1 else list(candidates)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def _recompute(self, node):
+        keys, stack = set(), [node]
+        while stack:
+            current = stack.pop()
+            keys |= current.terminal
+            stack.extend(current.children.values())
+        node.top = sorted(keys, key=self._rank)[:self.top_k]
+
+    def put(self, key, text, kind, restaurant_id, weight):
+        previous = self.suggestions.get(key)
+        if previous is not None and normalize(previous.text) != normalize(text):
+            self.remove(key)
+            previous = None
+        self.suggestions[key] = Suggestion(text, kind, restaurant_id, weight)
+        for node in self._paths(key):
+            if key in node.top:
+                if previous is not None and weight < previous.weight and len(node.top) == self.top_k:
+                    self._recompute(node)  # something outside the top-k may now beat it
+                else:
+                    node.top.sort(key=self._rank)
+            elif len(node.top) < self.top_k or self._rank(key) < self._rank(node.top[-1]):
+                node.top.append(key)
+                node.top.sort(key=self._rank)
+                del node.top[self.top_k:]
+
+    def remove(self, key):
+        if key not in self.suggestions:
+            return
+        nodes = list(self._paths(key))
+        for node in nodes:
+            node.terminal.discard(key)
+        del self.suggestions[key]
+        for node in nodes:
+            if key in node.top:
+                self._recompute(node)
+
+    def _bump_shared(self, kind, text, delta):
+        if not text:
+            return
+        shared_key = (kind, normalize(text))
+        self.shared[shared_key] += delta
+        if self.shared[shared_key] <= 0:
+            del self.shared[shared_key]
+            self.remove(shared_key)
+        else:
+            self.put(shared_key, text, kind, None, self.shared[shared_key])
+
+    def put_restaurant(self, restaurant_id, name, cuisine, location, weight):
+        self.remove_restaurant(restaurant_id)
+        self.restaurants[restaurant_id] = (name, cuisine, location, weight)
+        self.put(('restaurant', restaurant_id), name, 'restaurant', restaurant_id, weight)
+        self._bump_shared('cuisine', cuisine, weight)
+        self._bump_shared('location', location, weight)
+
+    def remove_restaurant(self, restaurant_id):
+        previous = self.restaurants.pop(restaurant_id, None)
+        if previous is None:
+            return
+        _, cuisine, location, weight = previous
+        self.remove(('restaurant', restaurant_id))
+        self._bump_shared('cuisine', cuisine, -weight)
+        self._bump_shared('location', location, -weight)
+
+    def change_dishes(self, removed, added):
+        """Patch dish counts after a menu lost the item names `removed` and gained `added`."""
+        spelling = {normalize(name): name for name in list(removed) + list(added)}
+        delta = Counter(normalize(name) for name in added)
+        delta.subtract(normalize(name) for name in removed)
+        for text, change in delta.items():
+            if text and change:
+                shown = self.suggestions.get(('dish', text))  # Keep the spelling already suggested
+                self._bump_shared('dish', shown.text if shown else spelling[text], change)
+
+    def lookup(self, prefix, limit):
+        node = self.root
+        for char in normalize(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [self.suggestions[key] for key in node.top[:limit]]
+
+
+def _popularity():
+    weights = Counter()
+    for restaurant_id, count in db.session.query(Booking.restaurant_id, func.count(Booking.id)) \
+            .group_by(Booking.restaurant_id):
+        weights[restaurant_id] += count
+    for restaurant_id, count in db.session.query(Restaurant.id, Restaurant.rating_count):
+        weights[restaurant_id] += count or 0
+    return weights
+
+
+def build_trie(top_k):
+    trie = _Trie(top_k)
+    popularity = _popularity()
+    suggestions, spelling = {}, {}
+    for r in db.session.query(Restaurant.id, Restaurant.name, Restaurant.cuisine, Restaurant.location):
+        weight = 1 + popularity[r.id]
+        trie.restaurants[r.id] = (r.name, r.cuisine, r.location, weight)
+        suggestions[('restaurant', r.id)] = Suggestion(r.name, 'restaurant', r.id, weight)
+        for kind, text in (('cuisine', r.cuisine), ('location', r.location)):
+            if text:
+                trie.shared[(kind, normalize(text))] += weight
+                spelling.setdefault((kind, normalize(text)), text)
+    for name, in db.session.query(MenuItem.name):
+        if normalize(name):
+            trie.shared[('dish', normalize(name))] += 1
+            spelling.setdefault(('dish', normalize(name)), name)
+    for key, weight in trie.shared.items():
+        suggestions[key] = Suggestion(spelling[key], key[0], None, weight)
+    trie.load(suggestions)
+    return trie
+
+
+class _AutocompleteState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.trie = None
+        self.builder = None
+        self.dirty = False  # an edit landed while the trie was missing or being built
+
+
+class AutocompleteIndex:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AUTOCOMPLETE_TOP_K', 10)
+        app.config.setdefault('AUTOCOMPLETE_BACKGROUND_BUILD', True)
+        app.extensions['autocomplete'] = _AutocompleteState()
+
+        @app.before_request
+        def _start_autocomplete_build():
+            self._start(app)
+
+    @property
+    def _state(self):
+        return current_app.extensions['autocomplete']
+
+    def build(self):
+        """Build the trie from the database in the calling thread and install it. Returns the trie."""
+        state = self._state
+        while True:
+            with state.lock:
+                state.dirty = False
+            trie = build_trie(current_app.config['AUTOCOMPLETE_TOP_K'])
+            with state.lock:
+                if not state.dirty:  # Otherwise an edit may be missing from it: build again
+                    state.trie = trie
+                    return trie
+
+    def suggest(self, prefix, limit=None):
+        """Top suggestions for `prefix`, most popular first."""
+        limit = min(limit or current_app.config['AUTOCOMPLETE_TOP_K'], current_app.config['AUTOCOMPLETE_TOP_K'])
+        if not normalize(prefix):
+            return []
+        trie = self._state.trie
+        if trie is None:
+            if current_app.config['AUTOCOMPLETE_BACKGROUND_BUILD']:
+                return []  # Still being built
+            trie = self.build()
+        with self._state.lock:
+            return trie.lookup(prefix, limit)
+
+    def restaurant_saved(self, restaurant):
+        """Patch the trie after `restaurant` was added or edited (and committed)."""
+        state = self._state
+        with state.lock:
+            if state.trie is None:
+                state.dirty = True  # Picked up by the build
+                return
+            previous = state.trie.restaurants.get(restaurant.id)
+            weight = previous[3] if previous else 1 + (restaurant.rating_count or 0)
+            state.trie.put_restaurant(restaurant.id, restaurant.name, restaurant.cuisine, restaurant.location, weight)
+
+    def restaurant_removed(self, restaurant_id):
+        state = self._state
+        with state.lock:
+            if state.trie is None:
+                state.dirty = True
+            else:
+                state.trie.remove_restaurant(restaurant_id)
+
+    def menu_changed(self, removed, added):
+        """Patch dish weights after a menu was rewritten: it lost item names `removed` and gained `added`."""
+        state = self._state
+        with state.lock:
+            if state.trie is None:
+                state.dirty = True
+            else:
+                state.trie.change_dishes(removed, added)
+
+    def invalidate(self):
+        state = self._state
+        with state.lock:
+            state.trie = None
+            state.dirty = True
+
+    def _start(self, app):
+        state = app.extensions['autocomplete']
+        if state.trie is not None or state.builder is not None or not app.config['AUTOCOMPLETE_BACKGROUND_BUILD']:
+            return
+        with state.lock:
+            if state.trie is None and state.builder is None:
+                state.builder = threading.Thread(
+                    target=self._run, args=(app,), name="autocomplete-build", daemon=True
+                )
+                state.builder.start()
+
+    def _run(self, app):
+        state = app.extensions['autocomplete']
+        with app.app_context():
+            try:
+                self.build()
+            except Exception as e:
+                logger.error(f"Autocomplete build failed: {str(e)}", exc_info=True)
+            finally:
+                db.session.remove()
+                with state.lock:
+                    state.builder = None
+
+
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,177 @@
+# utils/availability.py
+import math
+from datetime import datetime, time, timedelta
+from pytz import UTC
+from sqlalchemy import and_
+from app.extensions import db
+from app.models import Booking, Layout
+
+DEFAULT_BOOKING_DURATION = 120  # minutes
+
+
+def booking_duration(restaurant):
+    """Length of a single booking at this restaurant as a timedelta."""
+    return timedelta(minutes=restaurant.booking_duration or DEFAULT_BOOKING_DURATION)
+
+
+def to_naive_utc(value):
+    """Booking.date is stored as a naive UTC datetime; normalise aware inputs to match."""
+    if value.tzinfo is not None:
+        value = value.astimezone(UTC).replace(tzinfo=None)
+    return value
+
+
+def _overlaps(start, duration):
+    # Every booking at a restaurant lasts the same `duration`, so a booking starting at
+    # `b` overlaps [start, start + duration) exactly when start - duration < b < start + duration.
+    return and_(Booking.date < start + duration, Booking.date > start - duration)
+
+
+def busy_layout_ids(restaurant_id, start, duration, layout_ids=None, exclude_booking_ids=None):
+    """
+    Return the set of layout ids that have a booking overlapping the slot
+    starting at `start`. Runs a single query regardless of the number of tables.
+    """
+    start = to_naive_utc(start)
+    query = db.session.query(Booking.layout_id).filter(
+        Booking.restaurant_id == restaurant_id,
+        _overlaps(start, duration)
+    )
+    if layout_ids is not None:
+        query = query.filter(Booking.layout_id.in_(layout_ids))
+    if exclude_booking_ids:
+        query = query.filter(Booking.id.notin_(exclude_booking_ids))
+    return {layout_id for (layout_id,) in query.distinct()}
+
+
+def available_table_ids(restaurant, start):
+    """
+    Return the ids of all tables at `restaurant` that are free for a booking
+    starting at `start`. Tables and their overlapping bookings are loaded in one
+    outer-joined query and the conflicts are resolved in memory.
+    """
+    start = to_naive_utc(start)
+    duration = booking_duration(restaurant)
+    rows = db.session.query(Layout.id, Booking.id).outerjoin(
+        Booking,
+        and_(Booking.restaurant_id == restaurant.id, Booking.layout_id == Layout.id,
+             _overlaps(start, duration))
+    ).filter(
+        Layout.restaurant_id == restaurant.id,
+        Layout.type == 'table'
+    ).order_by(Layout.id).all()
+
+    busy = {layout_id for layout_id, booking_id in rows if booking_id is not None}
+    available = []
+    for layout_id, _ in rows:
+        if layout_id not in busy and (not available or available[-1] != layout_id):
+            available.append(layout_id)
+    return available
+
+
+def find_available_tables(restaurant_ids, durations, start, party_size=1):
+    """
+    Free tables seating at least `party_size` across many restaurants at once.
+
+    `restaurant_ids` is a subquery selecting the candidate restaurant ids and
+    `durations` maps each candidate id to its booking duration. Tables and the
+    bookings that could overlap are loaded in two queries however many
+    restaurants match; overlaps are then resolved per restaurant in memory.
+    Returns {restaurant_id: [(layout_id, capacity), ...]} with best-fit tables first.
+    """
+    start = to_naive_utc(start)
+    if not durations:
+        return {}
+    longest = max(durations.values())
+
+    tables = db.session.query(Layout.id, Layout.restaurant_id, Layout.capacity).filter(
+        Layout.restaurant_id.in_(restaurant_ids),
+        Layout.type == 'table',
+        Layout.capacity >= party_size
+    ).all()
+    bookings = db.session.query(Booking.restaurant_id, Booking.layout_id, Booking.date).filter(
+        Booking.restaurant_id.in_(restaurant_ids),
+        _overlaps(start, longest)
+    ).all()
+
+    busy = set()
+    for restaurant_id, layout_id, booked_at in bookings:
+        duration = durations.get(restaurant_id)
+        if duration is not None and start - duration < booked_at < start + duration:
+            busy.add(layout_id)
+
+    available = {}
+    for layout_id, restaurant_id, capacity in tables:
+        if layout_id not in busy and restaurant_id in durations:
+            available.setdefault(restaurant_id, []).append((layout_id, capacity))
+    for free in available.values():
+        free.sort(key=lambda table: (table[1], table[0]))
+    return available
+
+
+def opening_window(restaurant, day):
+    """
+    Return the (start, end) datetimes the restaurant is open on `day`. Hours that run
+    past midnight end on the following day; missing hours mean open all day.
+    """
+    opening = restaurant.opening_time or time(0, 0)
+    start = datetime.combine(day, opening)
+    if restaurant.closing_time is None:
+        return start, datetime.combine(day, time(0, 0)) + timedelta(days=1)
+    end = datetime.combine(day, restaurant.closing_time)
+    if end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+
+def day_slot_grid(restaurant, day, step):
+    """
+    Build the free/busy grid of every table for every slot on `day`.
+
+    Slots start every `step` minutes from opening until closing. The day's
+    bookings are loaded in one query and each one marks the contiguous run of
+    slots it blocks in a per-table difference array, so the cost is one pass
+    over the bookings plus one prefix sum per table rather than a check per slot.
+    """
+    duration = booking_duration(restaurant)
+    step = timedelta(minutes=step)
+    start, end = opening_window(restaurant, day)
+    num_slots = max(0, math.ceil((end - start) / step))
+    slots = [start + i * step for i in range(num_slots)]
+
+    tables = db.session.query(Layout.id, Layout.table_number, Layout.capacity).filter(
+        Layout.restaurant_id == restaurant.id,
+        Layout.type == 'table'
+    ).order_by(Layout.id).all()
+    bookings = db.session.query(Booking.layout_id, Booking.date).filter(
+        Booking.restaurant_id == restaurant.id,
+        Booking.date > start - duration,
+        Booking.date < end + duration  # The last slot runs past closing
+    ).all()
+
+    diffs = {table.id: [0] * (num_slots + 1) for table in tables}
+    for layout_id, booked_at in bookings:
+        diff = diffs.get(layout_id)
+        if diff is None:
+            continue
+        # Slot k is blocked when booked_at - duration < start + k * step < booked_at + duration
+        first = math.floor((booked_at - duration - start) / step) + 1
+        last = math.ceil((booked_at + duration - start) / step)
+        first, last = max(first, 0), min(last, num_slots)
+        if first < last:
+            diff[first] += 1
+            diff[last] -= 1
+
+    grid = []
+    for table in tables:
+        busy, running = [], 0
+        for delta in diffs[table.id][:num_slots]:
+            running += delta
+            busy.append(running > 0)
+        grid.append({
+            "layout_id": table.id,
+            "table_number": table.table_number,
+            "capacity": table.capacity,
+            "busy": busy
+        })
+    return slots, grid
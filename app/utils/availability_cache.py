@@ -0,0 +1,106 @@
+# utils/availability_cache.py
+"""
+Versioned cache for availability responses.
+
+Every (restaurant_id, day) has a version that is bumped whenever a booking on
+or next to that day is created, moved or cancelled, and every restaurant has an
+epoch bumped when its floor plan, hours or booking duration change. Cached payloads are only served for
+the version they were computed at, and the same version is exposed as an ETag
+so polling clients can be answered with 304 Not Modified without any query.
+The instance token in the ETag keeps tags from different processes apart.
+"""
+import itertools
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from flask import current_app
+
+
+class _CacheState:
+    def __init__(self, max_entries):
+        self.lock = threading.Lock()
+        self.token = uuid.uuid4().hex[:8]
+        self.counter = itertools.count(1)
+        self.versions = {}  # (restaurant_id, day) -> version
+        self.epochs = {}  # restaurant_id -> version
+        self.entries = OrderedDict()  # (restaurant_id, day, variant) -> (version, payload)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+
+class AvailabilityCache:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AVAILABILITY_CACHE_MAX_ENTRIES', 10000)
+        app.extensions['availability_cache'] = _CacheState(app.config['AVAILABILITY_CACHE_MAX_ENTRIES'])
+
+    @property
+    def _state(self):
+        return current_app.extensions['availability_cache']
+
+    def version(self, restaurant_id, day):
+        state = self._state
+        return state.epochs.get(restaurant_id, 0), state.versions.get((restaurant_id, day), 0)
+
+    def etag(self, restaurant_id, day):
+        epoch, version = self.version(restaurant_id, day)
+        return f"{self._state.token}-{restaurant_id}-{day.isoformat()}-{epoch}.{version}"
+
+    def get(self, restaurant_id, day, variant):
+        """Return the cached payload for the current version, or None."""
+        state = self._state
+        key = (restaurant_id, day, variant)
+        with state.lock:
+            entry = state.entries.get(key)
+            if entry is not None and entry[0] == self.version(restaurant_id, day):
+                state.entries.move_to_end(key)
+                state.hits += 1
+                return entry[1]
+            state.misses += 1
+            return None
+
+    def put(self, restaurant_id, day, variant, version, payload):
+        """Store a payload computed at `version`, unless a booking changed it meanwhile."""
+        state = self._state
+        with state.lock:
+            if version != self.version(restaurant_id, day):
+                return
+            state.entries[(restaurant_id, day, variant)] = (version, payload)
+            state.entries.move_to_end((restaurant_id, day, variant))
+            while len(state.entries) > state.max_entries:
+                state.entries.popitem(last=False)
+
+    def bump(self, restaurant_id, start, duration):
+        """Invalidate every day whose slots can overlap a booking starting at `start`."""
+        state = self._state
+        with state.lock:
+            # A day's slots run on past midnight when it closes late, so the day before is affected too
+            day = (start - duration).date() - timedelta(days=1)
+            while day <= (start + duration).date():
+                state.versions[(restaurant_id, day)] = next(state.counter)
+                day += timedelta(days=1)
+
+    def bump_restaurant(self, restaurant_id):
+        """Invalidate all days of a restaurant, e.g. after its floor plan changed."""
+        state = self._state
+        with state.lock:
+            state.epochs[restaurant_id] = next(state.counter)
+
+    def stats(self):
+        state = self._state
+        with state.lock:
+            lookups = state.hits + state.misses
+            return {
+                "hits": state.hits,
+                "misses": state.misses,
+                "hit_ratio": round(state.hits / lookups, 4) if lookups else None,
+                "entries": len(state.entries)
+            }
+
+
+availability_cache = AvailabilityCache()
@@ -0,0 +1,32 @@
+# utils/booking_events.py
+"""
+Post-commit notifications for in-process read models.
+
+Routes call these after a booking or floor plan change has been committed so
+the occupancy index and the availability cache stay in step with the database.
+"""
+from app.utils.availability import booking_duration, to_naive_utc
+from app.utils.availability_cache import availability_cache
+from app.utils.occupancy import occupancy_index
+
+
+def booking_saved(booking, restaurant, previous_date=None):
+    """A booking was created, or moved away from `previous_date`."""
+    duration = booking_duration(restaurant)
+    if previous_date is not None:
+        occupancy_index.remove(booking.id)
+        availability_cache.bump(restaurant.id, to_naive_utc(previous_date), duration)
+    occupancy_index.add(booking, restaurant)
+    availability_cache.bump(restaurant.id, to_naive_utc(booking.date), duration)
+
+
+def booking_removed(booking_id, restaurant, date):
+    """A booking that started at `date` was cancelled."""
+    occupancy_index.remove(booking_id)
+    availability_cache.bump(restaurant.id, to_naive_utc(date), booking_duration(restaurant))
+
+
+def floor_changed(restaurant_id):
+    """The restaurant's tables were regenerated, edited or deleted."""
+    occupancy_index.invalidate_restaurant(restaurant_id)
+    availability_cache.bump_restaurant(restaurant_id)
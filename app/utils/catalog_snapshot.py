@@ -0,0 +1,205 @@
+# utils/catalog_snapshot.py
+"""
+Precompressed snapshots of the public catalogue.
+
+The full restaurant listing (`GET /api/restaurants` without parameters) and
+each restaurant's menu, flat and grouped by category, are serialized once per
+data version and kept in memory as identity, gzip and, when the `brotli`
+package is installed, brotli byte buffers. Handlers hand the buffer matching Accept-Encoding straight to the
+client with a strong ETag derived from the content, so a hot request does no
+query, no serialization and no compression.
+
+Writes call `invalidate`, which drops the stale snapshot and queues a rebuild
+on a background thread. Until the rebuild lands, `get` returns None and the
+route falls back to its live code path.
+
+The snapshots are per process, like the other in-process read models, and so
+is invalidation. The process that handled a write never serves a snapshot
+older than that write. Other worker processes do not hear about it, so every
+snapshot also expires CATALOG_SNAPSHOT_TTL_SECONDS after it was built: the
+expired one is dropped and rebuilt, and a write is visible everywhere within
+that time. Unchanged data rebuilds to the same bytes and keeps its ETag, so
+clients still get 304s across rebuilds.
+"""
+import gzip
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import Response, current_app, request
+from app.extensions import db
+from app.utils.listing import parse_fields, stream_listing
+from app.utils.menus import grouped_menu_payload, menu_payload
+from app.utils.response import encode_response
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+RESTAURANTS = 'restaurants'
+
+Snapshot = namedtuple('Snapshot', ['etag', 'bodies'])  # bodies: encoding -> bytes
+
+
+def menu_key(restaurant_id, grouped=False):
+    return 'menu', restaurant_id, grouped
+
+
+def menu_keys(restaurant_id):
+    """Every snapshot of one restaurant's menu."""
+    return menu_key(restaurant_id), menu_key(restaurant_id, grouped=True)
+
+
+def _serialize(key):
+    if key == RESTAURANTS:
+        return ''.join(stream_listing(parse_fields(None), current_app.json.dumps)).encode('utf-8')
+    _, restaurant_id, grouped = key
+    return encode_response(grouped_menu_payload(restaurant_id) if grouped else menu_payload(restaurant_id))
+
+
+def build_snapshot(key):
+    """Serialize and compress the payload for `key`."""
+    body = _serialize(key)
+    bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=current_app.config['CATALOG_SNAPSHOT_GZIP_LEVEL'])}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(body, quality=current_app.config['CATALOG_SNAPSHOT_BROTLI_QUALITY'])
+    return Snapshot(hashlib.sha256(body).hexdigest()[:32], bodies)
+
+
+def snapshot_response(snapshot):
+    """Serve `snapshot` in the best encoding the client accepts, or 304 when its ETag still matches."""
+    offered = [encoding for encoding in ('br', 'gzip') if encoding in snapshot.bodies] + ['identity']
+    encoding = request.accept_encodings.best_match(offered, default='identity')
+    # Each encoding is a different byte sequence, so each gets its own strong tag
+    etag = snapshot.etag if encoding == 'identity' else f"{snapshot.etag}-{encoding}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(snapshot.bodies[encoding], status=200, mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+class _SnapshotState:
+    def __init__(self, max_menus):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.worker = None
+        self.versions = {}  # key -> version, bumped by invalidate
+        self.snapshots = OrderedDict()  # key -> (version, built at, Snapshot); menus in LRU order
+        self.pending = set()
+        self.max_menus = max_menus
+
+
+class CatalogSnapshot:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CATALOG_SNAPSHOT_ENABLED', True)
+        app.config.setdefault('CATALOG_SNAPSHOT_MAX_MENUS', 2000)
+        app.config.setdefault('CATALOG_SNAPSHOT_TTL_SECONDS', 30)  # 0: never expire (single process)
+        app.config.setdefault('CATALOG_SNAPSHOT_GZIP_LEVEL', 9)
+        app.config.setdefault('CATALOG_SNAPSHOT_BROTLI_QUALITY', 11)
+        app.extensions['catalog_snapshot'] = _SnapshotState(app.config['CATALOG_SNAPSHOT_MAX_MENUS'])
+
+    @property
+    def _state(self):
+        return current_app.extensions['catalog_snapshot']
+
+    def get(self, key):
+        """The current snapshot for `key`, or None (a rebuild is then queued)."""
+        if not current_app.config['CATALOG_SNAPSHOT_ENABLED']:
+            return None
+        state = self._state
+        ttl = current_app.config['CATALOG_SNAPSHOT_TTL_SECONDS']
+        with state.lock:
+            entry = state.snapshots.get(key)
+            if entry is not None and entry[0] == state.versions.get(key, 0):
+                if not ttl or time.monotonic() - entry[1] < ttl:
+                    state.snapshots.move_to_end(key)
+                    return entry[2]
+                del state.snapshots[key]  # Expired: may predate a write made by another process
+        self._schedule(key)
+        return None
+
+    def invalidate(self, *keys):
+        """The data behind `keys` changed (and was committed): drop their snapshots and rebuild them."""
+        state = self._state
+        rebuild = []
+        with state.lock:
+            for key in keys:
+                state.versions[key] = state.versions.get(key, 0) + 1
+                # The listing is kept warm; a menu is only rebuilt if it had been requested
+                if state.snapshots.pop(key, None) is not None or key == RESTAURANTS:
+                    rebuild.append(key)
+        if current_app.config['CATALOG_SNAPSHOT_ENABLED']:
+            self._schedule(*rebuild)
+
+    def _schedule(self, *keys):
+        if not keys:
+            return
+        state = self._state
+        with state.lock:
+            state.pending.update(keys)
+            if state.worker is None:
+                state.worker = threading.Thread(
+                    target=self._run, args=(current_app._get_current_object(),),
+                    name="catalog-snapshot", daemon=True
+                )
+                state.worker.start()
+        state.wakeup.set()
+
+    def _run(self, app):
+        state = app.extensions['catalog_snapshot']
+        while True:
+            state.wakeup.wait()
+            state.wakeup.clear()
+            with app.app_context():
+                try:
+                    self.build_pending()
+                except Exception as e:
+                    logger.error(f"Catalog snapshot rebuild failed: {str(e)}", exc_info=True)
+                finally:
+                    db.session.remove()
+
+    def refresh(self, *keys):
+        """Rebuild `keys` now, in the calling thread."""
+        state = self._state
+        with state.lock:
+            state.pending.update(keys)
+        return self.build_pending()
+
+    def build_pending(self):
+        """Rebuild every queued snapshot. Returns the number stored."""
+        state = self._state
+        built = 0
+        while True:
+            with state.lock:
+                if not state.pending:
+                    return built
+                key = state.pending.pop()
+                version = state.versions.get(key, 0)
+            snapshot = build_snapshot(key)
+            with state.lock:
+                if state.versions.get(key, 0) != version:
+                    state.pending.add(key)  # Changed while building; the next pass picks it up
+                    continue
+                state.snapshots[key] = (version, time.monotonic(), snapshot)
+                state.snapshots.move_to_end(key)
+                while len(state.snapshots) > state.max_menus + 1:
+                    oldest = next(k for k in state.snapshots if k != RESTAURANTS)
+                    del state.snapshots[oldest]
+            built += 1
+
+
+catalog_snapshot = CatalogSnapshot()
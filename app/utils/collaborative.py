@@ -0,0 +1,236 @@
+# utils/collaborative.py
+"""
+Item-item collaborative filtering over booking and review history.
+
+`flask recommendations train` builds a sparse user x restaurant matrix with
+one entry per pair. The entry is the number of bookings plus (rating - 3)
+for each review, and pairs at zero or below are dropped, so a bad review
+cancels a visit. Restaurant columns are L2-normalised, and each restaurant's
+cosine similarity to every other restaurant comes from the users they share.
+The restaurants are split into chunks over a process pool. Only the top
+CF_NEIGHBOURS neighbours of each restaurant are kept, and they are saved to
+CF_MODEL_PATH as a small .npz file holding restaurant ids, int32 neighbour
+rows and float16 similarities.
+
+Serving loads that file once, and again after a new training run replaces
+it. A user is scored by adding up the neighbour lists of the restaurants in
+their history, weighted the same way, and the restaurants they already know
+are skipped. A request therefore costs history x neighbours whatever the
+size of the catalogue. Users whose dietary restrictions rule out peanuts
+never get a restaurant whose cuisine mentions them, the same rule as the
+preference recommender. Users without history, or any user before a model
+has been trained, get nothing here, and the route falls back to
+utils/recommender.py.
+"""
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+from app.extensions import db
+from app.models import Booking, Restaurant, Review
+from app.utils.recommender import avoids_peanuts, first_preferences
+
+logger = logging.getLogger(__name__)
+
+TRAIN_CHUNK = 256  # restaurants per pool task
+
+Model = namedtuple('Model', ['restaurant_ids', 'neighbours', 'scores', 'rows'])
+
+
+def load_interactions(user_id=None):
+    """(user ids, restaurant ids, weights) arrays, one entry per user and restaurant with a positive weight."""
+    pairs = {}
+    bookings = db.session.query(Booking.user_id, Booking.restaurant_id, func.count(Booking.id)) \
+        .group_by(Booking.user_id, Booking.restaurant_id)
+    reviews = db.session.query(Review.user_id, Review.restaurant_id, func.sum(Review.rating - 3)) \
+        .group_by(Review.user_id, Review.restaurant_id)
+    if user_id is not None:
+        bookings = bookings.filter(Booking.user_id == user_id)
+        reviews = reviews.filter(Review.user_id == user_id)
+    for query in (bookings, reviews):
+        for uid, restaurant_id, weight in query:
+            pairs[(uid, restaurant_id)] = pairs.get((uid, restaurant_id), 0) + (weight or 0)
+    pairs = [(uid, rid, weight) for (uid, rid), weight in pairs.items() if weight > 0]
+    if not pairs:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.float32)
+    users, restaurants, weights = zip(*pairs)
+    return np.array(users, np.int64), np.array(restaurants, np.int64), np.array(weights, np.float32)
+
+
+def _compressed(rows, columns, values, row_count):
+    """CSR arrays (indptr, columns, values) for the entries (rows[i], columns[i]) = values[i]."""
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(row_count + 1, np.int64)
+    np.cumsum(np.bincount(rows, minlength=row_count), out=indptr[1:])
+    return indptr, columns[order].astype(np.int32), values[order].astype(np.float32)
+
+
+_worker = {}
+
+
+def _init_worker(by_item, by_user, k):
+    _worker.update(by_item=by_item, by_user=by_user, k=k)
+
+
+def _neighbours(bounds):
+    """Top-k similar restaurants (rows and cosines) for the restaurant rows in [start, stop)."""
+    start, stop = bounds
+    (item_ptr, item_users, item_weights), (user_ptr, user_items, user_weights) = _worker['by_item'], _worker['by_user']
+    k = _worker['k']
+    neighbours = np.full((stop - start, k), -1, np.int32)
+    scores = np.zeros((stop - start, k), np.float32)
+    for offset, item in enumerate(range(start, stop)):
+        users = item_users[item_ptr[item]:item_ptr[item + 1]]
+        if not users.size:
+            continue
+        # Every (other restaurant, weight) of every user who visited `item`, flattened
+        starts, lengths = user_ptr[users], user_ptr[users + 1] - user_ptr[users]
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        products = np.repeat(item_weights[item_ptr[item]:item_ptr[item + 1]], lengths) * user_weights[positions]
+        others, inverse = np.unique(user_items[positions], return_inverse=True)
+        similarity = np.bincount(inverse, weights=products)
+        similarity[others == item] = 0.0
+        count = min(k, others.size)
+        best = np.argpartition(-similarity, count - 1)[:count]
+        best = best[np.argsort(-similarity[best], kind='stable')]
+        best = best[similarity[best] > 0]
+        neighbours[offset, :best.size] = others[best]
+        scores[offset, :best.size] = similarity[best]
+    return start, neighbours, scores
+
+
+def train(users, restaurants, weights, k, workers=1):
+    """Item-item model from interaction arrays (as returned by load_interactions)."""
+    restaurant_ids, items = np.unique(restaurants, return_inverse=True)
+    _, user_rows = np.unique(users, return_inverse=True)
+    item_count, user_count = restaurant_ids.size, int(user_rows.max()) + 1 if users.size else 0
+    # Sum duplicate pairs, then L2-normalise every restaurant column
+    pairs, inverse = np.unique(user_rows.astype(np.int64) * item_count + items, return_inverse=True)
+    values = np.bincount(inverse, weights=weights)
+    user_rows, items = pairs // max(item_count, 1), pairs % max(item_count, 1)
+    norms = np.sqrt(np.bincount(items, weights=values * values, minlength=item_count))
+    values = values / norms[items]
+
+    by_item = _compressed(items, user_rows, values, item_count)
+    by_user = _compressed(user_rows, items, values, user_count)
+    neighbours = np.full((item_count, k), -1, np.int32)
+    scores = np.zeros((item_count, k), np.float32)
+    chunks = [(start, min(start + TRAIN_CHUNK, item_count)) for start in range(0, item_count, TRAIN_CHUNK)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(by_item, by_user, k)) as pool:
+            results = list(pool.map(_neighbours, chunks))
+    else:
+        _init_worker(by_item, by_user, k)
+        results = [_neighbours(chunk) for chunk in chunks]
+        _worker.clear()
+    for start, chunk_neighbours, chunk_scores in results:
+        neighbours[start:start + len(chunk_neighbours)] = chunk_neighbours
+        scores[start:start + len(chunk_scores)] = chunk_scores
+    return Model(restaurant_ids, neighbours, scores.astype(np.float16), _row_lookup(restaurant_ids))
+
+
+def _row_lookup(restaurant_ids):
+    return {int(restaurant_id): row for row, restaurant_id in enumerate(restaurant_ids)}
+
+
+def save_model(model, path):
+    """Write `model` next to `path` and move it into place, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    partial = f"{path}.partial"
+    with open(partial, 'wb') as f:
+        np.savez(f, restaurant_ids=model.restaurant_ids, neighbours=model.neighbours, scores=model.scores)
+    os.replace(partial, path)
+
+
+def load_model(path):
+    with np.load(path) as data:
+        restaurant_ids = data['restaurant_ids']
+        return Model(restaurant_ids, data['neighbours'], data['scores'], _row_lookup(restaurant_ids))
+
+
+def score_history(model, history, limit=None):
+    """Best restaurant ids for a {restaurant id: weight} history, excluding the history itself; all when no limit."""
+    known = [(model.rows[rid], weight) for rid, weight in history.items() if rid in model.rows]
+    if not known or (limit is not None and limit <= 0):
+        return []
+    rows, weights = zip(*known)
+    candidates = model.neighbours[list(rows)]
+    contributions = model.scores[list(rows)].astype(np.float32) * np.asarray(weights, np.float32)[:, None]
+    valid = candidates >= 0
+    others, inverse = np.unique(candidates[valid], return_inverse=True)
+    totals = np.bincount(inverse, weights=contributions[valid])
+    totals[np.isin(others, rows)] = -np.inf
+    best = np.argsort(-totals, kind='stable')[:limit]
+    return [int(model.restaurant_ids[others[i]]) for i in best if np.isfinite(totals[i])]
+
+
+class _CollaborativeState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.model = None
+        self.mtime = None
+        self.checked_at = 0.0
+
+
+class CollaborativeRecommender:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CF_MODEL_PATH', os.path.join(app.instance_path, 'cf_model.npz'))
+        app.config.setdefault('CF_NEIGHBOURS', 50)
+        app.config.setdefault('CF_WORKERS', os.cpu_count() or 1)
+        app.config.setdefault('CF_RELOAD_SECONDS', 60)
+        app.extensions['collaborative'] = _CollaborativeState()
+
+    @property
+    def _state(self):
+        return current_app.extensions['collaborative']
+
+    def _model(self):
+        """The trained model, reloaded when training replaced the file; None until one exists."""
+        state = self._state
+        now = time.monotonic()
+        if now - state.checked_at < current_app.config['CF_RELOAD_SECONDS']:
+            return state.model
+        with state.lock:
+            if now - state.checked_at >= current_app.config['CF_RELOAD_SECONDS']:
+                path = current_app.config['CF_MODEL_PATH']
+                try:
+                    mtime = os.path.getmtime(path)
+                    if mtime != state.mtime:
+                        state.model, state.mtime = load_model(path), mtime
+                        logger.info(f"Loaded collaborative model for {len(state.model.restaurant_ids)} restaurants")
+                except FileNotFoundError:
+                    state.model, state.mtime = None, None
+                except Exception as e:
+                    logger.error(f"Could not load collaborative model {path}: {str(e)}", exc_info=True)
+                state.checked_at = now
+        return state.model
+
+    def recommend(self, user_id, limit):
+        """Up to `limit` restaurant ids from the neighbours of the user's history, best first."""
+        model = self._model()
+        if model is None:
+            return []
+        _, restaurants, weights = load_interactions(user_id)
+        history = dict(zip(restaurants.tolist(), weights.tolist()))
+        preference = first_preferences([user_id]).get(user_id)
+        if preference is None or not avoids_peanuts(preference.dietary_restrictions):
+            return score_history(model, history, limit)
+        # Rank every neighbour, then drop the peanut cuisines among them with one primary-key lookup
+        ranked = score_history(model, history)
+        peanut = {rid for rid, in db.session.query(Restaurant.id).filter(
+            Restaurant.id.in_(ranked), func.lower(Restaurant.cuisine).contains('peanut')
+        )} if ranked else set()
+        return [rid for rid in ranked if rid not in peanut][:limit]
+
+
+collaborative = CollaborativeRecommender()
@@ -0,0 +1,89 @@
+# utils/facets.py
+"""
+Feature facets over Restaurant.features.
+
+The JSON column stays the source of truth; `restaurant_feature` holds one
+(feature, restaurant_id) row per normalised feature, keyed feature first so a
+facet filter is an index range per feature. A session `after_flush` hook
+rewrites a restaurant's rows whenever its features change, in the same
+transaction.
+"""
+from sqlalchemy import event, func, inspect, select
+from app.extensions import db
+from app.models import Restaurant, RestaurantFeature
+
+
+def normalize_feature(value):
+    """'Live Music' -> 'live-music'."""
+    return '-'.join(str(value).lower().split())[:100]
+
+
+def feature_set(features):
+    if not isinstance(features, (list, tuple)):
+        return set()
+    return {normalize_feature(value) for value in features if isinstance(value, str) and value.strip()}
+
+
+def parse_features(raw):
+    """Normalised features from a comma separated `features=` value."""
+    return sorted({normalize_feature(value) for value in (raw or '').split(',') if value.strip()})
+
+
+def with_all_features(features):
+    """SQL clause: the restaurant has every one of `features`."""
+    matching = select(RestaurantFeature.restaurant_id).where(
+        RestaurantFeature.feature.in_(features)
+    ).group_by(RestaurantFeature.restaurant_id).having(func.count() == len(features))
+    return Restaurant.id.in_(matching)
+
+
+def facet_counts(restaurant_ids_select):
+    """{feature: count} over the restaurants selected by `restaurant_ids_select`, in one grouped query."""
+    rows = db.session.query(RestaurantFeature.feature, func.count()).filter(
+        RestaurantFeature.restaurant_id.in_(restaurant_ids_select)
+    ).group_by(RestaurantFeature.feature).all()
+    return dict(sorted(rows, key=lambda row: (-row[1], row[0])))
+
+
+def _sync(connection, features_by_restaurant):
+    table = RestaurantFeature.__table__
+    connection.execute(table.delete().where(table.c.restaurant_id.in_(list(features_by_restaurant))))
+    rows = [
+        {"restaurant_id": restaurant_id, "feature": feature}
+        for restaurant_id, features in features_by_restaurant.items() for feature in sorted(features)
+    ]
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+def _after_flush(session, flush_context):
+    changed = {}
+    for obj in session.new:
+        if isinstance(obj, Restaurant):
+            changed[obj.id] = feature_set(obj.features)
+    for obj in session.dirty:
+        if isinstance(obj, Restaurant) and inspect(obj).attrs.features.history.has_changes():
+            changed[obj.id] = feature_set(obj.features)
+    for obj in session.deleted:
+        if isinstance(obj, Restaurant):
+            changed[obj.id] = set()
+    if changed:
+        _sync(session.connection(), changed)
+
+
+def register_facet_listener():
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+
+
+def rebuild():
+    """Rewrite restaurant_feature from Restaurant.features. The caller commits."""
+    connection = db.session.connection()
+    connection.execute(RestaurantFeature.__table__.delete())
+    features = {
+        restaurant_id: feature_set(value)
+        for restaurant_id, value in connection.execute(select(Restaurant.id, Restaurant.features))
+    }
+    if features:
+        _sync(connection, features)
+    return len(features)
@@ -0,0 +1,199 @@
+# utils/geo_index.py
+"""
+In-memory grid index over restaurant coordinates.
+
+Restaurants are bucketed into cells of GEO_INDEX_CELL_DEGREES (0.05 deg,
+about 5.5 km north-south by default). A radius query only visits the cells
+under the circle's bounding box; a k-nearest query visits rings of cells
+around the query point and stops once no unvisited cell can hold anything
+closer than the k-th hit, so both cost grows with local density rather than
+with the size of the catalogue.
+
+Like the autocomplete trie, the grid is loaded from the database on first use
+and patched when restaurants are added, edited or deleted. Longitudes are not
+wrapped at the antimeridian.
+"""
+import heapq
+import math
+import threading
+from flask import current_app
+from app.extensions import db
+from app.models import Restaurant
+from app.utils.geo import EARTH_RADIUS_KM, bounding_box, haversine_km
+
+
+class _Grid:
+    def __init__(self, cell):
+        self.cell = cell
+        self.cells = {}  # (lat index, lon index) -> {restaurant id: (lat, lon)}
+        self.points = {}  # restaurant id -> cell key
+
+    def _key(self, lat, lon):
+        return math.floor(lat / self.cell), math.floor(lon / self.cell)
+
+    def add(self, restaurant_id, lat, lon):
+        """Place a restaurant, returning its previous (lat, lon) or None."""
+        previous = self.remove(restaurant_id)
+        if lat is not None and lon is not None:
+            key = self._key(lat, lon)
+            self.cells.setdefault(key, {})[restaurant_id] = (lat, lon)
+            self.points[restaurant_id] = key
+        return previous
+
+    def remove(self, restaurant_id):
+        key = self.points.pop(restaurant_id, None)
+        if key is None:
+            return None
+        bucket = self.cells[key]
+        previous = bucket.pop(restaurant_id)
+        if not bucket:
+            del self.cells[key]
+        return previous
+
+    def _cells_in(self, min_lat, max_lat, min_lon, max_lon):
+        (lat_lo, lon_lo), (lat_hi, lon_hi) = self._key(min_lat, min_lon), self._key(max_lat, max_lon)
+        if (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1) > len(self.cells):
+            return [key for key in self.cells if lat_lo <= key[0] <= lat_hi and lon_lo <= key[1] <= lon_hi]
+        return [(i, j) for i in range(lat_lo, lat_hi + 1) for j in range(lon_lo, lon_hi + 1)]
+
+    def in_box(self, min_lat, max_lat, min_lon, max_lon):
+        """[(restaurant id, lat, lon)] inside the box, edges included."""
+        return [
+            (restaurant_id, lat, lon)
+            for key in self._cells_in(min_lat, max_lat, min_lon, max_lon)
+            for restaurant_id, (lat, lon) in self.cells.get(key, {}).items()
+            if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+        ]
+
+    def within(self, lat, lon, radius_km):
+        """[(distance_km, restaurant id)] within `radius_km`, nearest first."""
+        hits = []
+        for key in self._cells_in(*bounding_box(lat, lon, radius_km)):
+            for restaurant_id, (point_lat, point_lon) in self.cells.get(key, {}).items():
+                distance = haversine_km(lat, lon, point_lat, point_lon)
+                if distance <= radius_km:
+                    hits.append((distance, restaurant_id))
+        hits.sort()
+        return hits
+
+    def _ring(self, center, radius):
+        ci, cj = center
+        if radius == 0:
+            yield center
+            return
+        for j in range(cj - radius, cj + radius + 1):
+            yield ci - radius, j
+            yield ci + radius, j
+        for i in range(ci - radius + 1, ci + radius):
+            yield i, cj - radius
+            yield i, cj + radius
+
+    def _unvisited_bound_km(self, lat, rings):
+        """Lower bound on the distance to any point outside the first `rings` rings."""
+        # The query point can sit anywhere in the centre cell, so only rings - 1 full cells separate it
+        gap_degrees = (rings - 1) * self.cell
+        gap = math.radians(gap_degrees)
+        lat_km = gap * EARTH_RADIUS_KM
+        widest = math.radians(min(90.0, abs(lat) + gap_degrees))
+        lon_km = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.cos(widest) * math.sin(min(gap, math.pi) / 2)))
+        return min(lat_km, lon_km)
+
+    def nearest(self, lat, lon, k, max_km=None):
+        """The `k` closest [(distance_km, restaurant id)], nearest first."""
+        if k <= 0:
+            return []
+        ci, cj = center = self._key(lat, lon)
+        best = []  # max-heap of (-distance, restaurant id)
+
+        def visit(key):
+            for restaurant_id, (point_lat, point_lon) in self.cells.get(key, {}).items():
+                distance = haversine_km(lat, lon, point_lat, point_lon)
+                if max_km is not None and distance > max_km:
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, restaurant_id))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, restaurant_id))
+
+        radius = 0
+        while True:
+            if 8 * radius > len(self.cells):
+                # Rings now hold more cells than are occupied: finish with the occupied cells left
+                for key in [key for key in self.cells if max(abs(key[0] - ci), abs(key[1] - cj)) >= radius]:
+                    visit(key)
+                break
+            for key in self._ring(center, radius):
+                visit(key)
+            radius += 1
+            bound = self._unvisited_bound_km(lat, radius)
+            if len(best) == k and -best[0][0] <= bound:
+                break
+            if max_km is not None and bound > max_km:
+                break
+        return sorted((-negative, restaurant_id) for negative, restaurant_id in best)
+
+
+class _GeoState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.grid = None
+
+
+class GeoIndex:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('GEO_INDEX_CELL_DEGREES', 0.05)
+        app.extensions['geo_index'] = _GeoState()
+
+    @property
+    def _state(self):
+        return current_app.extensions['geo_index']
+
+    def _grid(self):
+        state = self._state
+        if state.grid is None:
+            with state.lock:
+                if state.grid is None:
+                    grid = _Grid(current_app.config['GEO_INDEX_CELL_DEGREES'])
+                    for restaurant_id, lat, lon in db.session.query(Restaurant.id, Restaurant.lat, Restaurant.lon) \
+                            .filter(Restaurant.lat.isnot(None), Restaurant.lon.isnot(None)):
+                        grid.add(restaurant_id, lat, lon)
+                    state.grid = grid
+        return state.grid
+
+    def within(self, lat, lon, radius_km):
+        grid = self._grid()
+        with self._state.lock:
+            return grid.within(lat, lon, radius_km)
+
+    def nearest(self, lat, lon, k, max_km=None):
+        grid = self._grid()
+        with self._state.lock:
+            return grid.nearest(lat, lon, k, max_km)
+
+    def in_box(self, min_lat, max_lat, min_lon, max_lon):
+        grid = self._grid()
+        with self._state.lock:
+            return grid.in_box(min_lat, max_lat, min_lon, max_lon)
+
+    def restaurant_saved(self, restaurant):
+        """Move `restaurant` to its current coordinates; returns the previous (lat, lon) if it was indexed."""
+        state = self._state
+        with state.lock:
+            if state.grid is not None:
+                return state.grid.add(restaurant.id, restaurant.lat, restaurant.lon)
+        return None
+
+    def restaurant_removed(self, restaurant_id):
+        """Drop a restaurant; returns its previous (lat, lon) if it was indexed."""
+        state = self._state
+        with state.lock:
+            if state.grid is not None:
+                return state.grid.remove(restaurant_id)
+        return None
+
+
+geo_index = GeoIndex()
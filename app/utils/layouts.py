@@ -0,0 +1,139 @@
+# utils/layouts.py
+"""
+Diff-based floor plan saves.
+
+A save sends the whole floor. Items are matched to stored Layout rows by id,
+for tables without an id by table_number, and otherwise to an identical
+stored row, so a table that was only moved keeps its id and the bookings
+pointing at it. Only rows whose values changed are updated; new items are
+inserted and stored rows missing from the payload deleted, each kind as one
+bulk statement in the caller's transaction.
+
+Bookings keep pointing at their table for good (Booking.layout_id is not
+nullable), so a table with any booking, past or upcoming, is never deleted:
+the save is refused with LayoutConflict listing those tables. An admin can
+still move, renumber or resize them.
+"""
+from datetime import datetime
+from sqlalchemy import bindparam, func, select
+from app.extensions import db
+from app.models import Booking, Layout
+from app.utils.availability import booking_duration
+
+LAYOUT_FIELDS = (
+    'type', 'x_coordinate', 'y_coordinate', 'table_type', 'table_number', 'capacity',
+    'width', 'height', 'color', 'name', 'shape'
+)
+
+
+class InvalidLayoutItem(Exception):
+    """An item of a layout save is malformed or does not belong to the restaurant."""
+
+
+class LayoutConflict(Exception):
+    """The save would delete tables that bookings refer to."""
+
+    def __init__(self, layout_ids, upcoming_ids=()):
+        message = f"Tables referenced by bookings cannot be removed: {', '.join(map(str, layout_ids))}"
+        if upcoming_ids:
+            message += f" (upcoming bookings on {', '.join(map(str, upcoming_ids))})"
+        super().__init__(message)
+        self.layout_ids = layout_ids
+        self.upcoming_ids = upcoming_ids
+
+
+def parse_layout_items(raw):
+    """Validate a JSON floor plan into rows with an optional `id` and LAYOUT_FIELDS, defaults applied."""
+    if not isinstance(raw, list) or not raw:
+        raise InvalidLayoutItem("Layout data is empty")
+    items = []
+    for item in raw:
+        if not isinstance(item, dict) or not all(key in item for key in ['type', 'x_coordinate', 'y_coordinate']):
+            raise InvalidLayoutItem("Missing required fields in layout item")
+        item_id = item.get('id')
+        if item_id is not None and (isinstance(item_id, bool) or not isinstance(item_id, int)):
+            raise InvalidLayoutItem("Layout item id must be an integer")
+        try:
+            x, y = float(item['x_coordinate']), float(item['y_coordinate'])
+        except (TypeError, ValueError):
+            raise InvalidLayoutItem("Layout coordinates must be numbers")
+        items.append({
+            "id": item_id,
+            "type": item['type'],
+            "x_coordinate": x,
+            "y_coordinate": y,
+            "table_type": item.get('table_type'),
+            "table_number": item.get('table_number'),
+            "capacity": item.get('capacity', 4),
+            "width": item.get('width'),
+            "height": item.get('height'),
+            "color": item.get('color', '#4a5568'),
+            "name": item.get('name', 'New Item'),
+            "shape": item.get('shape', 'rectangle'),
+        })
+    return items
+
+
+def _booked_tables(restaurant, layout_ids):
+    """{layout id: start of its latest booking} for the `layout_ids` that have bookings."""
+    if not layout_ids:
+        return {}
+    return dict(db.session.query(Booking.layout_id, func.max(Booking.date)).filter(
+        Booking.restaurant_id == restaurant.id,
+        Booking.layout_id.in_(layout_ids)
+    ).group_by(Booking.layout_id))
+
+
+def save_layout(restaurant, items):
+    """Apply `items` (from parse_layout_items) as the restaurant's floor. Returns row counts; the caller commits."""
+    table = Layout.__table__
+    existing = {
+        row.id: row for row in db.session.execute(
+            select(table.c.id, *(table.c[field] for field in LAYOUT_FIELDS)).where(table.c.restaurant_id == restaurant.id)
+        )
+    }
+    by_number, by_values = {}, {}
+    for row in existing.values():
+        if row.type == 'table' and row.table_number is not None:
+            by_number.setdefault(row.table_number, row.id)
+        by_values.setdefault(tuple(row[1:]), []).append(row.id)
+
+    inserts, updates, matched = [], [], set()
+    # Explicit ids first, so a table_number or value match never claims a row an item names
+    for item in sorted(items, key=lambda item: item['id'] is None):
+        values = {field: item[field] for field in LAYOUT_FIELDS}
+        item_id = item['id']
+        if item_id is None and item['type'] == 'table' and item['table_number'] is not None:
+            item_id = by_number.get(item['table_number'])
+        if item_id is None or (item['id'] is None and item_id in matched):
+            # Unchanged furniture and unnumbered tables: an identical stored row not claimed yet
+            item_id = next((row_id for row_id in by_values.get(tuple(values.values()), ())
+                            if row_id not in matched), None)
+        if item_id is None:
+            inserts.append(values)
+            continue
+        if item_id not in existing:
+            raise InvalidLayoutItem(f"Layout item {item_id} does not belong to this restaurant")
+        if item_id in matched:
+            raise InvalidLayoutItem(f"Layout item {item_id} is listed twice")
+        matched.add(item_id)
+        if any(getattr(existing[item_id], field) != value for field, value in values.items()):
+            updates.append({"_id": item_id, **values})
+
+    stale = sorted(set(existing) - matched)
+    booked = _booked_tables(restaurant, stale)
+    if booked:
+        still_running_since = datetime.utcnow() - booking_duration(restaurant)
+        raise LayoutConflict(sorted(booked), sorted(i for i, latest in booked.items() if latest > still_running_since))
+
+    if stale:
+        db.session.execute(table.delete().where(table.c.id.in_(stale)))
+    if updates:
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('_id'))
+            .values({field: bindparam(field) for field in LAYOUT_FIELDS}),
+            updates
+        )
+    if inserts:
+        db.session.execute(table.insert(), [{"restaurant_id": restaurant.id, **values} for values in inserts])
+    return {"inserted": len(inserts), "updated": len(updates), "deleted": len(stale)}
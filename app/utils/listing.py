@@ -0,0 +1,85 @@
+# utils/listing.py
+"""
+Column projection for the restaurant listing.
+
+The listing selects only the columns a client asked for (`fields=`), plus the
+first image through a correlated subquery, so no Restaurant or RestaurantImage
+objects are built and there is no per-row image lookup. Pages are keyed on
+Restaurant.id; full exports stream the same projection with `yield_per`.
+"""
+from app.extensions import db
+from app.models import Restaurant, RestaurantImage
+
+PLACEHOLDER_IMAGE = "/static/placeholder.png"
+EXPORT_BATCH_SIZE = 1000
+
+
+def first_image_url():
+    return db.session.query(RestaurantImage.image_url).filter(
+        RestaurantImage.restaurant_id == Restaurant.id
+    ).order_by(RestaurantImage.id).limit(1).scalar_subquery()
+
+
+def _time(value):
+    return value.strftime("%H:%M") if value else None
+
+
+# field name -> (column factory, formatter)
+LISTING_FIELDS = {
+    "id": (lambda: Restaurant.id, None),
+    "name": (lambda: Restaurant.name, None),
+    "location": (lambda: Restaurant.location, None),
+    "cuisine": (lambda: Restaurant.cuisine, None),
+    "promo": (lambda: Restaurant.promo, None),
+    "lat": (lambda: Restaurant.lat, None),
+    "lon": (lambda: Restaurant.lon, None),
+    "opening_time": (lambda: Restaurant.opening_time, _time),
+    "closing_time": (lambda: Restaurant.closing_time, _time),
+    "rating": (lambda: Restaurant.rating, lambda value: round(value, 1)),
+    "image_url": (first_image_url, lambda value: value or PLACEHOLDER_IMAGE),
+}
+
+
+def parse_fields(raw):
+    """Field names from a comma separated `fields=` value; all fields when empty."""
+    if not raw:
+        return tuple(LISTING_FIELDS)
+    fields = tuple(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in LISTING_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def listing_query(fields, after_id=None, criteria=()):
+    """Projection query for `fields`, ordered by id. The id is always selected first for paging."""
+    columns = [Restaurant.id.label('_key')]
+    columns += [LISTING_FIELDS[name][0]().label(name) for name in fields]
+    query = db.session.query(*columns).filter(*criteria)
+    if after_id is not None:
+        query = query.filter(Restaurant.id > after_id)
+    return query.order_by(Restaurant.id)
+
+
+def serialize_row(row, fields):
+    item = {}
+    for name in fields:
+        value = getattr(row, name)
+        formatter = LISTING_FIELDS[name][1]
+        item[name] = formatter(value) if formatter else value
+    return item
+
+
+def stream_listing(fields, dumps, criteria=(), batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield the whole listing as a `{"data": [...], "error": null}` document.
+
+    Rows are fetched `batch_size` at a time with yield_per, so memory does not
+    grow with the size of the catalogue.
+    """
+    yield '{"data": ['
+    first = True
+    for row in listing_query(fields, criteria=criteria).execution_options(yield_per=batch_size):
+        yield ('' if first else ', ') + dumps(serialize_row(row, fields))
+        first = False
+    yield '], "error": null}'
@@ -0,0 +1,127 @@
+# utils/map_clusters.py
+"""
+Map marker clusters per Web Mercator tile.
+
+A viewport at zoom z is covered by the standard z/x/y tiles. Each tile is cut
+into MAP_CLUSTER_GRID x MAP_CLUSTER_GRID cells (square on screen) and the
+restaurants in a cell are merged into one cluster with a count and a centroid,
+so a tile never yields more than GRID^2 markers however many restaurants it
+holds. Points come from the geo index; the clusters of a tile are cached until
+a restaurant inside it is added, moved or deleted.
+"""
+import math
+import threading
+from collections import OrderedDict
+from flask import current_app
+from app.utils.geo_index import geo_index
+
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def _clamp_lat(lat):
+    return max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+
+
+def tile_coordinates(lat, lon, zoom):
+    """Fractional tile (x, y) of a point at `zoom`."""
+    n = 2 ** zoom
+    phi = math.radians(_clamp_lat(lat))
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - math.log(math.tan(phi) + 1.0 / math.cos(phi)) / math.pi) / 2.0 * n
+    return min(max(x, 0.0), n - 1e-9), min(max(y, 0.0), n - 1e-9)
+
+
+def tile_bounds(x, y, zoom):
+    """(min_lat, max_lat, min_lon, max_lon) of tile x/y at `zoom`."""
+    n = 2 ** zoom
+
+    def lat(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return lat(y + 1), lat(y), x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+
+
+def tiles_in_view(min_lat, max_lat, min_lon, max_lon, zoom):
+    x0, y0 = tile_coordinates(max_lat, min_lon, zoom)
+    x1, y1 = tile_coordinates(min_lat, max_lon, zoom)
+    return [(x, y) for x in range(int(x0), int(x1) + 1) for y in range(int(y0), int(y1) + 1)]
+
+
+def cluster_tile(zoom, x, y, grid):
+    """Clusters for one tile: [{"lat", "lon", "count", "restaurant_id"}], restaurant_id only for singletons."""
+    min_lat, max_lat, min_lon, max_lon = tile_bounds(x, y, zoom)
+    cells = {}
+    for restaurant_id, lat, lon in geo_index.in_box(min_lat, max_lat, min_lon, max_lon):
+        tile_x, tile_y = tile_coordinates(lat, lon, zoom)
+        if int(tile_x) != x or int(tile_y) != y:
+            continue  # On a shared edge; the neighbouring tile owns it
+        cell = (int((tile_x - x) * grid), int((tile_y - y) * grid))
+        entry = cells.setdefault(cell, [0, 0.0, 0.0, restaurant_id])
+        entry[0] += 1
+        entry[1] += lat
+        entry[2] += lon
+    return [{
+        "lat": round(lat_sum / count, 6),
+        "lon": round(lon_sum / count, 6),
+        "count": count,
+        "restaurant_id": restaurant_id if count == 1 else None
+    } for _, (count, lat_sum, lon_sum, restaurant_id) in sorted(cells.items())]
+
+
+class _ClusterState:
+    def __init__(self, max_tiles):
+        self.lock = threading.Lock()
+        self.tiles = OrderedDict()  # (zoom, x, y) -> clusters
+        self.generation = 0  # bumped on every invalidation
+        self.max_tiles = max_tiles
+
+
+class MapClusters:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MAP_CLUSTER_GRID', 8)
+        app.config.setdefault('MAP_MAX_ZOOM', 20)
+        app.config.setdefault('MAP_MAX_TILES', 64)
+        app.config.setdefault('MAP_CLUSTER_CACHE_TILES', 5000)
+        app.extensions['map_clusters'] = _ClusterState(app.config['MAP_CLUSTER_CACHE_TILES'])
+
+    @property
+    def _state(self):
+        return current_app.extensions['map_clusters']
+
+    def tile(self, zoom, x, y):
+        state = self._state
+        key = (zoom, x, y)
+        with state.lock:
+            clusters = state.tiles.get(key)
+            if clusters is not None:
+                state.tiles.move_to_end(key)
+                return clusters
+            generation = state.generation
+        clusters = cluster_tile(zoom, x, y, current_app.config['MAP_CLUSTER_GRID'])
+        with state.lock:
+            if generation != state.generation:
+                return clusters  # A restaurant moved meanwhile; do not cache what may be stale
+            state.tiles[key] = clusters
+            while len(state.tiles) > state.max_tiles:
+                state.tiles.popitem(last=False)
+        return clusters
+
+    def point_changed(self, *points):
+        """Drop cached tiles, at every zoom, that contain any of the (lat, lon) `points`."""
+        keys = {
+            (zoom, *map(int, tile_coordinates(lat, lon, zoom)))
+            for lat, lon in points if lat is not None and lon is not None
+            for zoom in range(current_app.config['MAP_MAX_ZOOM'] + 1)
+        }
+        state = self._state
+        with state.lock:
+            state.generation += 1
+            for key in keys:
+                state.tiles.pop(key, None)
+
+
+map_clusters = MapClusters()
@@ -0,0 +1,131 @@
+# utils/menus.py
+"""
+Menu reads and bulk writes.
+
+Reads come in two shapes: the flat item list and the same items grouped by
+category, categories in the order their first item was added. Both are served
+from catalogue snapshots (utils/catalog_snapshot.py) once built.
+
+`upsert_menu` writes a whole menu with one executemany per statement kind.
+By default it diffs: items are matched by id, or by (category, name) when no
+id is given, unchanged rows are left alone, changed rows updated, new rows
+inserted and rows missing from the payload deleted, so the ids referenced by
+existing bookings' menu orders survive an edit. `replace=True` deletes the menu
+and inserts the payload afresh. Being bulk statements, neither fires the
+session hooks; the caller reindexes search and notifies the read models.
+"""
+from sqlalchemy import bindparam, select
+from app.extensions import db
+from app.models import MenuItem
+from app.utils.schemas import MenuCategorySchema, MenuItemSchema
+
+MENU_MAX_ITEMS = 2000
+MENU_FIELDS = ('category', 'name', 'description', 'price', 'image_url')
+
+
+class InvalidMenuItem(Exception):
+    """An item of a menu upsert is malformed or does not belong to the menu."""
+
+
+def menu_payload(restaurant_id):
+    return [MenuItemSchema.from_row(item)
+            for item in MenuItem.query.filter_by(restaurant_id=restaurant_id).order_by(MenuItem.id)]
+
+
+def dish_names(restaurant_id):
+    """Names of the restaurant's menu items, one per item."""
+    return [name for name, in db.session.query(MenuItem.name).filter(MenuItem.restaurant_id == restaurant_id)]
+
+
+def grouped_menu_payload(restaurant_id):
+    categories = {}
+    for item in menu_payload(restaurant_id):
+        categories.setdefault(item.category, []).append(item)
+    return [MenuCategorySchema(category=category, items=items) for category, items in categories.items()]
+
+
+def _text(item, index, field, required=False):
+    value = item.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise InvalidMenuItem(f"Item {index}: {field} is required")
+        return None
+    if not isinstance(value, str):
+        raise InvalidMenuItem(f"Item {index}: {field} must be a string")
+    limit = MenuItem.__table__.c[field].type.length
+    if len(value.strip()) > limit:
+        raise InvalidMenuItem(f"Item {index}: {field} is longer than {limit} characters")
+    return value.strip()
+
+
+def parse_menu_items(raw):
+    """Validate a JSON list of menu items into rows with an optional `id` and MENU_FIELDS."""
+    if not isinstance(raw, list):
+        raise InvalidMenuItem("items must be a list")
+    if len(raw) > MENU_MAX_ITEMS:
+        raise InvalidMenuItem(f"A menu holds at most {MENU_MAX_ITEMS} items")
+    items = []
+    for index, item in enumerate(raw):
+        if not isinstance(item, dict):
+            raise InvalidMenuItem(f"Item {index}: expected an object")
+        item_id, price = item.get('id'), item.get('price')
+        if item_id is not None and (isinstance(item_id, bool) or not isinstance(item_id, int)):
+            raise InvalidMenuItem(f"Item {index}: id must be an integer")
+        if isinstance(price, bool) or not isinstance(price, (int, float)) or price < 0:
+            raise InvalidMenuItem(f"Item {index}: price must be a non-negative number")
+        items.append({
+            "id": item_id,
+            "category": _text(item, index, 'category'),
+            "name": _text(item, index, 'name', required=True),
+            "description": _text(item, index, 'description'),
+            "price": float(price),
+            "image_url": _text(item, index, 'image_url'),
+        })
+    return items
+
+
+def upsert_menu(restaurant_id, items, replace=False):
+    """Write `items` (from parse_menu_items) as the whole menu. Returns the row counts; the caller commits."""
+    table = MenuItem.__table__
+    inserts, updates, stale = [], [], set()
+    if replace:
+        deleted = db.session.execute(table.delete().where(table.c.restaurant_id == restaurant_id)).rowcount
+        inserts = [{field: item[field] for field in MENU_FIELDS} for item in items]
+    else:
+        existing = {
+            row.id: row for row in db.session.execute(
+                select(table.c.id, *(table.c[field] for field in MENU_FIELDS))
+                .where(table.c.restaurant_id == restaurant_id)
+            )
+        }
+        by_name = {}
+        for row in existing.values():
+            by_name.setdefault((row.category, row.name), row.id)
+        seen = set()
+        for index, item in enumerate(items):
+            item_id = item['id'] if item['id'] is not None else by_name.get((item['category'], item['name']))
+            values = {field: item[field] for field in MENU_FIELDS}
+            if item_id is None:
+                inserts.append(values)
+                continue
+            if item_id not in existing:
+                raise InvalidMenuItem(f"Item {index}: item {item_id} is not on this menu")
+            if item_id in seen:
+                raise InvalidMenuItem(f"Item {index}: item {item_id} is listed twice")
+            seen.add(item_id)
+            if any(getattr(existing[item_id], field) != value for field, value in values.items()):
+                updates.append({"_id": item_id, **values})
+        stale = set(existing) - seen
+        deleted = len(stale)
+
+    if stale:
+        db.session.execute(table.delete().where(table.c.id.in_(sorted(stale))))
+    if updates:
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('_id'))
+            .values({field: bindparam(field) for field in MENU_FIELDS}),
+            updates
+        )
+    if inserts:
+        db.session.execute(table.insert(), [{"restaurant_id": restaurant_id, **values} for values in inserts])
+    return {"inserted": len(inserts), "updated": len(updates), "deleted": deleted}
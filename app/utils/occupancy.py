@@ -0,0 +1,278 @@
+# utils/occupancy.py
+"""
+In-process occupancy index used to answer availability reads from memory.
+
+Occupancy is kept per (restaurant_id, layout_id, day) as a minute-resolution
+bitmap stored in a Python int (bit m set = minute m of that day is taken),
+alongside the booking intervals it was built from so a single booking can be
+removed again. Buckets are loaded from the Booking table one (restaurant, day)
+at a time on first use and patched incrementally by the booking routes.
+
+At most OCCUPANCY_INDEX_MAX_DAYS days are kept, least recently used evicted
+first. Days before today (UTC) are answered straight from the database and
+never kept, and kept ones are dropped once the date rolls past them.
+
+The index is per process and only sees the bookings its own process commits,
+so every loaded day and restaurant is reloaded once it is older than
+OCCUPANCY_INDEX_TTL_SECONDS: a booking made or cancelled by another worker
+shows up here within that time. The Booking table stays authoritative for
+writes and `verify` rebuilds loaded buckets from it, reporting any drift.
+"""
+import logging
+import threading
+import time as clock
+from collections import OrderedDict
+from datetime import datetime, time, timedelta
+from flask import current_app
+from app.extensions import db
+from app.models import Booking, Layout, Restaurant
+from app.utils.availability import booking_duration, to_naive_utc
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def _minute_of(value, day_start):
+    return int((value - day_start).total_seconds() // 60)
+
+
+def _mask(first, last):
+    """Bitmap with minutes [first, last) set."""
+    return ((1 << (last - first)) - 1) << first
+
+
+def _split_by_day(start, end):
+    """Yield (day, first_minute, last_minute) pieces of [start, end)."""
+    day = start.date()
+    while True:
+        day_start = datetime.combine(day, time(0, 0))
+        first = max(_minute_of(start, day_start), 0)
+        last = min(-(-int((end - day_start).total_seconds()) // 60), MINUTES_PER_DAY)
+        if first < last:
+            yield day, first, last
+        if end <= day_start + timedelta(days=1):
+            return
+        day += timedelta(days=1)
+
+
+class _Bucket:
+    __slots__ = ('intervals', 'bits')
+
+    def __init__(self):
+        self.intervals = {}  # booking_id -> (first_minute, last_minute)
+        self.bits = 0
+
+    def add(self, booking_id, first, last):
+        self.intervals[booking_id] = (first, last)
+        self.bits |= _mask(first, last)
+
+    def discard(self, booking_id):
+        if self.intervals.pop(booking_id, None) is not None:
+            self.bits = 0
+            for first, last in self.intervals.values():
+                self.bits |= _mask(first, last)
+
+
+class _IndexState:
+    def __init__(self, max_days):
+        self.lock = threading.RLock()
+        self.restaurants = {}  # restaurant_id -> (duration, table ids)
+        self.restaurants_loaded = {}  # restaurant_id -> monotonic load time
+        self.days = OrderedDict()  # (restaurant_id, day) -> {layout_id: _Bucket}, least recently used first
+        self.days_loaded = {}  # (restaurant_id, day) -> monotonic load time
+        self.placements = {}  # booking_id -> [(restaurant_id, day, layout_id)]
+        self.max_days = max_days
+        self.today = None  # UTC date the kept days were last purged for
+
+
+class OccupancyIndex:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('OCCUPANCY_INDEX_ENABLED', True)
+        app.config.setdefault('OCCUPANCY_INDEX_MAX_DAYS', 5000)
+        app.config.setdefault('OCCUPANCY_INDEX_TTL_SECONDS', 30)
+        app.extensions['occupancy_index'] = _IndexState(app.config['OCCUPANCY_INDEX_MAX_DAYS'])
+
+    @property
+    def enabled(self):
+        return current_app.config['OCCUPANCY_INDEX_ENABLED']
+
+    @property
+    def _state(self):
+        return current_app.extensions['occupancy_index']
+
+    # --- loading -----------------------------------------------------------
+
+    def _expired(self, loaded_at):
+        return loaded_at is None or clock.monotonic() - loaded_at >= current_app.config['OCCUPANCY_INDEX_TTL_SECONDS']
+
+    def _restaurant(self, state, restaurant_id):
+        meta = state.restaurants.get(restaurant_id)
+        if meta is None or self._expired(state.restaurants_loaded.get(restaurant_id)):
+            restaurant = Restaurant.query.get(restaurant_id)
+            if restaurant is None:
+                self.invalidate_restaurant(restaurant_id)
+                return None
+            table_ids = tuple(layout_id for (layout_id,) in db.session.query(Layout.id).filter(
+                Layout.restaurant_id == restaurant_id,
+                Layout.type == 'table'
+            ).order_by(Layout.id))
+            fresh = (booking_duration(restaurant), table_ids)
+            if meta is not None and fresh != meta:
+                self.invalidate_restaurant(restaurant_id)  # Floor or duration changed in another process
+            meta = state.restaurants[restaurant_id] = fresh
+            state.restaurants_loaded[restaurant_id] = clock.monotonic()
+        return meta
+
+    def _read_day(self, restaurant_id, day, duration):
+        """{layout_id: _Bucket} for every booking touching `day`, straight from the Booking table."""
+        day_start = datetime.combine(day, time(0, 0))
+        bookings = db.session.query(Booking.id, Booking.layout_id, Booking.date).filter(
+            Booking.restaurant_id == restaurant_id,
+            Booking.date > day_start - duration,
+            Booking.date < day_start + timedelta(days=1)
+        ).all()
+        buckets = {}
+        for booking_id, layout_id, booked_at in bookings:
+            for piece_day, first, last in _split_by_day(booked_at, booked_at + duration):
+                if piece_day == day:
+                    buckets.setdefault(layout_id, _Bucket()).add(booking_id, first, last)
+        return buckets
+
+    def _load_day(self, state, restaurant_id, day, duration):
+        key = (restaurant_id, day)
+        self._drop_day(state, key)
+        buckets = state.days[key] = self._read_day(restaurant_id, day, duration)
+        state.days_loaded[key] = clock.monotonic()
+        for layout_id, bucket in buckets.items():
+            for booking_id in bucket.intervals:
+                state.placements.setdefault(booking_id, []).append((restaurant_id, day, layout_id))
+        while len(state.days) > state.max_days:
+            self._drop_day(state, next(iter(state.days)))
+        return buckets
+
+    def _drop_day(self, state, key):
+        state.days_loaded.pop(key, None)
+        for buckets in state.days.pop(key, {}).values():
+            for booking_id in buckets.intervals:
+                remaining = [p for p in state.placements.get(booking_id, []) if p[:2] != key]
+                if remaining:
+                    state.placements[booking_id] = remaining
+                else:
+                    state.placements.pop(booking_id, None)
+
+    def _purge_past(self, state):
+        today = datetime.utcnow().date()
+        if state.today != today:
+            for key in [key for key in state.days if key[1] < today]:
+                self._drop_day(state, key)
+            state.today = today
+        return today
+
+    def _day(self, state, restaurant_id, day, duration):
+        key = (restaurant_id, day)
+        if day < self._purge_past(state):
+            return self._read_day(restaurant_id, day, duration)  # Nothing is booked into the past; don't keep it
+        buckets = state.days.get(key)
+        if buckets is None or self._expired(state.days_loaded.get(key)):
+            return self._load_day(state, restaurant_id, day, duration)
+        state.days.move_to_end(key)
+        return buckets
+
+    # --- reads -------------------------------------------------------------
+
+    def available_table_ids(self, restaurant_id, start):
+        """
+        Return the ids of tables free for a booking starting at `start`, or None
+        if the restaurant does not exist. Warm lookups never touch the database.
+        """
+        state = self._state
+        start = to_naive_utc(start)
+        with state.lock:
+            meta = self._restaurant(state, restaurant_id)
+            if meta is None:
+                return None
+            duration, table_ids = meta
+            busy = set()
+            for day, first, last in _split_by_day(start, start + duration):
+                mask = _mask(first, last)
+                for layout_id, bucket in self._day(state, restaurant_id, day, duration).items():
+                    if bucket.bits & mask:
+                        busy.add(layout_id)
+            return [layout_id for layout_id in table_ids if layout_id not in busy]
+
+    # --- incremental maintenance -------------------------------------------
+
+    def add(self, booking, restaurant=None):
+        """Record a committed booking in every loaded day bucket it touches."""
+        state = self._state
+        with state.lock:
+            if restaurant is not None:
+                duration = booking_duration(restaurant)
+            else:
+                meta = state.restaurants.get(booking.restaurant_id)
+                if meta is None:
+                    return
+                duration = meta[0]
+            booked_at = to_naive_utc(booking.date)
+            for day, first, last in _split_by_day(booked_at, booked_at + duration):
+                buckets = state.days.get((booking.restaurant_id, day))
+                if buckets is None:
+                    continue  # Loaded from the database on first use
+                buckets.setdefault(booking.layout_id, _Bucket()).add(booking.id, first, last)
+                state.placements.setdefault(booking.id, []).append(
+                    (booking.restaurant_id, day, booking.layout_id))
+
+    def remove(self, booking_id):
+        """Forget a booking that was cancelled or is about to be re-added."""
+        state = self._state
+        with state.lock:
+            for restaurant_id, day, layout_id in state.placements.pop(booking_id, []):
+                bucket = state.days.get((restaurant_id, day), {}).get(layout_id)
+                if bucket is not None:
+                    bucket.discard(booking_id)
+
+    def invalidate_restaurant(self, restaurant_id):
+        """Drop everything cached for a restaurant, e.g. after its floor plan changed."""
+        state = self._state
+        with state.lock:
+            state.restaurants.pop(restaurant_id, None)
+            state.restaurants_loaded.pop(restaurant_id, None)
+            for key in [key for key in state.days if key[0] == restaurant_id]:
+                self._drop_day(state, key)
+
+    # --- consistency -------------------------------------------------------
+
+    def verify(self, restaurant_id=None):
+        """
+        Rebuild every loaded (restaurant, day) from the Booking table, replace the
+        in-memory buckets with the rebuilt ones and return the keys that differed.
+        """
+        state = self._state
+        mismatches = []
+        with state.lock:
+            keys = [key for key in state.days if restaurant_id is None or key[0] == restaurant_id]
+            for key in keys:
+                rid, day = key
+                before = {layout_id: bucket.bits for layout_id, bucket in state.days[key].items() if bucket.bits}
+                self._drop_day(state, key)
+                state.restaurants.pop(rid, None)
+                state.restaurants_loaded.pop(rid, None)
+                meta = self._restaurant(state, rid)
+                if meta is None:
+                    mismatches.append({"restaurant_id": rid, "date": day.isoformat(), "layout_ids": sorted(before)})
+                    continue
+                after = {layout_id: bucket.bits
+                         for layout_id, bucket in self._load_day(state, rid, day, meta[0]).items() if bucket.bits}
+                if before != after:
+                    drifted = sorted(lid for lid in set(before) | set(after) if before.get(lid) != after.get(lid))
+                    logger.warning(f"Occupancy drift for restaurant {rid} on {day}: tables {drifted}")
+                    mismatches.append({"restaurant_id": rid, "date": day.isoformat(), "layout_ids": drifted})
+        return mismatches
+
+
+occupancy_index = OccupancyIndex()
@@ -0,0 +1,50 @@
+# utils/opening_hours.py
+"""
+"Open at" filter as a SQL predicate on Restaurant.opening_time/closing_time.
+
+Hours follow `availability.opening_window`: a missing opening time means
+midnight, a missing closing time means open until midnight, and a closing time
+at or before the opening time runs past midnight into the next day. Every
+branch of the predicate starts with a range on opening_time so it can be
+answered from ix_restaurant_opening_hours (opening_time, closing_time).
+"""
+from datetime import datetime, time
+from flask import current_app
+from pytz import timezone
+from sqlalchemy import and_, or_
+from app.models import Restaurant
+
+
+def open_at(at):
+    """SQL clause that is true for restaurants open at time of day `at`."""
+    opening, closing = Restaurant.opening_time, Restaurant.closing_time
+    return or_(
+        # Opened earlier today and not closed yet, or closing after midnight
+        and_(opening <= at, or_(closing.is_(None), closing > at, closing <= opening)),
+        # Opened yesterday evening and still open after midnight
+        and_(opening > at, closing > at, closing <= opening),
+        # No opening time: open from midnight
+        and_(opening.is_(None), or_(closing.is_(None), closing > at, closing == time(0, 0)))
+    )
+
+
+def local_now():
+    """Current time of day where the restaurants are (RESTAURANT_TIMEZONE)."""
+    return datetime.now(timezone(current_app.config['RESTAURANT_TIMEZONE'])).time().replace(microsecond=0)
+
+
+def open_filter(args):
+    """
+    The `open_at` clause requested by `open_now=1` or `open_at=HH:MM`, or None.
+
+    Raises ValueError for a malformed time.
+    """
+    at = args.get('open_at')
+    if at:
+        try:
+            return open_at(datetime.strptime(at, "%H:%M").time())
+        except ValueError:
+            raise ValueError("open_at must be HH:MM")
+    if args.get('open_now', '').lower() in ('1', 'true', 'yes'):
+        return open_at(local_now())
+    return None
@@ -0,0 +1,211 @@
+# utils/outbox.py
+"""
+Transactional email outbox.
+
+Request handlers call `queue_email` inside the transaction that produced the
+email (a booking, a login OTP) and commit as usual; nothing talks to SMTP on
+the request path. A small pool of daemon threads drains due rows in batches.
+Each worker keeps its SMTP connection open between batches and reconnects after
+errors or when idle. Failed sends are retried with exponential backoff until
+MAIL_OUTBOX_MAX_ATTEMPTS, then marked FAILED.
+
+SENT rows are kept for MAIL_OUTBOX_RETENTION_DAYS and then deleted by
+`flask outbox purge`; run it from cron. FAILED rows are left for inspection.
+
+To try it locally against an SMTP stub (pip install aiosmtpd):
+
+    python -m aiosmtpd -n -l localhost:1025
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=false flask outbox drain
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from app.extensions import db, mail
+from app.models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(recipients, subject, body):
+    """Add an email to the outbox in the current transaction. The caller commits."""
+    message = EmailOutbox(recipients=list(recipients), subject=subject, body=body)
+    db.session.add(message)
+    return message
+
+
+class _SenderState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.workers = []
+
+
+class _PooledConnection:
+    """One SMTP connection reused across batches, reopened after errors or idling."""
+
+    def __init__(self, idle_timeout):
+        self.idle_timeout = idle_timeout
+        self.connection = None
+        self.last_used = None
+
+    def get(self):
+        if self.connection is not None and datetime.utcnow() - self.last_used > self.idle_timeout:
+            self.close()
+        if self.connection is None:
+            self.connection = mail.connect().__enter__()
+        self.last_used = datetime.utcnow()
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.__exit__(None, None, None)
+            except Exception:
+                pass  # The server may already have dropped the connection
+            self.connection = None
+
+
+class OutboxSender:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MAIL_OUTBOX_WORKERS', 2)
+        app.config.setdefault('MAIL_OUTBOX_BATCH_SIZE', 20)
+        app.config.setdefault('MAIL_OUTBOX_POLL_SECONDS', 5.0)
+        app.config.setdefault('MAIL_OUTBOX_MAX_ATTEMPTS', 6)
+        app.config.setdefault('MAIL_OUTBOX_BACKOFF_SECONDS', 30)
+        app.config.setdefault('MAIL_OUTBOX_IDLE_SECONDS', 60)
+        app.config.setdefault('MAIL_OUTBOX_RETENTION_DAYS', 30)
+        app.extensions['email_outbox'] = _SenderState()
+
+        # Workers start with the first request so CLI commands (flask db ...) never spawn them
+        @app.before_request
+        def _start_outbox_workers():
+            self.start(app)
+
+    def start(self, app):
+        state = app.extensions['email_outbox']
+        count = app.config['MAIL_OUTBOX_WORKERS']
+        if state.workers or count <= 0 or app.testing:
+            return
+        with state.lock:
+            if state.workers:
+                return
+            for index in range(count):
+                worker = threading.Thread(
+                    target=self._run, args=(app, index, count),
+                    name=f"email-outbox-{index}", daemon=True
+                )
+                worker.start()
+                state.workers.append(worker)
+            logger.info(f"Started {count} email outbox workers")
+
+    def notify(self):
+        """Wake the workers after committing a queued email instead of waiting for the next poll."""
+        current_app.extensions['email_outbox'].wakeup.set()
+
+    def _run(self, app, index, count):
+        state = app.extensions['email_outbox']
+        pooled = _PooledConnection(timedelta(seconds=app.config['MAIL_OUTBOX_IDLE_SECONDS']))
+        while True:
+            sent = 0
+            with app.app_context():
+                try:
+                    sent = self.drain_batch(pooled, index, count)
+                except Exception as e:
+                    logger.error(f"Email outbox worker {index} failed: {str(e)}", exc_info=True)
+                    db.session.rollback()
+                    pooled.close()
+                finally:
+                    db.session.remove()
+            if not sent:
+                state.wakeup.wait(app.config['MAIL_OUTBOX_POLL_SECONDS'])
+                state.wakeup.clear()
+
+    def _claim(self, index, count):
+        config = current_app.config
+        query = EmailOutbox.query.filter(
+            EmailOutbox.status == 'PENDING',
+            EmailOutbox.next_attempt_at <= datetime.utcnow()
+        )
+        if count > 1:
+            # Workers in one process split the queue; SKIP LOCKED keeps processes apart on PostgreSQL
+            query = query.filter(EmailOutbox.id % count == index)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            query = query.with_for_update(skip_locked=True)
+        return query.order_by(EmailOutbox.id).limit(config['MAIL_OUTBOX_BATCH_SIZE']).all()
+
+    def _schedule_retry(self, message, error):
+        config = current_app.config
+        message.attempts += 1
+        message.last_error = str(error)[:500]
+        if message.attempts >= config['MAIL_OUTBOX_MAX_ATTEMPTS']:
+            message.status = 'FAILED'
+            logger.error(f"Giving up on outbox email {message.id} after {message.attempts} attempts: {error}")
+        else:
+            delay = config['MAIL_OUTBOX_BACKOFF_SECONDS'] * 2 ** (message.attempts - 1)
+            message.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            logger.warning(f"Outbox email {message.id} failed, retrying in {delay}s: {error}")
+
+    def drain_batch(self, pooled, index=0, count=1):
+        """Send one batch of due emails over `pooled`. Returns the number of rows processed."""
+        batch = self._claim(index, count)
+        if not batch:
+            return 0
+        try:
+            connection = pooled.get()
+        except Exception as e:
+            for message in batch:
+                self._schedule_retry(message, e)
+            db.session.commit()
+            return 0
+
+        for message in batch:
+            try:
+                connection.send(Message(message.subject, recipients=message.recipients, body=message.body))
+                message.status = 'SENT'
+                message.attempts += 1
+                message.sent_at = datetime.utcnow()
+            except Exception as e:
+                self._schedule_retry(message, e)
+                pooled.close()
+                try:
+                    connection = pooled.get()
+                except Exception as reconnect_error:
+                    for remaining in batch[batch.index(message) + 1:]:
+                        self._schedule_retry(remaining, reconnect_error)
+                    break
+        db.session.commit()
+        return len(batch)
+
+    def drain(self):
+        """Synchronously send everything that is due. Used by `flask outbox drain`."""
+        pooled = _PooledConnection(timedelta(seconds=current_app.config['MAIL_OUTBOX_IDLE_SECONDS']))
+        total = 0
+        try:
+            while True:
+                processed = self.drain_batch(pooled)
+                if not processed:
+                    return total
+                total += processed
+        finally:
+            pooled.close()
+
+    def purge_sent(self, retention_days=None):
+        """Delete SENT rows delivered more than `retention_days` ago. Returns the number deleted."""
+        if retention_days is None:
+            retention_days = current_app.config['MAIL_OUTBOX_RETENTION_DAYS']
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        table = EmailOutbox.__table__
+        deleted = db.session.execute(
+            table.delete().where(table.c.status == 'SENT', table.c.sent_at < cutoff)
+        ).rowcount
+        db.session.commit()
+        return deleted
+
+
+email_outbox = OutboxSender()
@@ -0,0 +1,42 @@
+# utils/pagination.py
+import base64
+import json
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    """Opaque keyset cursor from the sort key of the last row on a page."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, *types):
+    """Inverse of encode_cursor; `types` says which positions hold datetimes."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if len(values) != len(types):
+            raise ValueError("cursor length")
+        return tuple(datetime.fromisoformat(v) if t is datetime else t(v) for v, t in zip(values, types))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+
+
+def page_size(requested, default=DEFAULT_PAGE_SIZE):
+    if requested is None:
+        return default
+    return max(1, min(requested, MAX_PAGE_SIZE))
+
+
+def with_next_cursor(result, cursor):
+    """Attach the next-page cursor to a json_response result as the X-Next-Cursor header."""
+    response, status = result
+    if cursor:
+        response.headers['X-Next-Cursor'] = cursor
+    return response, status
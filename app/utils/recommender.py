@@ -0,0 +1,292 @@
+# utils/recommender.py
+"""
+Restaurant recommendations scored with NumPy.
+
+Every restaurant is one float32 row of a feature matrix:
+
+- cuisine: one column per cuisine word
+- price band: the quartile of average_price, one-hot
+- features: normalised as for facets, one column each
+- location: one-hot over the RECOMMENDER_MAX_LOCATIONS most common values
+- rating: centred on three stars and scaled to [-1, 1]
+
+A user is a vector over the same columns. It combines their explicit
+preferences (the preferred cuisine's words and the ambiance preference as a
+feature) with the average row of the restaurants they booked, weighted by
+booking count. Scoring a block of users is one matrix product with the
+catalogue. Each user keeps only their top RECOMMENDER_TOP_K restaurant ids.
+
+A background thread recomputes every user's top-K after the catalogue
+changes, and at the latest every RECOMMENDER_REFRESH_SECONDS, which is also
+when new bookings are picked up. Users with neither preferences nor bookings
+share one default list. A user whose preferences changed is rescored on their
+next request with a single matrix-vector product. Serving is a dict lookup
+plus a primary-key fetch of those few restaurants, however large the
+catalogue is. With RECOMMENDER_REFRESH_SECONDS = 0 there is no thread and
+every user is scored on demand until `refresh` is called.
+"""
+import logging
+import threading
+from collections import Counter, defaultdict
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+from app.extensions import db
+from app.models import Booking, Restaurant, UserPreference
+from app.utils.facets import feature_set, normalize_feature
+
+logger = logging.getLogger(__name__)
+
+CUISINE_WEIGHT = 2.0
+AMBIANCE_WEIGHT = 1.0
+HISTORY_WEIGHT = 1.0
+RATING_WEIGHT = 0.5
+PRICE_BANDS = 4
+
+
+def avoids_peanuts(dietary_restrictions):
+    return "no peanuts" in (dietary_restrictions or "").lower()
+
+
+class _Catalogue:
+    """The feature matrix and the column vocabulary it was built with."""
+
+    def __init__(self, ids, matrix, columns, peanut):
+        self.ids = ids  # row -> restaurant id
+        self.rows = {int(restaurant_id): row for row, restaurant_id in enumerate(ids)}
+        self.matrix = matrix  # (restaurants, columns), float32
+        self.columns = columns  # (kind, value) -> column
+        self.cuisine_words = [(value, column) for (kind, value), column in columns.items() if kind == 'cuisine']
+        self.peanut = peanut  # rows whose cuisine mentions peanuts
+        self._cuisine_columns = {}
+
+    def cuisine_columns(self, preferred_cuisine):
+        """Columns of the cuisine words containing a word of `preferred_cuisine`."""
+        key = (preferred_cuisine or '').lower()
+        if key not in self._cuisine_columns:
+            self._cuisine_columns[key] = sorted({
+                column for word in key.split() for value, column in self.cuisine_words if word in value
+            })
+        return self._cuisine_columns[key]
+
+    def user_vector(self, preference=None, history=None):
+        """`preference` is a UserPreference row or None; `history` maps restaurant id -> bookings."""
+        vector = np.zeros(self.matrix.shape[1], dtype=np.float32)
+        vector[self.columns[('rating', None)]] = RATING_WEIGHT
+        if preference is not None:
+            vector[self.cuisine_columns(preference.preferred_cuisine)] += CUISINE_WEIGHT
+            if preference.ambiance_preference:
+                column = self.columns.get(('feature', normalize_feature(preference.ambiance_preference)))
+                if column is not None:
+                    vector[column] += AMBIANCE_WEIGHT
+        if history:
+            booked = [(self.rows[rid], count) for rid, count in history.items() if rid in self.rows]
+            if booked:
+                rows, counts = zip(*booked)
+                weights = np.asarray(counts, dtype=np.float32)
+                vector += HISTORY_WEIGHT * (weights @ self.matrix[list(rows)]) / weights.sum()
+        return vector
+
+    def top_k(self, vectors, avoid_peanuts, k):
+        """Best restaurant ids for each vector (rows of a 2-D array), best first."""
+        scores = vectors @ self.matrix.T
+        if self.peanut.any() and avoid_peanuts.any():
+            scores[np.ix_(avoid_peanuts, self.peanut)] = -np.inf
+        k = min(k, scores.shape[1])
+        if k == 0:
+            return [() for _ in range(len(vectors))]
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind='stable')
+        best = np.take_along_axis(candidates, order, axis=1)
+        best_scores = np.take_along_axis(candidate_scores, order, axis=1)
+        return [
+            tuple(int(restaurant_id) for restaurant_id in self.ids[row][np.isfinite(row_scores)])
+            for row, row_scores in zip(best, best_scores)
+        ]
+
+
+def build_catalogue(max_locations):
+    restaurants = db.session.query(
+        Restaurant.id, Restaurant.cuisine, Restaurant.location, Restaurant.average_price,
+        Restaurant.features, Restaurant.rating
+    ).order_by(Restaurant.id).all()
+
+    prices = np.array([r.average_price if r.average_price is not None else np.nan for r in restaurants],
+                      dtype=np.float64)
+    known = prices[~np.isnan(prices)]
+    edges = np.quantile(known, [0.25, 0.5, 0.75]) if known.size else np.array([])
+    locations = Counter((r.location or '').strip().lower() for r in restaurants)
+    locations.pop('', None)
+
+    columns = {('rating', None): 0}
+    columns.update({('price', band): 1 + band for band in range(PRICE_BANDS)})
+    columns.update({('location', value): len(columns) + i
+                    for i, (value, _) in enumerate(locations.most_common(max_locations))})
+    hot_rows, hot_columns = [], []
+    for row, r in enumerate(restaurants):
+        keys = [('cuisine', word) for word in set((r.cuisine or '').lower().split())]
+        keys += [('feature', feature) for feature in feature_set(r.features)]
+        keys.append(('location', (r.location or '').strip().lower()))
+        if not np.isnan(prices[row]):
+            keys.append(('price', int(np.searchsorted(edges, prices[row], side='right'))))
+        for key in keys:
+            if key[0] in ('cuisine', 'feature'):
+                columns.setdefault(key, len(columns))
+            column = columns.get(key)
+            if column is not None:
+                hot_rows.append(row)
+                hot_columns.append(column)
+
+    matrix = np.zeros((len(restaurants), len(columns)), dtype=np.float32)
+    matrix[hot_rows, hot_columns] = 1.0
+    matrix[:, 0] = [((r.rating or 0.0) - 3.0) / 2.0 for r in restaurants]
+    ids = np.array([r.id for r in restaurants], dtype=np.int64)
+    peanut = np.array(['peanut' in (r.cuisine or '').lower() for r in restaurants], dtype=bool)
+    return _Catalogue(ids, matrix, columns, peanut)
+
+
+def first_preferences(user_ids=None):
+    """user id -> their first UserPreference row (the one the profile shows)."""
+    query = UserPreference.query.order_by(UserPreference.id)
+    if user_ids is not None:
+        query = query.filter(UserPreference.user_id.in_(user_ids))
+    preferences = {}
+    for preference in query:
+        preferences.setdefault(preference.user_id, preference)
+    return preferences
+
+
+def _histories(user_id=None):
+    """user id -> {restaurant id: bookings}."""
+    query = db.session.query(Booking.user_id, Booking.restaurant_id, func.count(Booking.id)) \
+        .group_by(Booking.user_id, Booking.restaurant_id)
+    if user_id is not None:
+        query = query.filter(Booking.user_id == user_id)
+    histories = defaultdict(dict)
+    for uid, restaurant_id, count in query:
+        histories[uid][restaurant_id] = count
+    return histories
+
+
+def score_all_users(catalogue, top_k, batch_size):
+    """Top-K restaurant ids of every user with preferences or bookings, plus the default for everyone else."""
+    preferences, histories = first_preferences(), _histories()
+    user_ids = sorted(set(preferences) | set(histories))
+    top = {}
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        vectors = np.stack([catalogue.user_vector(preferences.get(uid), histories.get(uid)) for uid in batch])
+        avoid = np.array([uid in preferences and avoids_peanuts(preferences[uid].dietary_restrictions)
+                          for uid in batch], dtype=bool)
+        top.update(zip(batch, catalogue.top_k(vectors, avoid, top_k)))
+    default, = catalogue.top_k(catalogue.user_vector()[None, :], np.zeros(1, dtype=bool), top_k)
+    return top, default
+
+
+class _RecommenderState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.worker = None
+        self.catalogue = None
+        self.top = {}  # user id -> restaurant ids, best first
+        self.default = None
+        self.changed = set()  # users rescored since the running refresh started
+
+
+class Recommender:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RECOMMENDER_TOP_K', 20)
+        app.config.setdefault('RECOMMENDER_MAX_LOCATIONS', 200)
+        app.config.setdefault('RECOMMENDER_BATCH_USERS', 256)
+        app.config.setdefault('RECOMMENDER_REFRESH_SECONDS', 900)
+        app.extensions['recommender'] = _RecommenderState()
+
+    @property
+    def _state(self):
+        return current_app.extensions['recommender']
+
+    def _catalogue(self):
+        state = self._state
+        if state.catalogue is None:
+            with state.lock:
+                if state.catalogue is None:
+                    state.catalogue = build_catalogue(current_app.config['RECOMMENDER_MAX_LOCATIONS'])
+        return state.catalogue
+
+    def recommend(self, user_id, limit):
+        """Up to `limit` restaurant ids for `user_id`, best first."""
+        state = self._state
+        self._start()
+        with state.lock:
+            ids = state.top.get(user_id)
+            if ids is None and user_id not in state.changed:
+                ids = state.default  # Had neither preferences nor bookings at the last refresh
+        if ids is None:
+            catalogue = self._catalogue()
+            preference = first_preferences([user_id]).get(user_id)
+            vector = catalogue.user_vector(preference, _histories(user_id).get(user_id))
+            avoid = np.array([preference is not None and avoids_peanuts(preference.dietary_restrictions)])
+            ids, = catalogue.top_k(vector[None, :], avoid, current_app.config['RECOMMENDER_TOP_K'])
+            with state.lock:
+                if state.catalogue is catalogue:
+                    state.top[user_id] = ids
+        return list(ids[:limit])
+
+    def user_changed(self, user_id):
+        """The user's preferences changed (and were committed): rescore them on their next request."""
+        state = self._state
+        with state.lock:
+            state.top.pop(user_id, None)
+            state.changed.add(user_id)
+
+    def catalog_changed(self):
+        """Restaurants were added, edited or removed: refresh every user in the background."""
+        self._state.wakeup.set()
+
+    def refresh(self):
+        """Rebuild the matrix and every user's top-K in the calling thread. Returns (restaurants, users)."""
+        state = self._state
+        config = current_app.config
+        with state.lock:
+            state.changed = set()
+        catalogue = build_catalogue(config['RECOMMENDER_MAX_LOCATIONS'])
+        top, default = score_all_users(catalogue, config['RECOMMENDER_TOP_K'], config['RECOMMENDER_BATCH_USERS'])
+        with state.lock:
+            for user_id in state.changed:
+                top.pop(user_id, None)  # Scored with preferences older than their latest change
+            state.catalogue, state.top, state.default = catalogue, top, default
+        return len(catalogue.ids), len(top)
+
+    def _start(self):
+        state = self._state
+        if state.worker is not None or not current_app.config['RECOMMENDER_REFRESH_SECONDS']:
+            return
+        with state.lock:
+            if state.worker is None:
+                state.worker = threading.Thread(
+                    target=self._run, args=(current_app._get_current_object(),),
+                    name="recommender-refresh", daemon=True
+                )
+                state.worker.start()
+
+    def _run(self, app):
+        state = app.extensions['recommender']
+        while True:
+            with app.app_context():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error(f"Recommendation refresh failed: {str(e)}", exc_info=True)
+                finally:
+                    db.session.remove()
+            state.wakeup.wait(app.config['RECOMMENDER_REFRESH_SECONDS'])
+            state.wakeup.clear()
+
+
+recommender = Recommender()
@@ -0,0 +1,150 @@
+# utils/reservations.py
+"""
+Booking commit path that serializes writers per table, not globally.
+
+On PostgreSQL the table's Layout row is locked with SELECT ... FOR UPDATE for
+the rest of the transaction, so two requests for the same table queue behind
+each other while bookings for other tables proceed in parallel. Other
+dialects (SQLite in development) fall back to a striped in-process lock keyed
+by layout id, which is held until the transaction commits.
+"""
+import threading
+from contextlib import contextmanager
+from app.extensions import db
+from app.models import Booking, Layout
+from app.utils.availability import booking_duration, busy_layout_ids, to_naive_utc
+
+_LOCK_STRIPES = [threading.Lock() for _ in range(64)]
+PARTY_FIELDS = ('menu_orders', 'special_requests')  # Stored once per party, on its first row
+
+
+class BookingConflict(Exception):
+    """The requested table is already booked for an overlapping slot."""
+
+
+class InvalidTable(Exception):
+    """The layout id does not name a table of the restaurant."""
+
+
+class TableTooSmall(Exception):
+    """The chosen tables do not seat the whole party."""
+
+
+class JoinedTables(Exception):
+    """A party seated at joined tables cannot be moved to another table; cancel and rebook instead."""
+
+
+@contextmanager
+def _table_guard(restaurant_id, layout_ids):
+    layout_ids = sorted(set(layout_ids))
+    uses_row_locks = db.session.get_bind().dialect.name == 'postgresql'
+    # Always acquire in the same order so joined-table bookings cannot deadlock
+    stripes = [] if uses_row_locks else sorted(
+        {layout_id % len(_LOCK_STRIPES) for layout_id in layout_ids})
+    for stripe in stripes:
+        _LOCK_STRIPES[stripe].acquire()
+    try:
+        tables = db.session.query(Layout).filter(
+            Layout.id.in_(layout_ids),
+            Layout.restaurant_id == restaurant_id,
+            Layout.type == 'table'
+        ).order_by(Layout.id).with_for_update().all()
+        if len(tables) != len(layout_ids):
+            db.session.rollback()
+            missing = set(layout_ids) - {table.id for table in tables}
+            raise InvalidTable(min(missing))
+        yield tables
+    finally:
+        for stripe in reversed(stripes):
+            _LOCK_STRIPES[stripe].release()
+
+
+def _ensure_free(restaurant, layout_ids, start, exclude_booking_ids=None):
+    busy = busy_layout_ids(restaurant.id, start, booking_duration(restaurant),
+                           layout_ids=layout_ids, exclude_booking_ids=exclude_booking_ids)
+    if busy:
+        db.session.rollback()
+        raise BookingConflict(min(busy))
+
+
+def _split_party(tables, num_guests):
+    """Guests per table: each table filled in turn, the last one taking the rest."""
+    shares, remaining = [], num_guests or 0
+    for index, table in enumerate(tables):
+        guests = remaining if index == len(tables) - 1 else min(table.capacity or 0, remaining)
+        remaining -= guests
+        shares.append(guests)
+    return shares
+
+
+def party_bookings(booking):
+    """Every Booking row of the party `booking` belongs to, the first row (holding the order) first."""
+    if booking.party_id is None:
+        return [booking]
+    return Booking.query.filter(Booking.party_id == booking.party_id).order_by(Booking.id).all()
+
+
+def reserve_tables(restaurant, layout_ids, start, num_guests=1, **fields):
+    """
+    Book one or more joined tables for a party at `start` and commit.
+
+    One Booking row is written per table, splitting `num_guests` across them.
+    The rows of a joined party share a party_id (the first row's id), and
+    PARTY_FIELDS such as the menu order are stored on the first row only.
+    Raises InvalidTable if a layout id is not a table of the restaurant,
+    TableTooSmall if the tables seat fewer than `num_guests` and BookingConflict
+    if any of them is taken.
+    """
+    start = to_naive_utc(start)
+    with _table_guard(restaurant.id, layout_ids) as tables:
+        seats = sum(table.capacity or 0 for table in tables)
+        if num_guests and seats < num_guests:
+            db.session.rollback()
+            raise TableTooSmall(seats)
+        _ensure_free(restaurant, [table.id for table in tables], start)
+        shared = {key: value for key, value in fields.items() if key not in PARTY_FIELDS}
+        bookings = [
+            Booking(restaurant_id=restaurant.id, layout_id=table.id, date=start, num_guests=guests,
+                    **(fields if index == 0 else shared))
+            for index, (table, guests) in enumerate(zip(tables, _split_party(tables, num_guests)))
+        ]
+        db.session.add(bookings[0])
+        if len(bookings) > 1:
+            db.session.flush()
+            for booking in bookings:
+                booking.party_id = bookings[0].id
+            db.session.add_all(bookings[1:])
+        db.session.commit()
+    return bookings
+
+
+def move_booking(booking, layout_id, start, num_guests=None):
+    """
+    Move an existing booking to another table and/or time, or resize its party,
+    under the same guarantees as reserve_tables (including TableTooSmall).
+
+    A joined-table party moves in time as a whole and `num_guests` is split
+    across its tables again; it cannot change tables (JoinedTables).
+    Returns the party's rows.
+    """
+    start = to_naive_utc(start)
+    rows = party_bookings(booking)
+    if len(rows) > 1 and layout_id != booking.layout_id:
+        raise JoinedTables(booking.party_id)
+    party_size = num_guests if num_guests is not None else sum(row.num_guests or 0 for row in rows)
+    layout_ids = [layout_id] if len(rows) == 1 else [row.layout_id for row in rows]
+    with _table_guard(booking.restaurant_id, layout_ids) as tables:
+        seats = sum(table.capacity or 0 for table in tables)
+        if party_size and seats < party_size:
+            db.session.rollback()
+            raise TableTooSmall(seats)
+        _ensure_free(booking.restaurant, layout_ids, start, exclude_booking_ids=[row.id for row in rows])
+        booking.layout_id = layout_id
+        by_table = {row.layout_id: row for row in rows}
+        for table, guests in zip(tables, _split_party(tables, num_guests)):
+            row = by_table[table.id]
+            row.date = start
+            if num_guests is not None:
+                row.num_guests = guests
+        db.session.commit()
+    return rows
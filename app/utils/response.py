@@ -1,5 +1,23 @@
 # utils/response.py
-from flask import jsonify
+import msgspec
+from flask import current_app, jsonify
+
+# Sorted keys, like jsonify, so switching an endpoint to a schema keeps its output stable
+_encoder = msgspec.json.Encoder(order='sorted')
+
+
+def _is_schema(data):
+    if isinstance(data, msgspec.Struct):
+        return True
+    return isinstance(data, list) and bool(data) and isinstance(data[0], msgspec.Struct)
+
+
+def encode_response(data=None, error=None):
+    """The `{"data", "error"}` body for Structs from utils/schemas.py, as bytes."""
+    return _encoder.encode({"data": data, "error": error})
+
 
 def json_response(data=None, error=None, status=200):
-    return jsonify({"data": data, "error": error}), status
\ No newline at end of file
+    if _is_schema(data):
+        return current_app.response_class(encode_response(data, error), mimetype='application/json'), status
+    return jsonify({"data": data, "error": error}), status
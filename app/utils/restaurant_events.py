@@ -0,0 +1,45 @@
+# utils/restaurant_events.py
+"""
+Post-commit notifications for in-process restaurant read models.
+
+Routes call these after a restaurant has been committed so the autocomplete
+trie, the geo index, the cached map clusters, the catalogue snapshots, the
+cached availability and the recommendation matrix stay in step with the
+database.
+"""
+from app.utils.autocomplete import autocomplete_index
+from app.utils.availability_cache import availability_cache
+from app.utils.catalog_snapshot import RESTAURANTS, catalog_snapshot, menu_keys
+from app.utils.geo_index import geo_index
+from app.utils.map_clusters import map_clusters
+from app.utils.recommender import recommender
+
+
+def restaurant_saved(restaurant):
+    """A restaurant was added or edited."""
+    autocomplete_index.restaurant_saved(restaurant)
+    previous = geo_index.restaurant_saved(restaurant)
+    if previous != (restaurant.lat, restaurant.lon):
+        map_clusters.point_changed(previous or (None, None), (restaurant.lat, restaurant.lon))
+    catalog_snapshot.invalidate(RESTAURANTS)
+    availability_cache.bump_restaurant(restaurant.id)  # Hours and booking duration shape every slot grid
+    recommender.catalog_changed()
+
+
+def restaurant_removed(restaurant_id):
+    """A restaurant was deleted."""
+    autocomplete_index.restaurant_removed(restaurant_id)
+    previous = geo_index.restaurant_removed(restaurant_id)
+    if previous is not None:
+        map_clusters.point_changed(previous)
+    catalog_snapshot.invalidate(RESTAURANTS, *menu_keys(restaurant_id))
+    recommender.catalog_changed()
+
+
+def menu_changed(restaurant_id, previous_dishes, dishes):
+    """
+    A restaurant's menu was rewritten with bulk statements (search is reindexed
+    by the caller); `previous_dishes` and `dishes` are its item names before and after.
+    """
+    autocomplete_index.menu_changed(previous_dishes, dishes)
+    catalog_snapshot.invalidate(*menu_keys(restaurant_id))
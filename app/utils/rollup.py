@@ -0,0 +1,141 @@
+# utils/rollup.py
+"""
+Daily booking rollup per restaurant.
+
+A session `after_flush` hook turns every inserted, moved or deleted Booking
+into +/- deltas on its (restaurant_id, day) row, written in the same
+transaction as the booking itself. Deleting a booking counts as a
+cancellation. A party seated at joined tables has one row per table; only its
+first row counts as a booking (or cancellation), while every row adds its
+share of the guests. `backfill` rebuilds bookings and guests from the Booking
+table.
+"""
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import case, event, func, inspect, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.extensions import db
+from app.models import Booking, BookingDailyRollup
+
+_UPSERTS = {'postgresql': pg_insert, 'sqlite': sqlite_insert}
+
+
+def _as_date(value):
+    # func.date() comes back as a string on SQLite
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _old_value(state, attribute):
+    history = state.attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    return state.attrs[attribute].value
+
+
+def _counts_as_booking(booking):
+    """The first (or only) row of a party; the other tables of a joined party only add guests."""
+    return booking.party_id is None or booking.party_id == booking.id
+
+
+def _collect_deltas(session):
+    deltas = defaultdict(lambda: [0, 0, 0])  # (restaurant_id, day) -> [bookings, guests, cancellations]
+
+    def apply(booking, restaurant_id, booked_at, guests, sign, cancelled=False):
+        delta = deltas[(restaurant_id, booked_at.date())]
+        counted = _counts_as_booking(booking)
+        delta[0] += sign if counted else 0
+        delta[1] += sign * (guests or 0)
+        if cancelled and counted:
+            delta[2] += 1
+
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            apply(obj, obj.restaurant_id, obj.date, obj.num_guests, +1)
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            state = inspect(obj)
+            apply(obj, _old_value(state, 'restaurant_id'), _old_value(state, 'date'),
+                  _old_value(state, 'num_guests'), -1, cancelled=True)
+    for obj in session.dirty:
+        if not isinstance(obj, Booking):
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[name].history.has_changes() for name in ('restaurant_id', 'date', 'num_guests')):
+            continue
+        apply(obj, _old_value(state, 'restaurant_id'), _old_value(state, 'date'), _old_value(state, 'num_guests'), -1)
+        apply(obj, obj.restaurant_id, obj.date, obj.num_guests, +1)
+    return {key: delta for key, delta in deltas.items() if any(delta)}
+
+
+def _upsert(connection, restaurant_id, day, bookings, guests, cancellations):
+    table = BookingDailyRollup.__table__
+    insert = _UPSERTS.get(connection.dialect.name)
+    if insert is not None:
+        stmt = insert(table).values(restaurant_id=restaurant_id, day=day, bookings=bookings,
+                                    guests=guests, cancellations=cancellations)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['restaurant_id', 'day'],
+            set_={
+                'bookings': table.c.bookings + stmt.excluded.bookings,
+                'guests': table.c.guests + stmt.excluded.guests,
+                'cancellations': table.c.cancellations + stmt.excluded.cancellations,
+            }
+        )
+        connection.execute(stmt)
+        return
+    updated = connection.execute(table.update().where(
+        table.c.restaurant_id == restaurant_id, table.c.day == day
+    ).values(
+        bookings=table.c.bookings + bookings,
+        guests=table.c.guests + guests,
+        cancellations=table.c.cancellations + cancellations
+    ))
+    if not updated.rowcount:
+        connection.execute(table.insert().values(restaurant_id=restaurant_id, day=day, bookings=bookings,
+                                                 guests=guests, cancellations=cancellations))
+
+
+def _after_flush(session, flush_context):
+    deltas = _collect_deltas(session)
+    if not deltas:
+        return
+    connection = session.connection()
+    # Sorted so concurrent transactions touch rollup rows in the same order
+    for (restaurant_id, day), (bookings, guests, cancellations) in sorted(deltas.items()):
+        _upsert(connection, restaurant_id, day, bookings, guests, cancellations)
+
+
+def register_rollup_listener():
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+
+
+def backfill():
+    """Rebuild bookings and guests per restaurant and day from the Booking table, keeping cancellations."""
+    cancellations = {
+        (row.restaurant_id, row.day): row.cancellations
+        for row in BookingDailyRollup.query.filter(BookingDailyRollup.cancellations > 0)
+    }
+    parties = func.sum(case((or_(Booking.party_id.is_(None), Booking.party_id == Booking.id), 1), else_=0))
+    totals = db.session.query(
+        Booking.restaurant_id, func.date(Booking.date), parties, func.sum(Booking.num_guests)
+    ).group_by(Booking.restaurant_id, func.date(Booking.date)).all()
+
+    rows = {}
+    for restaurant_id, day, bookings, guests in totals:
+        day = _as_date(day)
+        rows[(restaurant_id, day)] = {
+            "restaurant_id": restaurant_id, "day": day, "bookings": bookings,
+            "guests": guests or 0, "cancellations": cancellations.pop((restaurant_id, day), 0)
+        }
+    for (restaurant_id, day), cancelled in cancellations.items():
+        rows[(restaurant_id, day)] = {
+            "restaurant_id": restaurant_id, "day": day, "bookings": 0, "guests": 0, "cancellations": cancelled
+        }
+
+    db.session.execute(BookingDailyRollup.__table__.delete())
+    if rows:
+        db.session.execute(BookingDailyRollup.__table__.insert(), list(rows.values()))
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,169 @@
+# utils/schemas.py
+"""
+Typed response bodies, encoded by msgspec.
+
+`json_response` recognises these Structs and encodes them straight to bytes
+with a reused msgspec encoder instead of going through dicts and jsonify. The
+wire format is the one the hand-built dicts produced: keys sorted, times as
+"HH:MM", booking dates as "YYYY-MM-DD HH:MM" and review dates as HTTP dates.
+"""
+from typing import Any, Dict, List, Optional
+import msgspec
+from werkzeug.http import http_date
+
+
+def _time(value):
+    return value.strftime("%H:%M") if value else None
+
+
+class RestaurantSchema(msgspec.Struct):
+    """A search result."""
+    id: int
+    name: str
+    cuisine: str
+    rating: float
+    lat: Optional[float]
+    lon: Optional[float]
+    features: Any
+    promo: Optional[str]
+    image_url: str
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            id=row.id, name=row.name, cuisine=row.cuisine, rating=round(row.rating, 1), lat=row.lat,
+            lon=row.lon, features=row.features, promo=row.promo, image_url=row.image_url or ''
+        )
+
+
+class SearchPageSchema(msgspec.Struct):
+    """Search results with facet counts (`facets=1`)."""
+    results: List[RestaurantSchema]
+    facet_counts: Dict[str, int]
+
+
+class RestaurantDetailsSchema(msgspec.Struct):
+    id: int
+    name: str
+    location: str
+    cuisine: str
+    promo: Optional[str]
+    lat: Optional[float]
+    lon: Optional[float]
+    opening_time: Optional[str]
+    closing_time: Optional[str]
+    images: List[str]
+    capacity: Optional[int]
+    average_price: Optional[float]
+    features: Any
+    rating: float
+    rating_count: int
+    rating_histogram: Dict[str, int]
+
+    @classmethod
+    def from_row(cls, restaurant):
+        return cls(
+            id=restaurant.id,
+            name=restaurant.name,
+            location=restaurant.location,
+            cuisine=restaurant.cuisine,
+            promo=restaurant.promo,
+            lat=restaurant.lat,
+            lon=restaurant.lon,
+            opening_time=_time(restaurant.opening_time),
+            closing_time=_time(restaurant.closing_time),
+            images=[img.image_url for img in restaurant.images],
+            capacity=restaurant.capacity,
+            average_price=restaurant.average_price,
+            features=restaurant.features,
+            rating=restaurant.rating,
+            rating_count=restaurant.rating_count,
+            rating_histogram={str(stars): count for stars, count in restaurant.rating_histogram.items()}
+        )
+
+
+class LayoutSchema(msgspec.Struct):
+    """A table or piece of furniture on the floor plan; every Layout column."""
+    id: int
+    restaurant_id: int
+    type: str
+    table_number: Optional[int]
+    table_type: Optional[str]
+    x_coordinate: float
+    y_coordinate: float
+    shape: Optional[str]
+    capacity: Optional[int]
+    name: Optional[str]
+    width: Optional[float]
+    height: Optional[float]
+    color: Optional[str]
+
+    @classmethod
+    def from_row(cls, l):
+        return cls(
+            id=l.id, restaurant_id=l.restaurant_id, type=l.type, table_number=l.table_number,
+            table_type=l.table_type, x_coordinate=l.x_coordinate, y_coordinate=l.y_coordinate,
+            shape=l.shape, capacity=l.capacity, name=l.name, width=l.width, height=l.height, color=l.color
+        )
+
+
+class BookingSchema(msgspec.Struct):
+    """A booking as listed to its guest."""
+    id: int
+    restaurant_id: int
+    restaurant_name: str
+    restaurant_image: Optional[str]
+    layout_id: int
+    num_guests: Optional[int]
+    status: Optional[str]
+    date: str
+
+    @classmethod
+    def from_row(cls, booking, restaurant_name, image_url):
+        return cls(
+            id=booking.id, restaurant_id=booking.restaurant_id, restaurant_name=restaurant_name,
+            restaurant_image=image_url, layout_id=booking.layout_id, num_guests=booking.num_guests,
+            status=booking.status, date=booking.date.strftime("%Y-%m-%d %H:%M")
+        )
+
+
+class MenuItemSchema(msgspec.Struct):
+    id: int
+    category: Optional[str]
+    name: Optional[str]
+    description: Optional[str]
+    price: Optional[float]
+    image_url: Optional[str]
+
+    @classmethod
+    def from_row(cls, item):
+        return cls(
+            id=item.id, category=item.category, name=item.name, description=item.description,
+            price=item.price, image_url=item.image_url
+        )
+
+
+class MenuCategorySchema(msgspec.Struct):
+    category: Optional[str]
+    items: List[MenuItemSchema]
+
+
+class ReviewSchema(msgspec.Struct):
+    id: int
+    user_id: int
+    restaurant_id: int
+    rating: int
+    comment: Optional[str]
+    date_created: Optional[str]
+
+    @classmethod
+    def from_row(cls, r):
+        return cls(
+            id=r.id, user_id=r.user_id, restaurant_id=r.restaurant_id, rating=r.rating, comment=r.comment,
+            date_created=http_date(r.date_created) if r.date_created else None
+        )
+
+
+class ReviewPageSchema(msgspec.Struct):
+    reviews: List[ReviewSchema]
+    total_pages: int
@@ -0,0 +1,177 @@
+# utils/search.py
+"""
+Full-text restaurant search.
+
+Every restaurant carries a `search_document` built from its name, location,
+cuisine, features and menu item names. A session `after_flush` hook rebuilds
+the documents of restaurants whose searchable fields or menu changed, in the
+same transaction as the change.
+
+On PostgreSQL the document is matched through a GIN index on its tsvector,
+with a pg_trgm index on the name for typo-tolerant matches. On SQLite the
+documents are mirrored into the FTS5 table `restaurant_fts` (rowid =
+restaurant id) and ranked with bm25. Other databases fall back to LIKE on
+the document.
+
+Bulk statements (Query.update/delete) bypass the hook; call `reindex` after them.
+"""
+import re
+from sqlalchemy import DDL, Float, Integer, bindparam, event, func, inspect, literal_column, or_, select, text
+from app.extensions import db
+from app.models import MenuItem, Restaurant
+
+FTS_TABLE = 'restaurant_fts'
+SEARCHABLE_FIELDS = ('name', 'location', 'cuisine', 'features')
+
+# bm25 column weights for name, location, cuisine, features, menu
+FTS_WEIGHTS = (10.0, 2.0, 5.0, 3.0, 1.0)
+
+SQLITE_FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, location, cuisine, features, menu, tokenize = 'unicode61 remove_diacritics 2')"
+)
+POSTGRES_SEARCH_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_restaurant_search_document ON restaurant "
+    "USING gin (to_tsvector('simple', coalesce(search_document, '')))",
+    "CREATE INDEX IF NOT EXISTS ix_restaurant_name_trgm ON restaurant USING gin (name gin_trgm_ops)",
+)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+event.listen(Restaurant.__table__, 'after_create', DDL(SQLITE_FTS_DDL).execute_if(dialect='sqlite'))
+for statement in POSTGRES_SEARCH_DDL:
+    event.listen(Restaurant.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+
+def tokenize(query_text):
+    return [token.lower() for token in _TOKEN.findall(query_text or '')]
+
+
+def _features_text(features):
+    if isinstance(features, (list, tuple)):
+        return ' '.join(str(feature) for feature in features)
+    return str(features) if features else ''
+
+
+def _documents(connection, restaurant_ids):
+    """restaurant id -> (name, location, cuisine, features, menu) for the ids that still exist."""
+    restaurants = connection.execute(select(
+        Restaurant.id, Restaurant.name, Restaurant.location, Restaurant.cuisine, Restaurant.features
+    ).where(Restaurant.id.in_(restaurant_ids))).all()
+    menus = {}
+    for restaurant_id, name in connection.execute(select(MenuItem.restaurant_id, MenuItem.name).where(
+        MenuItem.restaurant_id.in_(restaurant_ids)
+    ).order_by(MenuItem.id)):
+        menus.setdefault(restaurant_id, []).append(name)
+    return {
+        r.id: (r.name or '', r.location or '', r.cuisine or '', _features_text(r.features),
+               ' '.join(menus.get(r.id, ())))
+        for r in restaurants
+    }
+
+
+def reindex(restaurant_ids=None, connection=None):
+    """Rebuild search documents for `restaurant_ids` (all restaurants when None). The caller commits."""
+    connection = connection or db.session.connection()
+    if restaurant_ids is None:
+        restaurant_ids = connection.execute(select(Restaurant.id)).scalars().all()
+        if connection.dialect.name == 'sqlite':
+            connection.exec_driver_sql(f"DELETE FROM {FTS_TABLE}")
+    restaurant_ids = sorted(set(restaurant_ids))
+    if not restaurant_ids:
+        return 0
+    documents = _documents(connection, restaurant_ids)
+
+    if documents:
+        table = Restaurant.__table__
+        connection.execute(
+            table.update().where(table.c.id == bindparam('_id')).values(search_document=bindparam('_document')),
+            [{'_id': rid, '_document': ' '.join(part for part in parts if part)} for rid, parts in documents.items()]
+        )
+    if connection.dialect.name == 'sqlite':
+        delete = text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN :ids").bindparams(bindparam('ids', expanding=True))
+        connection.execute(delete, {'ids': restaurant_ids})
+        if documents:
+            connection.execute(
+                text(f"INSERT INTO {FTS_TABLE} (rowid, name, location, cuisine, features, menu) "
+                     "VALUES (:id, :name, :location, :cuisine, :features, :menu)"),
+                [dict(zip(('id', 'name', 'location', 'cuisine', 'features', 'menu'), (rid, *parts)))
+                 for rid, parts in documents.items()]
+            )
+    return len(documents)
+
+
+def _affected_ids(obj):
+    if isinstance(obj, Restaurant):
+        return {obj.id}
+    # A menu item moved between restaurants changes both documents
+    return {obj.restaurant_id, *inspect(obj).attrs.restaurant_id.history.deleted}
+
+
+def _changed_restaurant_ids(session):
+    changed = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, (Restaurant, MenuItem)):
+            changed |= _affected_ids(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Restaurant):
+            fields = SEARCHABLE_FIELDS
+        elif isinstance(obj, MenuItem):
+            fields = ('name', 'restaurant_id')
+        else:
+            continue
+        state = inspect(obj)
+        if any(state.attrs[name].history.has_changes() for name in fields):
+            changed |= _affected_ids(obj)
+    changed.discard(None)
+    return changed
+
+
+def _after_flush(session, flush_context):
+    changed = _changed_restaurant_ids(session)
+    if changed:
+        reindex(changed, connection=session.connection())
+
+
+def register_search_listener():
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+
+
+def text_search(query_text):
+    """
+    Subquery of (id, score) for restaurants matching every token of `query_text`
+    by prefix, higher score first. Returns None when the text has no tokens.
+    """
+    tokens = tokenize(query_text)
+    if not tokens:
+        return None
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        match = ' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        return text(
+            f"SELECT rowid AS id, -bm25({FTS_TABLE}, {weights}) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+        ).bindparams(match=match).columns(id=Integer, score=Float).subquery('matches')
+
+    if dialect == 'postgresql':
+        # Literal arguments keep the expression identical to ix_restaurant_search_document
+        vector = func.to_tsvector(literal_column("'simple'"),
+                                  func.coalesce(Restaurant.search_document, literal_column("''")))
+        tsquery = func.to_tsquery(literal_column("'simple'"), ' & '.join(f"{token}:*" for token in tokens))
+        phrase = ' '.join(tokens)
+        return select(
+            Restaurant.id.label('id'),
+            (func.ts_rank(vector, tsquery) + func.similarity(Restaurant.name, phrase)).label('score')
+        ).where(or_(
+            vector.op('@@')(tsquery),
+            Restaurant.name.op('%')(phrase)
+        )).subquery('matches')
+
+    document = func.lower(func.coalesce(Restaurant.search_document, ''))
+    return select(
+        Restaurant.id.label('id'), literal_column('0.0', Float).label('score')
+    ).where(*[document.like(f"%{token}%") for token in tokens]).subquery('matches')
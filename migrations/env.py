@@ -90,7 +90,14 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # The search shadow table and indexes (app/utils/search.py) are not in the
+    # model metadata; keep autogenerate from proposing to drop them
+    def include_name(name, type_, parent_names):
+        return not (name or '').startswith(('restaurant_fts', 'ix_restaurant_search_document',
+                                            'ix_restaurant_name_trgm'))
+
     conf_args = current_app.extensions['migrate'].configure_args
+    conf_args.setdefault('include_name', include_name)
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
 